@@ -0,0 +1,115 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+import gzip
+
+from models import db, Show, Artist, Venue
+
+
+#----------------------------------------------------------------------------#
+# Serialization.
+#----------------------------------------------------------------------------#
+
+MIN_COMPRESS_SIZE = 500
+EMBED_FIELDS = ('id', 'name', 'image_link')
+
+
+def _identity(value):
+    return value
+
+
+def _isoformat(value):
+    return value.isoformat() if value is not None else None
+
+
+class Resource:
+    """Column-level serializer for one model.
+
+    Queries select only the requested columns, and rows are turned into
+    dicts through a field list and converters worked out once per request,
+    so no ORM objects are built along the way. Field names and order
+    follow the model's format().
+    """
+
+    def __init__(self, model, keys):
+        self.model = model
+        self.fields = model.format_fields
+        self.keys = keys
+        self.columns = {field: getattr(model, field) for field in self.fields}
+        self.converters = {
+            field: _isoformat if isinstance(column.type, db.DateTime) else _identity
+            for field, column in self.columns.items()
+        }
+
+    def parse_fields(self, raw):
+        """Turn a "fields=a,b" parameter into a field list; ValueError if unknown."""
+        if not raw:
+            return list(self.fields)
+        fields = [field.strip() for field in raw.split(',') if field.strip()]
+        unknown = [field for field in fields if field not in self.columns]
+        if unknown:
+            raise ValueError(', '.join(unknown))
+        return fields
+
+    def selected(self, fields):
+        """Names of the columns query(fields) selects before any extras."""
+        names = list(fields)
+        for key in self.keys:
+            if key.key not in names:
+                names.append(key.key)
+        return names
+
+    def query(self, fields, *extra):
+        """Select `fields` plus the pagination keys, then any `extra` columns."""
+        columns = [self.columns[name] for name in self.selected(fields)]
+        return db.session.query(*columns, *extra)
+
+    def serialize(self, rows, fields):
+        """Dicts of `fields` from rows selected by query(fields).
+
+        query() selects `fields` first and in order, so field i is row[i].
+        """
+        plan = [(field, i, self.converters[field])
+                for i, field in enumerate(fields)]
+        return [{field: convert(row[i]) for field, i, convert in plan}
+                for row in rows]
+
+
+venues = Resource(Venue, [Venue.name, Venue.id])
+artists = Resource(Artist, [Artist.name, Artist.id])
+shows = Resource(Show, [Show.start_time, Show.id])
+
+
+def embedded(model, name):
+    """Labelled columns for a related entity embedded under `name`."""
+    return [getattr(model, field).label('%s_%s' % (name, field))
+            for field in EMBED_FIELDS]
+
+
+def embed(items, rows, name, offset):
+    """Attach the EMBED_FIELDS found at row[offset:] to each item as `name`."""
+    for item, row in zip(items, rows):
+        item[name] = {field: row[offset + i]
+                      for i, field in enumerate(EMBED_FIELDS)}
+
+
+def compress(response, accept_encoding):
+    """gzip a JSON response in place when the client accepts it."""
+    if (response.direct_passthrough
+            or response.is_streamed
+            or response.status_code != 200
+            or 'gzip' not in accept_encoding
+            or 'Content-Encoding' in response.headers):
+        return response
+    response.vary.add('Accept-Encoding')
+    body = response.get_data()
+    if len(body) < MIN_COMPRESS_SIZE:
+        return response
+    response.set_data(gzip.compress(body, compresslevel=5))
+    response.headers['Content-Encoding'] = 'gzip'
+    # The representation changed, so a strong validator would be wrong;
+    # a weak one still matches If-None-Match on the next request.
+    etag, weak = response.get_etag()
+    if etag:
+        response.set_etag(etag, weak=True)
+    return response
@@ -3,9 +3,14 @@
 #----------------------------------------------------------------------------#
 
 import os
-import dateutil.parser
+import functools
+import hmac
+import uuid
+import itertools
 import datetime
+from urllib.parse import urlencode
 import babel
+import babel.dates
 from flask import (
     Flask,
     render_template,
@@ -13,18 +18,39 @@ from flask import (
     flash,
     redirect,
     url_for,
-    abort
+    abort,
+    jsonify,
+    Response,
+    stream_with_context
 )
 from flask_moment import Moment
 from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
-import logging
-from logging import Formatter, FileHandler
+from sqlalchemy import exc, func, tuple_
 from flask_wtf import Form
 from forms import *
-import sys
 import models
+import commands
+import clock
+import counters
+import facets
+import geo
+import scheduling
+import search
+import suggest
+import api
+import importer
+import exporter
+import feed
+import pool_stats
+from cache import PageCache
+from deletion import Purger
+from logs import StructuredLogging
+from profiler import QueryProfiler
+from routing import read_only
+from metrics import Metrics
 from models import db, Show, Artist, Venue
+from pagination import paginate, encode_cursor, InvalidCursor, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
 
 
 #----------------------------------------------------------------------------#
@@ -32,13 +58,24 @@ from models import db, Show, Artist, Venue
 #----------------------------------------------------------------------------#
 
 migrate = Migrate()
+structured_logging = StructuredLogging()
+page_cache = PageCache()
+query_profiler = QueryProfiler()
+metrics = Metrics()
+purger = Purger(invalidate=page_cache.invalidate)
 
 
 def create_app():
     app = Flask(__name__)
     app.config.from_object(os.getenv("APP_SETTINGS", "config.Config"))
+    structured_logging.init_app(app)
     db.init_app(app)
     migrate.init_app(app, db)
+    commands.init_app(app)
+    page_cache.init_app(app)
+    query_profiler.init_app(app)
+    metrics.init_app(app)
+    purger.init_app(app)
 
     return app
 
@@ -52,24 +89,97 @@ moment = Moment(app)
 #----------------------------------------------------------------------------#
 
 
-def format_datetime(value, format='medium'):
-    date = dateutil.parser.parse(value)
-    if format == 'full':
-        format = "EEEE MMMM, d, y 'at' h:mma"
-    elif format == 'medium':
-        format = "EE MM, dd, y h:mma"
-    return babel.dates.format_datetime(date, format, locale='en')
+DATETIME_FORMATS = {
+    'full': "EEEE MMMM, d, y 'at' h:mma",
+    'medium': "EE MM, dd, y h:mma",
+}
+
+
+@functools.lru_cache(maxsize=None)
+def datetime_pattern(format, locale):
+    """Parse a Babel pattern and locale once per (format, locale) pair."""
+    pattern = DATETIME_FORMATS.get(format, format)
+    return babel.dates.parse_pattern(pattern), babel.Locale.parse(locale)
+
+
+def format_datetime(value, format='medium', locale='en'):
+    if value is None:
+        return ''
+    pattern, babel_locale = datetime_pattern(format, locale)
+    return pattern.apply(value, babel_locale)
 
 
 app.jinja_env.filters['datetime'] = format_datetime
 
 
-# datetime formatting article: https://www.programiz.com/python-programming/datetime/strftime
+def paginate_request(query, keys, from_end=False):
+    try:
+        per_page = int(request.args.get('per_page', DEFAULT_PAGE_SIZE))
+    except ValueError:
+        abort(400)
+    per_page = max(1, min(per_page, MAX_PAGE_SIZE))
+    try:
+        return paginate(query, keys, per_page,
+                        after=request.args.get('after'),
+                        before=request.args.get('before'),
+                        from_end=from_end)
+    except InvalidCursor:
+        abort(400)
 
-def format_date_string(value):
-    format = "%b %d %Y %r"
-    start_time = value.strftime(format)
-    return start_time
+
+def facet_selection():
+    try:
+        return facets.Selection.from_args(request.args)
+    except ValueError:
+        abort(400)
+
+
+def facet_counts(model, selection):
+    """facets.counts() of a listing, computed once for all of its pages."""
+    key = 'facets:%s?%s' % (model.__tablename__,
+                            urlencode(sorted(selection.args().items()), doseq=True))
+    return page_cache.fragment(key, [model.__tablename__],
+                               lambda: facets.counts(model, selection.criteria(model)))
+
+
+def search_facet_counts(model, term):
+    """facets.counts() of a search, computed once per term. A term with no
+    words matches every row, like the unfiltered listing."""
+    tsquery = search.to_tsquery(term)
+    if tsquery is None:
+        return facet_counts(model, facets.Selection())
+    key = 'facets:%s/search?%s' % (model.__tablename__, urlencode({'q': tsquery}))
+    return page_cache.fragment(key, [model.__tablename__],
+                               lambda: facets.counts(model, search.matches(model, term)))
+
+
+def detail_shows(shows_query, entity, column, now):
+    """Attach the shows of a venue or artist page to `entity`.
+
+    The first DETAIL_UPCOMING_SHOWS upcoming shows are listed, and
+    `more_upcoming_url` points to the rest in the shows API; past shows
+    come a page at a time, the most recent first. Both numbers come from
+    the maintained counters. A show starting exactly at `now` counts as
+    upcoming.
+    """
+    shows_query = shows_query.filter(Show.start_time.isnot(None))
+    entity.upcoming_shows = shows_query.filter(Show.start_time >= now) \
+        .order_by(Show.start_time, Show.id) \
+        .limit(app.config['DETAIL_UPCOMING_SHOWS']).all()
+    entity.past_shows = paginate_request(
+        shows_query.filter(Show.start_time < now), [Show.start_time, Show.id],
+        from_end=True)
+    entity.past_shows_count, entity.upcoming_shows_count = counters.counts(
+        entity, column, now)
+    entity.more_upcoming_url = None
+    if entity.upcoming_shows and entity.upcoming_shows_count > len(entity.upcoming_shows):
+        last = entity.upcoming_shows[-1]
+        entity.more_upcoming_url = url_for(
+            'api_shows', after=encode_cursor([last.start_time, last.id]),
+            **{column.key: entity.id})
+    if entity.upcoming_shows:
+        # The page changes once the next show starts.
+        page_cache.expire_at(entity.upcoming_shows[0].start_time)
 
 
 @app.route('/')
@@ -80,73 +190,82 @@ def index():
 #  Venues
 #  ----------------------------------------------------------------
 
-@app.route('/venues')
-def venues():
-    venues_list = Venue.query.all()
-    areas = {}
-
-    for venue in venues_list:
-        venue_data = {
-            "id": venue.id,
-            "name": venue.name,
+def group_areas(venue_rows, upcoming_counts):
+    """Yield one area per (state, city) run of rows already ordered by area."""
+    for (state, city), area_venues in itertools.groupby(
+            venue_rows, key=lambda venue: (venue.state, venue.city)):
+        yield {
+            "city": city,
+            "state": state,
+            "upcoming_shows_count": upcoming_counts.get((state, city), 0),
+            "venues": area_venues
         }
 
-        if venue.city in areas:
-            existing_area = areas[venue.city]
-            existing_area["venues"].append(venue_data)
-        else:
-            area_data = {
-                "city": venue.city,
-                "state": venue.state,
-                "venues": [venue_data]
-            }
-            areas.update({venue.city: area_data})
 
-    return render_template('pages/venues.html', areas=areas.values())
+@app.route('/venues')
+@page_cache.cached(lambda: ['venues', 'shows'])
+def venues():
+    selection = facet_selection()
+    criteria = selection.criteria(Venue)
+    venues_query = db.session.query(
+        Venue.id, Venue.name, Venue.city, Venue.state).filter(*criteria)
+    page = paginate_request(
+        venues_query, [Venue.state, Venue.city, Venue.name, Venue.id])
+
+    page_areas = {(venue.state, venue.city) for venue in page}
+    upcoming_counts = {}
+    if page_areas:
+        upcoming_query = db.session.query(
+            Venue.state, Venue.city, func.count(Show.id), func.min(Show.start_time)
+        ).select_from(Show).join(Show.venue).filter(
+            Show.start_time >= clock.now(),
+            tuple_(Venue.state, Venue.city).in_(page_areas),
+            *criteria
+        ).group_by(Venue.state, Venue.city)
+        for state, city, count, next_start in upcoming_query:
+            upcoming_counts[(state, city)] = count
+            page_cache.expire_at(next_start)
+
+    areas = group_areas(page, upcoming_counts)
+    return render_template('pages/venues.html', areas=areas, page=page,
+                           facets=facet_counts(Venue, selection),
+                           selection=selection)
 
 
 @app.route('/venues/search', methods=['POST'])
+@read_only
 def search_venues():
     search_term = request.form.get('search_term', '')
-    matching = Venue.query.filter(Venue.name.ilike('%'+search_term+'%')).all()
+    matching = search.search(
+        Venue, search_term, app.config['SEARCH_RESULT_LIMIT'])
     count = len(matching)
     response = {
         "count": count,
         "data": matching
     }
-    return render_template('pages/search_venues.html', results=response, search_term=search_term)
+    return render_template('pages/search_venues.html', results=response, search_term=search_term,
+                           facets=search_facet_counts(Venue, search_term))
 
 
 @app.route('/venues/<int:venue_id>')
+@page_cache.cached(lambda venue_id: ['venue:%d' % venue_id])
 def show_venue(venue_id):
-    error = False
-    try:
-        venue = Venue.query.get(venue_id)
-        past_shows_query = db.session.query(Show).join(Venue).filter(
-            Show.venue_id == venue_id).filter(Show.start_time < datetime.now()).all()
-        upcoming_shows_query = db.session.query(Show).join(Venue).filter(
-            Show.venue_id == venue_id).filter(Show.start_time > datetime.now()).all()
-
-        venue.past_shows = past_shows_query
-        venue.upcoming_shows = upcoming_shows_query
-
-        for show in venue.past_shows:
-            artist = Artist.query.get(show.artist_id)
-            show.artist_name = artist.name
-            show.artist_image_link = artist.image_link
-            show.start_time = format_date_string(show.start_time)
-
-        for show in venue.upcoming_shows:
-            artist = Artist.query.get(show.artist_id)
-            show.artist_name = artist.name
-            show.artist_image_link = artist.image_link
-            show.start_time = format_date_string(show.start_time)
-
-        return render_template('pages/show_venue.html', venue=venue)
-    except:
-        error = True
-    if error:
+    venue = Venue.query.get(venue_id)
+    if venue is None:
         abort(404)
+    shows_query = db.session.query(
+        Show.id,
+        Show.start_time,
+        Artist.id.label('artist_id'),
+        Artist.name.label('artist_name'),
+        Artist.image_link.label('artist_image_link')
+    ).join(Show.artist).filter(Show.venue_id == venue_id)
+
+    detail_shows(shows_query, venue, Show.venue_id, clock.now())
+    page_cache.tag(*['artist:%d' % show.artist_id for show in
+                     itertools.chain(venue.past_shows, venue.upcoming_shows)])
+
+    return render_template('pages/show_venue.html', venue=venue)
 
 
 #  Create Venue
@@ -174,6 +293,8 @@ def create_venue_submission():
             )
             db.session.add(venue)
             db.session.commit()
+            suggest.venues.add(venue.id, venue.name)
+            page_cache.invalidate('venues')
             if form.is_submitted():
                 flash('Your venue ' + name + ' was successfully listed!')
                 return redirect('/venues')
@@ -185,7 +306,7 @@ def create_venue_submission():
     except:
         db.session.rollback()
         error = True
-        print(sys.exc_info())
+        app.logger.exception('Could not create venue %s', name)
     finally:
         db.session.close()
     if error:
@@ -195,25 +316,32 @@ def create_venue_submission():
               request.form['name'] + ' was successfully listed!')
 
 
-@app.route('/venues/<int:venue_id>/delete', methods=['POST'])
-def delete_venue(venue_id):
+def delete_entity(model, entity_id, index, tags):
+    """Delete a venue or artist, in the background if it has many shows."""
+    entity = model.query.get(entity_id)
+    if entity is None:
+        abort(404)
     error = False
     try:
-        venue = Venue.query.get(venue_id)
-        Show.query.filter(Show.venue_id == venue_id).delete()
-        db.session.delete(venue)
-        db.session.commit()
+        purger.delete(entity)
+        index.remove(entity_id)
+        page_cache.invalidate(*tags)
     except:
         db.session.rollback()
         error = True
-        print(sys.exc_info())
+        app.logger.exception('Could not delete %s %s', model.__tablename__, entity_id)
     finally:
         db.session.close()
     if error:
         abort(500)
-    else:
-        flash('Your venue was deleted!')
-        return redirect('/')
+
+
+@app.route('/venues/<int:venue_id>/delete', methods=['POST'])
+def delete_venue(venue_id):
+    delete_entity(Venue, venue_id, suggest.venues,
+                  ['venue:%d' % venue_id, 'venues', 'shows'])
+    flash('Your venue was deleted!')
+    return redirect('/')
 
 
 #  Artists
@@ -221,56 +349,58 @@ def delete_venue(venue_id):
 
 
 @app.route('/artists')
+@page_cache.cached(lambda: ['artists'])
 def artists():
-    artists_query = Artist.query.all()
-    return render_template('pages/artists.html', artists=artists_query)
+    selection = facet_selection()
+    criteria = selection.criteria(Artist)
+    page = paginate_request(Artist.query.filter(*criteria), [Artist.name, Artist.id])
+    return render_template('pages/artists.html', artists=page, page=page,
+                           facets=facet_counts(Artist, selection),
+                           selection=selection)
 
 
 @app.route('/artists/search', methods=['POST'])
+@read_only
 def search_artists():
     search_term = request.form.get('search_term', '')
-    matching = Artist.query.filter(
-        Artist.name.ilike('%'+search_term+'%')).all()
+    matching = search.search(
+        Artist, search_term, app.config['SEARCH_RESULT_LIMIT'])
     count = len(matching)
     response = {
         "count": count,
         "data": matching
     }
-    return render_template('pages/search_artists.html', results=response, search_term=search_term)
+    return render_template('pages/search_artists.html', results=response, search_term=search_term,
+                           facets=search_facet_counts(Artist, search_term))
 
 
 @app.route('/artists/<int:artist_id>')
+@page_cache.cached(lambda artist_id: ['artist:%d' % artist_id])
 def show_artist(artist_id):
-    error = False
-    try:
-        artist = Artist.query.get(artist_id)
-        past_shows_query = db.session.query(Show).join(Artist).filter(
-            Show.artist_id == artist_id).filter(Show.start_time < datetime.now()).all()
-        upcoming_shows_query = db.session.query(Show).join(Artist).filter(
-            Show.artist_id == artist_id).filter(Show.start_time > datetime.now()).all()
-
-        artist.past_shows_count = len(past_shows_query)
-        artist.upcoming_shows_count = len(upcoming_shows_query)
-        artist.past_shows = past_shows_query
-        artist.upcoming_shows = upcoming_shows_query
-
-        for show in artist.past_shows:
-            venue = Venue.query.get(show.venue_id)
-            show.venue_name = venue.name
-            show.venue_image_link = venue.image_link
-            show.start_time = format_date_string(show.start_time)
-
-        for show in artist.upcoming_shows:
-            venue = Venue.query.get(show.venue_id)
-            show.venue_name = venue.name
-            show.venue_image_link = venue.image_link
-            show.start_time = format_date_string(show.start_time)
-
-        return render_template('pages/show_artist.html', artist=artist)
-    except:
-        error = True
-    if error:
+    artist = Artist.query.get(artist_id)
+    if artist is None:
         abort(404)
+    shows_query = db.session.query(
+        Show.id,
+        Show.start_time,
+        Venue.id.label('venue_id'),
+        Venue.name.label('venue_name'),
+        Venue.image_link.label('venue_image_link')
+    ).join(Show.venue).filter(Show.artist_id == artist_id)
+
+    detail_shows(shows_query, artist, Show.artist_id, clock.now())
+    page_cache.tag(*['venue:%d' % show.venue_id for show in
+                     itertools.chain(artist.past_shows, artist.upcoming_shows)])
+
+    return render_template('pages/show_artist.html', artist=artist)
+
+
+@app.route('/artists/<int:artist_id>/delete', methods=['POST'])
+def delete_artist(artist_id):
+    delete_entity(Artist, artist_id, suggest.artists,
+                  ['artist:%d' % artist_id, 'artists', 'shows'])
+    flash('Your artist was deleted!')
+    return redirect('/')
 
 #  Update
 #  ----------------------------------------------------------------
@@ -303,6 +433,8 @@ def edit_artist_submission(artist_id):
         name = form.name.data
         form.populate_obj(artist)
         db.session.commit()
+        suggest.artists.add(artist_id, name)
+        page_cache.invalidate('artist:%d' % artist_id, 'artists', 'shows')
         if form.is_submitted():
             flash('Your artist ' + name + ' was successfully updated!')
             return redirect(url_for('show_artist', artist_id=artist_id))
@@ -313,7 +445,7 @@ def edit_artist_submission(artist_id):
     except:
         db.session.rollback()
         error = True
-        print(sys.exc_info())
+        app.logger.exception('Could not update artist %s', artist_id)
     finally:
         db.session.close()
     if error:
@@ -351,6 +483,8 @@ def edit_venue_submission(venue_id):
         name = form.name.data
         form.populate_obj(venue)
         db.session.commit()
+        suggest.venues.add(venue_id, name)
+        page_cache.invalidate('venue:%d' % venue_id, 'venues', 'shows')
         if form.is_submitted():
             flash('Your venue ' + name + ' was successfully updated!')
             return redirect(url_for('show_venue', venue_id=venue_id))
@@ -361,7 +495,7 @@ def edit_venue_submission(venue_id):
     except:
         db.session.rollback()
         error = True
-        print(sys.exc_info())
+        app.logger.exception('Could not update venue %s', venue_id)
     finally:
         db.session.close()
     if error:
@@ -395,6 +529,8 @@ def create_artist_submission():
             )
             db.session.add(artist)
             db.session.commit()
+            suggest.artists.add(artist.id, artist.name)
+            page_cache.invalidate('artists')
             if form.is_submitted():
                 flash('Your artist ' + name + ' was successfully listed!')
                 return redirect('/artists')
@@ -407,7 +543,7 @@ def create_artist_submission():
     except:
         db.session.rollback()
         error = True
-        print(sys.exc_info())
+        app.logger.exception('Could not create artist %s', name)
     finally:
         db.session.close()
     if error:
@@ -421,23 +557,33 @@ def create_artist_submission():
 #  ----------------------------------------------------------------
 
 @app.route('/shows')
+@page_cache.cached(lambda: ['shows', 'venues', 'artists'])
 def shows():
-    shows_query = Show.query.all()
+    shows_query = db.session.query(
+        Show.id,
+        Show.start_time,
+        Venue.id.label('venue_id'),
+        Venue.name.label('venue_name'),
+        Artist.id.label('artist_id'),
+        Artist.name.label('artist_name'),
+        Artist.image_link.label('artist_image_link')
+    ).join(Show.venue).join(Show.artist).filter(Show.start_time.isnot(None))
+    # Keyset pages compare (start_time, id); a NULL start_time would make
+    # its show drop out of, or repeat across, pages.
+    page = paginate_request(shows_query, [Show.start_time, Show.id])
     shows = []
-    for show in shows_query:
-        venue = Venue.query.get(show.venue_id)
-        artist = Artist.query.get(show.artist_id)
+    for show in page:
         show_data = {
-            "venue_id": venue.id,
-            "venue_name": venue.name,
-            "artist_id": artist.id,
-            "artist_name": artist.name,
-            "artist_image_link": artist.image_link,
-            "start_time": format_date_string(show.start_time)
+            "venue_id": show.venue_id,
+            "venue_name": show.venue_name,
+            "artist_id": show.artist_id,
+            "artist_name": show.artist_name,
+            "artist_image_link": show.artist_image_link,
+            "start_time": show.start_time
         }
         shows.append(show_data)
 
-    return render_template('pages/shows.html', shows=shows)
+    return render_template('pages/shows.html', shows=shows, page=page)
 
 
 @app.route('/shows/create')
@@ -447,6 +593,12 @@ def create_shows():
     return render_template('forms/new_show.html', form=form)
 
 
+def booking_conflict(show, venue_id):
+    booked = 'The venue' if show.venue_id == venue_id else 'The artist'
+    return '%s is already booked from %s to %s.' % (
+        booked, format_datetime(show.start_time), format_datetime(show.end_time))
+
+
 @app.route('/shows/create', methods=['POST'])
 def create_show_submission():
     error = False
@@ -456,20 +608,46 @@ def create_show_submission():
             error = True
             flash('An error occurred. Form data is missing from the request.')
         else:
-            show = Show(venue_id=form.venue_id.data,
-                        artist_id=form.artist_id.data, start_time=form.start_time.data)
+            # Only the times: form.validate() would also want a CSRF token,
+            # which the forms do not send.
+            if not all([field.validate(form) for field in (form.start_time, form.end_time)]):
+                flash('Start and end times must look like 2030-01-01 20:00:00.')
+                return render_template('forms/new_show.html', form=form), 400
+            venue_id, artist_id = int(form.venue_id.data), int(form.artist_id.data)
+            start_time = form.start_time.data
+            end_time = form.end_time.data or scheduling.default_end(start_time)
+            if end_time <= start_time:
+                flash('A show has to end after it starts.')
+                return render_template('forms/new_show.html', form=form), 400
+            clashes = scheduling.conflicts(venue_id, artist_id, start_time, end_time)
+            if clashes:
+                flash(booking_conflict(clashes[0], venue_id))
+                return render_template('forms/new_show.html', form=form), 409
+            show = Show(venue_id=venue_id, artist_id=artist_id,
+                        start_time=start_time, end_time=end_time)
             db.session.add(show)
             db.session.commit()
+            page_cache.invalidate('shows', 'venue:%d' % show.venue_id,
+                                  'artist:%d' % show.artist_id)
             if form.is_submitted():
                 flash('Your show was successfully listed!')
                 return redirect('/shows')
             else:
                 flash('An error occurred. Show could not be listed.')
                 return render_template('pages/home.html')
+    except exc.IntegrityError as e:
+        db.session.rollback()
+        if not scheduling.is_conflict(e):
+            error = True
+            app.logger.exception('Could not create show')
+        else:
+            # Booked by another request since the check above.
+            flash('The venue or the artist was booked for that time meanwhile.')
+            return render_template('forms/new_show.html', form=form), 409
     except:
         db.session.rollback()
         error = True
-        print(sys.exc_info())
+        app.logger.exception('Could not create show')
     finally:
         db.session.close()
     if error:
@@ -478,42 +656,343 @@ def create_show_submission():
         flash('Your show was successfully listed!')
 
 
+#  API
+#  ----------------------------------------------------------------
+
+@app.route('/api/search/suggest')
+def search_suggest():
+    q = request.args.get('q', '')
+    try:
+        limit = int(request.args.get('limit', 10))
+    except ValueError:
+        abort(400)
+    limit = max(1, min(limit, 20))
+    kind = request.args.get('type')
+    if kind not in (None, 'artists', 'venues'):
+        abort(400)
+
+    suggest.ensure_built(app.config['SUGGEST_MAX_AGE'])
+    response = {}
+    if kind in (None, 'artists'):
+        response['artists'] = suggest.artists.suggest(q, limit)
+    if kind in (None, 'venues'):
+        response['venues'] = suggest.venues.suggest(q, limit)
+    return jsonify(response)
+
+
+#  API v1
+#  ----------------------------------------------------------------
+
+def api_fields(resource):
+    try:
+        return resource.parse_fields(request.args.get('fields'))
+    except ValueError:
+        abort(400)
+
+
+def api_embeds(allowed):
+    embeds = {name.strip() for name in request.args.get('embed', '').split(',')
+              if name.strip()}
+    if not embeds <= allowed:
+        abort(400)
+    return embeds
+
+
+def api_shows_page(shows_query, fields, embeds, per_page=None):
+    """Serialize one page of shows, embedding the requested venue/artist."""
+    offset = len(api.shows.selected(fields))
+    if 'venue' in embeds:
+        shows_query = shows_query.join(Show.venue).add_columns(
+            *api.embedded(Venue, 'venue'))
+    if 'artist' in embeds:
+        shows_query = shows_query.join(Show.artist).add_columns(
+            *api.embedded(Artist, 'artist'))
+    if per_page is None:
+        page = paginate_request(shows_query, api.shows.keys)
+    else:
+        page = paginate(shows_query, api.shows.keys, per_page)
+    data = api.shows.serialize(page, fields)
+    for name in ('venue', 'artist'):
+        if name in embeds:
+            api.embed(data, page, name, offset)
+            offset += len(api.EMBED_FIELDS)
+    return page, data
+
+
+def api_list(resource, query, fields):
+    page = paginate_request(query, resource.keys)
+    return jsonify(data=resource.serialize(page, fields),
+                   next=page.next_cursor, prev=page.prev_cursor)
+
+
+def api_detail(resource, entity_id, fields):
+    row = resource.query(fields).filter(
+        resource.model.id == entity_id).first()
+    if row is None:
+        abort(404)
+    return resource.serialize([row], fields)[0]
+
+
+def api_availability(model, column, entity_id):
+    try:
+        window = scheduling.Window.from_args(request.args)
+    except ValueError:
+        abort(400)
+    if db.session.query(model.id).filter(model.id == entity_id).first() is None:
+        abort(404)
+    slots, booked = scheduling.open_slots(column, entity_id, window)
+    return jsonify(data=[{'start': start.isoformat(), 'end': end.isoformat()}
+                         for start, end in slots],
+                   booked=booked, start=window.start.isoformat(),
+                   end=window.end.isoformat())
+
+
+def api_embed_shows(item, column, entity_id):
+    shows_query = api.shows.query(api.shows.fields).filter(
+        column == entity_id, Show.start_time.isnot(None))
+    page, item['shows'] = api_shows_page(
+        shows_query, api.shows.fields, set(), DEFAULT_PAGE_SIZE)
+    item['shows_next'] = None
+    if page.next_cursor:
+        item['shows_next'] = url_for(
+            'api_shows', after=page.next_cursor, **{column.key: entity_id})
+
+
+@app.route('/api/v1/venues')
+@page_cache.cached(lambda: ['venues'])
+def api_venues():
+    fields = api_fields(api.venues)
+    venues_query = api.venues.query(fields).filter(*facet_selection().criteria(Venue))
+    return api_list(api.venues, venues_query, fields)
+
+
+@app.route('/api/v1/venues/near')
+@page_cache.cached(lambda: ['venues'])
+def api_venues_near():
+    fields = api_fields(api.venues)
+    try:
+        area = geo.Area.from_args(request.args)
+        limit = int(request.args.get('limit', DEFAULT_PAGE_SIZE))
+    except ValueError:
+        abort(400)
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    unit = request.args.get('unit', 'mi')
+    rows = geo.nearest(api.venues.query(fields), area, limit)
+    data = api.venues.serialize(rows, fields)
+    for item, row in zip(data, rows):
+        item['distance'] = round(row.distance_km / geo.KM_PER_UNIT[unit], 2)
+    return jsonify(data=data, unit=unit)
+
+
+@app.route('/api/v1/venues/<int:venue_id>')
+@page_cache.cached(lambda venue_id: ['venue:%d' % venue_id])
+def api_venue(venue_id):
+    fields = api_fields(api.venues)
+    embeds = api_embeds({'shows'})
+    venue = api_detail(api.venues, venue_id, fields)
+    if 'shows' in embeds:
+        api_embed_shows(venue, Show.venue_id, venue_id)
+    return jsonify(data=venue)
+
+
+@app.route('/api/v1/venues/<int:venue_id>/availability')
+@page_cache.cached(lambda venue_id: ['venue:%d' % venue_id])
+def api_venue_availability(venue_id):
+    return api_availability(Venue, Show.venue_id, venue_id)
+
+
+@app.route('/api/v1/artists')
+@page_cache.cached(lambda: ['artists'])
+def api_artists():
+    fields = api_fields(api.artists)
+    artists_query = api.artists.query(fields).filter(*facet_selection().criteria(Artist))
+    return api_list(api.artists, artists_query, fields)
+
+
+@app.route('/api/v1/artists/<int:artist_id>')
+@page_cache.cached(lambda artist_id: ['artist:%d' % artist_id])
+def api_artist(artist_id):
+    fields = api_fields(api.artists)
+    embeds = api_embeds({'shows'})
+    artist = api_detail(api.artists, artist_id, fields)
+    if 'shows' in embeds:
+        api_embed_shows(artist, Show.artist_id, artist_id)
+    return jsonify(data=artist)
+
+
+@app.route('/api/v1/artists/<int:artist_id>/availability')
+@page_cache.cached(lambda artist_id: ['artist:%d' % artist_id])
+def api_artist_availability(artist_id):
+    return api_availability(Artist, Show.artist_id, artist_id)
+
+
+@app.route('/api/v1/shows')
+@page_cache.cached(lambda: ['shows', 'venues', 'artists'])
+def api_shows():
+    fields = api_fields(api.shows)
+    embeds = api_embeds({'venue', 'artist'})
+    shows_query = api.shows.query(fields).filter(Show.start_time.isnot(None))
+    for column in (Show.venue_id, Show.artist_id):
+        entity_id = request.args.get(column.key, type=int)
+        if entity_id is not None:
+            shows_query = shows_query.filter(column == entity_id)
+    page, data = api_shows_page(shows_query, fields, embeds)
+    return jsonify(data=data, next=page.next_cursor, prev=page.prev_cursor)
+
+
+@app.route('/api/v1/shows/<int:show_id>')
+@page_cache.cached(lambda show_id: ['shows', 'venues', 'artists'])
+def api_show(show_id):
+    embeds = api_embeds({'venue', 'artist'})
+    shows_query = api.shows.query(api.shows.fields).filter(Show.id == show_id)
+    page, data = api_shows_page(shows_query, api.shows.fields, embeds, 1)
+    if not data:
+        abort(404)
+    return jsonify(data=data[0])
+
+
+@app.route('/api/v1/feed/upcoming')
+@page_cache.cached(lambda: ['shows', 'venues', 'artists'])
+def api_upcoming_feed():
+    city = request.args.get('city')
+    state = request.args.get('state')
+    genre = request.args.get('genre')
+    if (city is None) != (state is None) or (genre is not None and city is not None):
+        abort(400)
+    feed_query, keys = feed.query(clock.now(), city=city, state=state, genre=genre)
+    page = paginate_request(feed_query, keys)
+    if page.items:
+        # The first show on the page drops off it once it starts.
+        page_cache.expire_at(page.items[0].start_time)
+    return jsonify(data=[feed.serialize(row) for row in page],
+                   next=page.next_cursor, prev=page.prev_cursor)
+
+
+def require_token(config_key):
+    """Only let requests with "Authorization: Bearer <config[config_key]>" in."""
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(**kwargs):
+            token = app.config.get(config_key)
+            supplied = request.headers.get('Authorization', '')
+            if not token or not hmac.compare_digest(supplied, 'Bearer ' + token):
+                abort(401)
+            return view(**kwargs)
+        return wrapper
+    return decorator
+
+
+@app.route('/api/v1/import/<kind>', methods=['POST'])
+@require_token('IMPORT_API_TOKEN')
+def api_import(kind):
+    if kind not in importer.IMPORTERS:
+        abort(404)
+    fmt = request.args.get('format')
+    if fmt is None:
+        fmt = 'ndjson' if 'json' in request.mimetype else 'csv'
+    if fmt not in importer.FORMATS:
+        abort(400)
+
+    report_name = 'import-%s-%s.csv' % (kind, uuid.uuid4().hex)
+    report_path = os.path.join(app.config['IMPORT_REPORT_DIR'], report_name)
+    records = importer.read_records(importer.text_stream(request.stream), fmt)
+    with open(report_path, 'w', newline='') as report:
+        result = importer.import_records(
+            kind, records, report, app.config['IMPORT_CHUNK_SIZE'],
+            invalidate=page_cache.invalidate)
+    if not result.failed:
+        os.remove(report_path)
+        report_name = None
+    return jsonify(inserted=result.inserted, failed=result.failed,
+                   errors=result.errors, report=report_name)
+
+
+@app.route('/api/v1/export')
+@require_token('EXPORT_API_TOKEN')
+def api_export():
+    kind = request.args.get('type', '')
+    fmt = request.args.get('format', 'ndjson')
+    try:
+        chunks = exporter.export(kind, fmt, app.config['EXPORT_CHUNK_SIZE'])
+    except exporter.ExportError:
+        abort(400)
+    response = Response(stream_with_context(chunks),
+                        mimetype=exporter.MIMETYPES[fmt])
+    response.headers['Content-Disposition'] = \
+        'attachment; filename=%s.%s' % (kind, fmt)
+    return response
+
+
+#  Internal
+#  ----------------------------------------------------------------
+
+@app.route('/internal/pool')
+@require_token('INTERNAL_API_TOKEN')
+def internal_pool():
+    # Every engine has a pool, and counters, of its own.
+    return jsonify({
+        'primary': pool_stats.snapshot(db.engine.pool),
+        'replicas': [dict(replica.status(), pool=pool_stats.snapshot(replica.engine.pool))
+                     for replica in app.extensions['replicas'].replicas],
+    })
+
+
+@app.route('/metrics')
+@require_token('INTERNAL_API_TOKEN')
+def metrics_endpoint():
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+
+@app.after_request
+def compress_api_response(response):
+    if request.path.startswith('/api/'):
+        return api.compress(response, request.headers.get('Accept-Encoding', ''))
+    return response
+
+
+def wants_json():
+    return request.path.startswith(('/api/', '/internal/', '/metrics'))
+
+
+def api_error(error):
+    return jsonify(error=error.code, message=error.name), error.code
+
+
 @app.errorhandler(400)
 def not_found_error(error):
+    if wants_json():
+        return api_error(error)
     return render_template('errors/400.html'), 400
 
 
 @app.errorhandler(401)
 def not_found_error(error):
+    if wants_json():
+        return api_error(error)
     return render_template('errors/401.html'), 401
 
 
 @app.errorhandler(404)
 def not_found_error(error):
+    if wants_json():
+        return api_error(error)
     return render_template('errors/404.html'), 404
 
 
 @app.errorhandler(405)
 def not_found_error(error):
+    if wants_json():
+        return api_error(error)
     return render_template('errors/500.html'), 405
 
 
 @app.errorhandler(500)
 def server_error(error):
+    if wants_json():
+        return api_error(error)
     return render_template('errors/500.html'), 500
 
 
-if not app.debug:
-    file_handler = FileHandler('error.log')
-    file_handler.setFormatter(
-        Formatter(
-            '%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]')
-    )
-    app.logger.setLevel(logging.INFO)
-    file_handler.setLevel(logging.INFO)
-    app.logger.addHandler(file_handler)
-    app.logger.info('errors')
-
 #----------------------------------------------------------------------------#
 # Launch.
 #----------------------------------------------------------------------------#
@@ -0,0 +1,294 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+import collections
+import datetime
+import functools
+import hashlib
+import pickle
+import sqlite3
+import threading
+import time
+
+from flask import current_app, g, make_response, request, session
+
+import clock
+import routing
+
+
+#----------------------------------------------------------------------------#
+# Backends.
+#----------------------------------------------------------------------------#
+
+# Every backend stores cached values plus a version number per tag. Bumping a
+# tag's version invalidates every entry stored under the old one. Versions are
+# nanosecond timestamps of the last bump (or of the first time the tag was
+# seen), so entries can never match a version that was lost (evicted, or from
+# before a restart), and a version tells how recently the tag changed.
+
+
+class NullBackend:
+    def get(self, key):
+        return None
+
+    def set(self, key, value, ttl):
+        pass
+
+    def versions(self, tags):
+        return {tag: 0 for tag in tags}
+
+    def bump(self, tags):
+        pass
+
+
+class MemoryBackend:
+    """In-process LRU with per-entry TTL."""
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self._entries = collections.OrderedDict()
+        self._versions = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                return None
+            expires, value = item
+            if expires <= time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (time.time() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def versions(self, tags):
+        with self._lock:
+            return {tag: self._versions.setdefault(tag, time.time_ns())
+                    for tag in tags}
+
+    def bump(self, tags):
+        with self._lock:
+            for tag in tags:
+                self._versions[tag] = max(self._versions.get(tag, 0) + 1,
+                                          time.time_ns())
+
+
+class SQLiteBackend:
+    """Cache shared by every worker on the host through one SQLite file."""
+
+    PRUNE_EVERY = 200
+
+    def __init__(self, path, max_entries=10000):
+        self.path = path
+        self.max_entries = max_entries
+        self._local = threading.local()
+        self._sets = 0
+        with self._connect() as conn:
+            conn.execute('CREATE TABLE IF NOT EXISTS entries '
+                         '(key TEXT PRIMARY KEY, value BLOB, expires REAL)')
+            conn.execute('CREATE INDEX IF NOT EXISTS ix_entries_expires '
+                         'ON entries (expires)')
+            conn.execute('CREATE TABLE IF NOT EXISTS tags '
+                         '(tag TEXT PRIMARY KEY, version INTEGER)')
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        row = self._connect().execute(
+            'SELECT value FROM entries WHERE key = ? AND expires > ?',
+            (key, time.time())).fetchone()
+        return pickle.loads(row[0]) if row else None
+
+    def set(self, key, value, ttl):
+        conn = self._connect()
+        conn.execute('INSERT OR REPLACE INTO entries VALUES (?, ?, ?)',
+                     (key, pickle.dumps(value), time.time() + ttl))
+        self._sets += 1
+        if self._sets % self.PRUNE_EVERY == 0:
+            self._prune(conn)
+
+    def _prune(self, conn):
+        conn.execute('DELETE FROM entries WHERE expires <= ?', (time.time(),))
+        conn.execute('DELETE FROM entries WHERE key IN (SELECT key FROM entries '
+                     'ORDER BY expires DESC LIMIT -1 OFFSET ?)', (self.max_entries,))
+
+    def versions(self, tags):
+        conn = self._connect()
+        versions = self._select_versions(conn, tags)
+        missing = [tag for tag in tags if tag not in versions]
+        if missing:
+            # Only new tags need a write; lookups of known ones stay reads,
+            # so workers serving cached pages do not queue for the lock.
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                conn.executemany('INSERT OR IGNORE INTO tags VALUES (?, ?)',
+                                 [(tag, time.time_ns()) for tag in missing])
+                versions.update(self._select_versions(conn, missing))
+                conn.execute('COMMIT')
+            except BaseException:
+                conn.execute('ROLLBACK')
+                raise
+        return versions
+
+    def _select_versions(self, conn, tags):
+        placeholders = ', '.join('?' * len(tags))
+        return dict(conn.execute('SELECT tag, version FROM tags WHERE tag IN (%s)'
+                                 % placeholders, list(tags)).fetchall())
+
+    def bump(self, tags):
+        self._connect().executemany(
+            'INSERT INTO tags VALUES (?, ?) '
+            'ON CONFLICT (tag) DO UPDATE SET version = max(version + 1, excluded.version)',
+            [(tag, time.time_ns()) for tag in tags])
+
+
+#----------------------------------------------------------------------------#
+# Page cache.
+#----------------------------------------------------------------------------#
+
+class PageCache:
+    """Caches rendered GET responses and answers conditional requests.
+
+    Entries are tagged with the entities they show ("venue:3", "artists").
+    Handlers that commit a change call invalidate() with the matching tags.
+    """
+
+    def __init__(self, app=None):
+        self.backend = NullBackend()
+        self.default_ttl = 300
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        kind = app.config.get('CACHE_BACKEND', 'memory')
+        max_entries = app.config.get('CACHE_MAX_ENTRIES', 1024)
+        if kind == 'memory':
+            self.backend = MemoryBackend(max_entries)
+        elif kind == 'sqlite':
+            self.backend = SQLiteBackend(app.config['CACHE_SQLITE_PATH'], max_entries)
+        elif kind == 'null':
+            self.backend = NullBackend()
+        else:
+            raise ValueError('Unknown CACHE_BACKEND %r' % kind)
+        self.default_ttl = app.config.get('CACHE_DEFAULT_TTL', self.default_ttl)
+        app.extensions['page_cache'] = self
+
+    def invalidate(self, *tags):
+        try:
+            self.backend.bump(tags)
+        except sqlite3.Error:
+            current_app.logger.exception('Could not invalidate %s', tags)
+
+    def tag(self, *tags):
+        """Add tags to the page being rendered by the current request."""
+        if 'cache_tags' in g:
+            g.cache_tags.update(tags)
+
+    def expire_at(self, when):
+        """Stop serving the page being rendered once the clock reaches `when`.
+
+        Pages that split shows into past and upcoming pass the next start
+        time, so a cached page never lists a started show as upcoming.
+        """
+        if when is not None and 'cache_tags' in g:
+            current = g.get('cache_expires_at')
+            g.cache_expires_at = when if current is None else min(current, when)
+
+    def fragment(self, key, tags, compute, ttl=None):
+        """compute(), kept until one of `tags` is invalidated or `ttl`
+        passes. For the parts of pages that many URLs share."""
+        key = 'fragment:' + key
+        entry = self.backend.get(key)
+        if entry is not None and self.backend.versions(list(entry['versions'])) == entry['versions']:
+            return entry['value']
+        versions = self.backend.versions(tags)
+        value = compute()
+        if not (routing.used_replica() and self._recent(versions)):
+            self.backend.set(key, {'value': value, 'versions': versions}, ttl or self.default_ttl)
+        return value
+
+    def cached(self, tags, ttl=None):
+        """Cache a view. `tags` is called with the view arguments.
+
+        The outcome ('hit', 'miss' or 'bypass') is left on
+        `g.page_cache_result` for the metrics.
+        """
+        def decorator(view):
+            @functools.wraps(view)
+            def wrapper(**kwargs):
+                # Pending flash messages are rendered into the page, so a
+                # response that carries them must be neither served from nor
+                # stored in the cache.
+                if request.method not in ('GET', 'HEAD') or session.get('_flashes'):
+                    g.page_cache_result = 'bypass'
+                    return view(**kwargs)
+
+                key = 'page:' + request.full_path
+                base_tags = tags(**kwargs)
+                entry = self.backend.get(key)
+                if entry is not None and (entry['expires_at'] is None
+                                          or clock.now() < entry['expires_at']):
+                    current = self.backend.versions(list(entry['versions']))
+                    if current == entry['versions']:
+                        g.page_cache_result = 'hit'
+                        return self._respond(entry)
+
+                g.page_cache_result = 'miss'
+                versions = self.backend.versions(base_tags)
+                g.cache_tags = set(base_tags)
+                response = make_response(view(**kwargs))
+                extra_tags = g.pop('cache_tags') - set(base_tags)
+                expires_at = g.pop('cache_expires_at', None)
+                timeout = ttl or self.default_ttl
+                if expires_at is not None:
+                    timeout = min(timeout, (expires_at - clock.now()).total_seconds())
+                if (response.status_code != 200 or response.direct_passthrough
+                        or timeout <= 0):
+                    return response
+                if extra_tags:
+                    versions.update(self.backend.versions(list(extra_tags)))
+                if routing.used_replica() and self._recent(versions):
+                    return response
+
+                body = response.get_data()
+                entry = {
+                    'body': body,
+                    'mimetype': response.mimetype,
+                    'etag': hashlib.md5(body).hexdigest(),
+                    'last_modified': datetime.datetime.utcnow().replace(microsecond=0),
+                    'versions': versions,
+                    'expires_at': expires_at,
+                }
+                self.backend.set(key, entry, timeout)
+                return self._respond(entry, response)
+            return wrapper
+        return decorator
+
+    def _recent(self, versions):
+        # A page read from a replica shortly after one of its tags changed
+        # may predate that change; it is served but not stored.
+        window = current_app.config.get('REPLICA_LAG_SECONDS', 0) * 10 ** 9
+        return max(versions.values(), default=0) > time.time_ns() - window
+
+    def _respond(self, entry, response=None):
+        if response is None:
+            response = current_app.response_class(entry['body'], mimetype=entry['mimetype'])
+        response.set_etag(entry['etag'])
+        response.last_modified = entry['last_modified']
+        response.cache_control.no_cache = True
+        return response.make_conditional(request)
@@ -0,0 +1,25 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+import datetime
+
+
+#----------------------------------------------------------------------------#
+# Clock.
+#----------------------------------------------------------------------------#
+
+# Whether a show is past or upcoming depends on the wall clock. Everything
+# that classifies shows, or decides how long such a classification stays
+# valid, reads the time from here so that one replaceable clock drives both.
+
+_now = datetime.datetime.now
+
+
+def now():
+    return _now()
+
+
+def set_clock(func):
+    """Replace the clock with `func`; pass None to restore the real one."""
+    global _now
+    _now = func or datetime.datetime.now
@@ -0,0 +1,531 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+import os
+import random
+import time
+from datetime import timedelta
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy.dialects import postgresql
+
+import clock
+import counters
+import deletion
+import facets
+import geo
+import exporter
+import feed
+import importer
+import scheduling
+import search
+import seeding
+from models import db, Show, Artist, Venue, CityCentroid, UpcomingShow
+
+
+#----------------------------------------------------------------------------#
+# Index checks.
+#----------------------------------------------------------------------------#
+
+def hot_queries():
+    """(description, query, index the plan is expected to use) triples."""
+    return [
+        ('venue page shows',
+         Show.query.filter(Show.venue_id == 1).order_by(Show.start_time),
+         'ix_shows_venue_id_start_time'),
+        ('artist page shows',
+         Show.query.filter(Show.artist_id == 1).order_by(Show.start_time),
+         'ix_shows_artist_id_start_time'),
+        ('venues in an area',
+         Venue.query.filter(Venue.city == 'San Francisco', Venue.state == 'CA'),
+         'ix_venues_state_city_name_id'),
+        ('venues listing page',
+         Venue.query.order_by(Venue.state, Venue.city, Venue.name, Venue.id).limit(21),
+         'ix_venues_state_city_name_id'),
+        ('venue search',
+         Venue.query.filter(Venue.search_vector.op('@@')(
+             db.func.to_tsquery(search.TS_CONFIG, 'music:*'))),
+         'ix_venues_search_vector'),
+        ('artist search',
+         Artist.query.filter(Artist.search_vector.op('@@')(
+             db.func.to_tsquery(search.TS_CONFIG, 'music:*'))),
+         'ix_artists_search_vector'),
+        ('venues by genre',
+         Venue.query.filter(*facets.Selection(['Jazz']).criteria(Venue)),
+         'ix_venues_genres'),
+        ('artists by any of several genres',
+         Artist.query.filter(*facets.Selection(['Jazz', 'Blues'], 'any').criteria(Artist)),
+         'ix_artists_genres'),
+        ('venues near a point',
+         geo_page(geo.Area.circle(37.77, -122.42, 40)),
+         'ix_venues_geohash'),
+        ('venue bookings in a week',
+         Show.query.filter(*scheduling.booked(Show.venue_id, 1, clock.now(),
+                                              clock.now() + timedelta(days=7))),
+         'ex_shows_venue_booking'),
+        ('artist bookings in a week',
+         Show.query.filter(*scheduling.booked(Show.artist_id, 1, clock.now(),
+                                              clock.now() + timedelta(days=7))),
+         'ex_shows_artist_booking'),
+        ('shows listing page',
+         Show.query.order_by(Show.start_time, Show.id).limit(21),
+         'ix_shows_start_time_id'),
+        ('artists listing page',
+         Artist.query.order_by(Artist.name, Artist.id).limit(21),
+         'ix_artists_name_id'),
+        ('upcoming shows feed',
+         feed_page(),
+         'ix_upcoming_shows_start_time_show_id'),
+        ('upcoming shows feed by area',
+         feed_page(city='San Francisco', state='CA'),
+         'ix_upcoming_shows_area_start_time_show_id'),
+        ('upcoming shows feed by genre',
+         feed_page(genre='Jazz'),
+         'upcoming_show_genres_pkey'),
+    ]
+
+
+def feed_page(**filters):
+    feed_query, keys = feed.query(db.func.localtimestamp(), **filters)
+    return feed_query.order_by(*keys).limit(21)
+
+
+def geo_page(area, cells=True):
+    distance = area.distance_km()
+    return db.session.query(Venue.id, distance).filter(*area.criteria(cells)) \
+        .order_by(distance, Venue.id).limit(20)
+
+
+def plan_indexes(plan):
+    """Collect every index name referenced anywhere in an EXPLAIN plan."""
+    found = set()
+    if 'Index Name' in plan:
+        found.add(plan['Index Name'])
+    for child in plan.get('Plans', []):
+        found |= plan_indexes(child)
+    return found
+
+
+def explain(query):
+    # Bound parameters, passed through to the driver: not every type (arrays
+    # for one) can be rendered as a literal.
+    compiled = query.statement.compile(dialect=db.engine.dialect)
+    result = db.session.connection().exec_driver_sql(
+        'EXPLAIN (FORMAT JSON) %s' % compiled, compiled.params)
+    return result.scalar()[0]['Plan']
+
+
+@click.command('check-indexes')
+@click.option('--natural', is_flag=True,
+              help='Keep sequential scans enabled and trust the planner costs. '
+                   'Only meaningful against a production-sized database.')
+@with_appcontext
+def check_indexes(natural):
+    """EXPLAIN the hot queries and fail if one does not use its index."""
+    failures = 0
+    try:
+        if not natural:
+            # On a small database the planner rightly prefers a sequential
+            # scan, so switch it off to check the index can serve the query.
+            db.session.execute(db.text('SET LOCAL enable_seqscan = off'))
+        for description, query, index in hot_queries():
+            used = plan_indexes(explain(query))
+            if index in used:
+                click.echo('ok    %s uses %s' % (description, index))
+            else:
+                failures += 1
+                click.echo('FAIL  %s expected %s, plan used %s'
+                           % (description, index, ', '.join(sorted(used)) or 'no index'))
+    finally:
+        db.session.rollback()
+    if failures:
+        raise click.ClickException('%d hot queries do not use their index' % failures)
+
+
+#----------------------------------------------------------------------------#
+# Search benchmark.
+#----------------------------------------------------------------------------#
+
+BENCH_WORDS = ['Blue', 'Note', 'Velvet', 'Echo', 'Royal', 'Garden', 'Hall',
+               'Lounge', 'Musical', 'Hop', 'Park', 'Square', 'Dueling',
+               'Pianos', 'Rocks', 'Harbor', 'Crystal', 'Ballroom', 'Cellar',
+               'Fillmore']
+BENCH_CITIES = ['San Francisco', 'New York', 'Chicago', 'Austin', 'Seattle',
+                'Denver', 'Nashville', 'Portland']
+BENCH_GENRES = ['Jazz', 'Blues', 'Folk', 'Punk', 'Soul', 'Reggae', 'Pop']
+
+# Synthetic venues generated server side so that a million rows load in
+# seconds. The word lists are constants, never user input.
+BENCH_INSERT = """
+INSERT INTO venues (name, city, state, genres, seeking_talent, search_vector)
+SELECT name, city, 'CA', ARRAY[genre], false,
+       to_tsvector('simple', concat_ws(' ', name, city, 'CA', genre))
+FROM (
+    SELECT (ARRAY[{words}])[1 + (i * 7) % {n_words}] || ' ' ||
+           (ARRAY[{words}])[1 + (i * 13) % {n_words}] || ' ' || i AS name,
+           (ARRAY[{cities}])[1 + i % {n_cities}] AS city,
+           (ARRAY[{genres}])[1 + i % {n_genres}] AS genre
+    FROM generate_series(1, :rows) AS i
+) AS synthetic
+"""
+
+
+def _sql_list(values):
+    return ', '.join("'%s'" % value for value in values)
+
+
+def _percentile(timings, fraction):
+    ordered = sorted(timings)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def _time_queries(run, terms):
+    timings = []
+    for term in terms:
+        started = time.perf_counter()
+        run(term)
+        timings.append((time.perf_counter() - started) * 1000)
+    return timings
+
+
+@click.command('bench-search')
+@click.option('--rows', type=int, multiple=True,
+              default=(10000, 100000, 1000000), show_default=True,
+              help='Synthetic venue count; repeat for several sizes.')
+@click.option('--queries', type=int, default=100, show_default=True)
+@click.option('--limit', type=int, default=search.DEFAULT_LIMIT, show_default=True)
+@with_appcontext
+def bench_search(rows, queries, limit):
+    """Compare ilike and full-text venue search latency.
+
+    Rows are inserted inside a transaction that is rolled back afterwards,
+    so the command can be pointed at a development database.
+    """
+    insert = BENCH_INSERT.format(
+        words=_sql_list(BENCH_WORDS), n_words=len(BENCH_WORDS),
+        cities=_sql_list(BENCH_CITIES), n_cities=len(BENCH_CITIES),
+        genres=_sql_list(BENCH_GENRES), n_genres=len(BENCH_GENRES))
+    rng = random.Random(0)
+
+    def common_term():
+        return rng.choice(BENCH_WORDS)[:rng.randint(3, 6)].lower()
+
+    def selective_term(size):
+        # Matches the generated name of one specific row.
+        i = rng.randint(1, size)
+        return '%s %s %d' % (BENCH_WORDS[(i * 7) % len(BENCH_WORDS)],
+                             BENCH_WORDS[(i * 13) % len(BENCH_WORDS)], i)
+
+    def run_ilike(term):
+        Venue.query.filter(Venue.name.ilike('%' + term + '%')).limit(limit).all()
+
+    def run_search(term):
+        search.search(Venue, term, limit)
+
+    click.echo('%10s  %-10s %-8s %9s %9s %9s'
+               % ('rows', 'terms', 'path', 'p50 ms', 'p95 ms', 'max ms'))
+    for size in rows:
+        try:
+            db.session.execute(db.text(insert), {'rows': size})
+            db.session.execute(db.text('ANALYZE venues'))
+            term_sets = (
+                ('common', [common_term() for _ in range(queries)]),
+                ('selective', [selective_term(size) for _ in range(queries)]),
+            )
+            for kind, terms in term_sets:
+                for label, run in (('ilike', run_ilike), ('search', run_search)):
+                    timings = _time_queries(run, terms)
+                    click.echo('%10d  %-10s %-8s %9.2f %9.2f %9.2f' % (
+                        size, kind, label, _percentile(timings, 0.5),
+                        _percentile(timings, 0.95), max(timings)))
+        finally:
+            db.session.rollback()
+
+
+#----------------------------------------------------------------------------#
+# Geocoding.
+#----------------------------------------------------------------------------#
+
+@click.command('load-centroids')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@with_appcontext
+def load_centroids(path):
+    """Load US city centroids from a Census Gazetteer places file.
+
+    The file is at https://www.census.gov/geographies/reference-files/time-series/geo/gazetteer-files.html
+    ("Places"); a CSV with state, city, latitude and longitude columns works
+    too. Existing cities are updated.
+    """
+    table = CityCentroid.__table__
+    with open(path, newline='', encoding='utf-8') as stream:
+        rows = list(geo.read_centroids(stream))
+    for start in range(0, len(rows), 5000):
+        insert = postgresql.insert(table).values(rows[start:start + 5000])
+        db.session.execute(insert.on_conflict_do_update(
+            index_elements=['state', 'city_key'],
+            set_={column: insert.excluded[column]
+                  for column in ('name', 'latitude', 'longitude', 'geohash')}))
+    db.session.commit()
+    click.echo('Loaded %d city centroids.' % len(rows))
+
+
+@click.command('geocode-venues')
+@click.option('--batch-size', type=int, default=1000, show_default=True,
+              help='Venue ids updated per transaction.')
+@with_appcontext
+def geocode_venues(batch_size):
+    """Place venues without coordinates at the centroid of their city."""
+    placed = sum(geo.geocode(db.session, batch_size))
+    unplaced = db.session.query(db.func.count(Venue.id)) \
+        .filter(Venue.latitude.is_(None)).scalar()
+    click.echo('Placed %d venues; %d have a city without a centroid.' % (placed, unplaced))
+
+
+#----------------------------------------------------------------------------#
+# Geospatial search benchmark.
+#----------------------------------------------------------------------------#
+
+# Where synthetic venues cluster; the rest are spread over the contiguous US.
+BENCH_METROS = [(37.77, -122.42), (40.71, -74.01), (41.88, -87.63),
+                (30.27, -97.74), (47.61, -122.33), (39.74, -104.99),
+                (36.16, -86.78), (45.52, -122.68)]
+BENCH_US = (24.5, -124.8, 49.4, -66.9)
+
+BENCH_GEO_INSERT = """
+INSERT INTO venues (name, city, state, seeking_talent, latitude, longitude, geohash)
+SELECT 'Bench venue', 'Bench', 'CA', false, latitude, longitude, geohash
+FROM unnest(:latitudes, :longitudes, :geohashes) AS synthetic(latitude, longitude, geohash)
+"""
+
+
+def _bench_points(rng, count):
+    points = []
+    for _ in range(count):
+        if rng.random() < 0.8:
+            latitude, longitude = rng.choice(BENCH_METROS)
+            latitude += rng.gauss(0, 0.3)
+            longitude += rng.gauss(0, 0.3)
+        else:
+            south, west, north, east = BENCH_US
+            latitude, longitude = rng.uniform(south, north), rng.uniform(west, east)
+        points.append((latitude, longitude))
+    return points
+
+
+@click.command('bench-geo')
+@click.option('--rows', type=int, multiple=True,
+              default=(10000, 100000, 1000000), show_default=True,
+              help='Synthetic venue count; repeat for several sizes.')
+@click.option('--queries', type=int, default=100, show_default=True)
+@click.option('--radius', type=float, multiple=True, default=(5, 25, 100),
+              show_default=True, help='Radius in miles; repeat for several.')
+@with_appcontext
+def bench_geo(rows, queries, radius):
+    """Compare nearest-venue queries with and without the geohash index.
+
+    Rows are inserted inside a transaction that is rolled back afterwards,
+    so the command can be pointed at a development database.
+    """
+    rng = random.Random(0)
+    click.echo('%10s  %8s %-8s %9s %9s %9s %9s'
+               % ('rows', 'radius', 'path', 'p50 ms', 'p95 ms', 'max ms', 'found'))
+    for size in rows:
+        try:
+            inserted = 0
+            while inserted < size:
+                points = _bench_points(rng, min(100000, size - inserted))
+                db.session.execute(db.text(BENCH_GEO_INSERT), {
+                    'latitudes': [latitude for latitude, _ in points],
+                    'longitudes': [longitude for _, longitude in points],
+                    'geohashes': [geo.encode(*point) for point in points]})
+                inserted += len(points)
+            db.session.execute(db.text('ANALYZE venues'))
+            for miles in radius:
+                km = miles * geo.KM_PER_UNIT['mi']
+                areas = [geo.Area.circle(latitude, longitude, km)
+                         for latitude, longitude in _bench_points(rng, queries)]
+                paths = (
+                    ('geohash', lambda area: geo.nearest(db.session.query(Venue.id), area, 20)),
+                    ('scan', lambda area: geo_page(area, cells=False).all()),
+                )
+                for label, run in paths:
+                    found = []
+                    timings = _time_queries(lambda area: found.append(len(run(area))), areas)
+                    click.echo('%10d  %8g %-8s %9.2f %9.2f %9.2f %9.1f' % (
+                        size, miles, label, _percentile(timings, 0.5),
+                        _percentile(timings, 0.95), max(timings),
+                        sum(found) / len(found)))
+        finally:
+            db.session.rollback()
+
+
+#----------------------------------------------------------------------------#
+# Synthetic data.
+#----------------------------------------------------------------------------#
+
+@click.command('seed')
+@click.option('--venues', type=click.IntRange(1), default=1000, show_default=True)
+@click.option('--artists', type=click.IntRange(1), default=3000, show_default=True)
+@click.option('--shows', type=click.IntRange(0), default=100000, show_default=True)
+@click.option('--days', type=click.IntRange(1), default=730, show_default=True,
+              help='Days the shows are spread over, half past and half upcoming.')
+@click.option('--skew', type=click.FloatRange(0), default=1.1, show_default=True,
+              help='Zipf exponent of shows per venue and per artist; 0 spreads them evenly.')
+@click.option('--random-seed', type=int, default=0, show_default=True)
+@with_appcontext
+def seed_command(venues, artists, shows, days, skew, random_seed):
+    """Add synthetic venues, artists and shows, e.g. for load tests.
+
+    The same options and seed give the same data. Rows are added to what is
+    there already, in one transaction.
+    """
+    started = time.perf_counter()
+    counts = seeding.seed(db.session, random.Random(random_seed),
+                          venues, artists, shows, days, skew)
+    busiest = db.session.query(Venue.show_count).order_by(
+        Venue.show_count.desc()).limit(1).scalar()
+    click.echo('Added %d venues, %d artists and %d shows in %.1fs; the busiest '
+               'venue has %d shows.' % (*counts, time.perf_counter() - started, busiest))
+
+
+#----------------------------------------------------------------------------#
+# Bulk import.
+#----------------------------------------------------------------------------#
+
+@click.command('import')
+@click.argument('kind', type=click.Choice(sorted(importer.IMPORTERS)))
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'fmt', type=click.Choice(importer.FORMATS),
+              help='Input format; guessed from the file extension by default.')
+@click.option('--chunk-size', type=int, default=importer.DEFAULT_CHUNK_SIZE,
+              show_default=True, help='Rows validated and inserted per transaction.')
+@click.option('--report', type=click.Path(dir_okay=False),
+              help='Where to write rejected rows. Defaults to PATH.errors.csv.')
+@with_appcontext
+def import_command(kind, path, fmt, chunk_size, report):
+    """Bulk load venues, artists or shows from a CSV or NDJSON file."""
+    if fmt is None:
+        fmt = 'ndjson' if path.endswith(('.ndjson', '.jsonl')) else 'csv'
+    report = report or path + '.errors.csv'
+    started = time.perf_counter()
+    with open(path, newline='', encoding='utf-8') as stream, \
+            open(report, 'w', newline='') as report_stream:
+        result = importer.import_records(
+            kind, importer.read_records(stream, fmt), report_stream, chunk_size,
+            invalidate=current_app.extensions['page_cache'].invalidate)
+    elapsed = time.perf_counter() - started
+    click.echo('Imported %d %s in %.1fs (%d rows/s), rejected %d.'
+               % (result.inserted, kind, elapsed,
+                  result.inserted / elapsed if elapsed else 0, result.failed))
+    if result.failed:
+        click.echo('Rejected rows are listed in %s' % report)
+    else:
+        os.remove(report)
+
+
+#----------------------------------------------------------------------------#
+# Bulk export.
+#----------------------------------------------------------------------------#
+
+@click.command('export')
+@click.argument('kind', type=click.Choice(sorted(exporter.RESOURCES)))
+@click.option('--format', 'fmt', type=click.Choice(exporter.FORMATS),
+              default='ndjson', show_default=True)
+@click.option('--output', '-o', type=click.File('wb'), default='-',
+              help='File to write to; standard output by default.')
+@click.option('--chunk-size', type=int, default=exporter.DEFAULT_CHUNK_SIZE,
+              show_default=True, help='Rows fetched from the cursor at a time.')
+@with_appcontext
+def export_command(kind, fmt, output, chunk_size):
+    """Stream every venue, artist or show as NDJSON, CSV or Parquet."""
+    try:
+        for data in exporter.export(kind, fmt, chunk_size):
+            output.write(data)
+    except exporter.ExportError as e:
+        raise click.ClickException(str(e))
+    finally:
+        db.session.rollback()
+
+
+#----------------------------------------------------------------------------#
+# Upcoming shows feed.
+#----------------------------------------------------------------------------#
+
+@click.command('sweep-feed')
+@with_appcontext
+def sweep_feed():
+    """Drop started shows from the upcoming shows feed; run it from cron."""
+    removed = feed.sweep(db.session)
+    db.session.commit()
+    click.echo('Removed %d started shows from the feed.' % removed)
+
+
+@click.command('rebuild-feed')
+@with_appcontext
+def rebuild_feed():
+    """Rebuild the upcoming shows feed from the shows table."""
+    feed.rebuild(db.session)
+    db.session.commit()
+    click.echo('Feed holds %d upcoming shows.'
+               % db.session.query(db.func.count(UpcomingShow.show_id)).scalar())
+
+
+#----------------------------------------------------------------------------#
+# Show counters.
+#----------------------------------------------------------------------------#
+
+@click.command('sweep-counts')
+@with_appcontext
+def sweep_counts():
+    """Count shows that have started as past; run it from cron."""
+    changed = counters.sweep(db.session, clock.now())
+    db.session.commit()
+    click.echo('Reclassified the shows of %d venues and artists.' % changed)
+
+
+@click.command('reconcile-counts')
+@click.option('--dry-run', is_flag=True, help='Report drift without fixing it.')
+@with_appcontext
+def reconcile_counts(dry_run):
+    """Recompute the venue and artist show counters and report drift."""
+    drift = counters.reconcile(db.session, fix=not dry_run)
+    db.session.commit()
+    for table, (entities, difference) in drift.items():
+        click.echo('%s: %d with drifted counts (off by %d in total)%s.'
+                   % (table, entities, difference,
+                      ', fixed' if entities and not dry_run else ''))
+    if dry_run and any(entities for entities, _ in drift.values()):
+        raise SystemExit(1)
+
+
+#----------------------------------------------------------------------------#
+# Deletion.
+#----------------------------------------------------------------------------#
+
+@click.command('purge-hidden')
+@with_appcontext
+def purge_hidden():
+    """Finish deleting hidden venues and artists, e.g. after a restart."""
+    purger = current_app.extensions['purger']
+    entities = deletion.hidden_entities(db.session)
+    for model, entity_id in entities:
+        purger.run(model, entity_id)
+    click.echo('Purged %d hidden venues and artists.' % len(entities))
+
+
+def init_app(app):
+    app.cli.add_command(check_indexes)
+    app.cli.add_command(bench_search)
+    app.cli.add_command(import_command)
+    app.cli.add_command(export_command)
+    app.cli.add_command(sweep_feed)
+    app.cli.add_command(rebuild_feed)
+    app.cli.add_command(sweep_counts)
+    app.cli.add_command(reconcile_counts)
+    app.cli.add_command(purge_hidden)
+    app.cli.add_command(load_centroids)
+    app.cli.add_command(geocode_venues)
+    app.cli.add_command(bench_geo)
+    app.cli.add_command(seed_command)
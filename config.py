@@ -1,13 +1,120 @@
+import tempfile
 from os import environ, path
 from dotenv import load_dotenv
 
+from pool_stats import TimedQueuePool
+
 
 basedir = path.abspath(path.dirname(__file__))
 load_dotenv(path.join(basedir, '.env'))
 
 
+def engine_options(pool_size, max_overflow, pool_timeout, pool_recycle,
+                   pool_pre_ping=True):
+    """SQLAlchemy pool settings; DB_POOL_* environment variables win."""
+    return {
+        'poolclass': TimedQueuePool,
+        'pool_size': int(environ.get('DB_POOL_SIZE', pool_size)),
+        'max_overflow': int(environ.get('DB_MAX_OVERFLOW', max_overflow)),
+        'pool_timeout': float(environ.get('DB_POOL_TIMEOUT', pool_timeout)),
+        'pool_recycle': int(environ.get('DB_POOL_RECYCLE', pool_recycle)),
+        'pool_pre_ping': environ.get(
+            'DB_POOL_PRE_PING', str(pool_pre_ping)).lower() in ('1', 'true', 'yes'),
+    }
+
+
+def uri_list(name):
+    return [uri.strip() for uri in environ.get(name, '').split(',') if uri.strip()]
+
+
 class Config:
     SECRET_KEY = environ.get('SECRET_KEY')
     DEBUG = True
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     SQLALCHEMY_DATABASE_URI = environ.get('DATABASE_URI')
+    SQLALCHEMY_ENGINE_OPTIONS = engine_options(
+        pool_size=5, max_overflow=10, pool_timeout=30, pool_recycle=1800)
+    # Comma-separated read replicas. Reads of GET requests are spread over
+    # the healthy ones; with none configured every query uses the primary.
+    SQLALCHEMY_REPLICA_URIS = uri_list('DATABASE_REPLICA_URIS')
+    REPLICA_CHECK_INTERVAL = int(environ.get('REPLICA_CHECK_INTERVAL', 10))
+    # Upper bound on replication lag: a client keeps reading from the
+    # primary for this long after a write.
+    REPLICA_LAG_SECONDS = int(environ.get('REPLICA_LAG_SECONDS', 10))
+    SEARCH_RESULT_LIMIT = int(environ.get('SEARCH_RESULT_LIMIT', 50))
+    # Upcoming shows listed on a venue or artist page; the rest are linked.
+    DETAIL_UPCOMING_SHOWS = int(environ.get('DETAIL_UPCOMING_SHOWS', 50))
+    SUGGEST_MAX_AGE = int(environ.get('SUGGEST_MAX_AGE', 300))
+    # 'memory' (per-process LRU), 'sqlite' (shared by the workers on a host)
+    # or 'null' (disabled).
+    CACHE_BACKEND = environ.get('CACHE_BACKEND', 'memory')
+    CACHE_DEFAULT_TTL = int(environ.get('CACHE_DEFAULT_TTL', 300))
+    CACHE_MAX_ENTRIES = int(environ.get('CACHE_MAX_ENTRIES', 1024))
+    CACHE_SQLITE_PATH = environ.get(
+        'CACHE_SQLITE_PATH', path.join(tempfile.gettempdir(), 'fyyur-cache.sqlite3'))
+    # The bulk import endpoint is disabled unless a token is configured.
+    IMPORT_API_TOKEN = environ.get('IMPORT_API_TOKEN')
+    IMPORT_CHUNK_SIZE = int(environ.get('IMPORT_CHUNK_SIZE', 1000))
+    IMPORT_REPORT_DIR = environ.get('IMPORT_REPORT_DIR', tempfile.gettempdir())
+    EXPORT_API_TOKEN = environ.get('EXPORT_API_TOKEN')
+    EXPORT_CHUNK_SIZE = int(environ.get('EXPORT_CHUNK_SIZE', 5000))
+    # /internal/* endpoints are disabled unless a token is configured.
+    INTERNAL_API_TOKEN = environ.get('INTERNAL_API_TOKEN')
+    # Share of requests whose SQL is counted and timed (0 to 1), and how
+    # often one statement may run in a request before it is reported.
+    PROFILER_SAMPLE_RATE = float(environ.get('PROFILER_SAMPLE_RATE', 0.01))
+    PROFILER_REPEAT_THRESHOLD = int(environ.get('PROFILER_REPEAT_THRESHOLD', 10))
+    # Directory shared by the worker processes of a host, so /metrics on any
+    # of them reports the totals of all. Without it each reports its own.
+    METRICS_DIR = environ.get('METRICS_DIR')
+    METRICS_FLUSH_INTERVAL = int(environ.get('METRICS_FLUSH_INTERVAL', 5))
+    # Records are written by a background thread, to stderr or to LOG_FILE
+    # rotated every LOG_ROTATE_WHEN and at LOG_MAX_BYTES. Worker processes
+    # must not share one LOG_FILE; a {pid} in it is replaced by the id of
+    # each process.
+    LOG_LEVEL = environ.get('LOG_LEVEL', 'INFO')
+    LOG_FORMAT = environ.get('LOG_FORMAT', 'json')
+    LOG_FILE = environ.get('LOG_FILE')
+    LOG_ROTATE_WHEN = environ.get('LOG_ROTATE_WHEN', 'midnight')
+    LOG_MAX_BYTES = int(environ.get('LOG_MAX_BYTES', 50 * 1024 * 1024))
+    LOG_BACKUP_COUNT = int(environ.get('LOG_BACKUP_COUNT', 14))
+    LOG_QUEUE_SIZE = int(environ.get('LOG_QUEUE_SIZE', 10000))
+    # Share of requests whose INFO and DEBUG records are kept.
+    LOG_SAMPLE_RATE = float(environ.get('LOG_SAMPLE_RATE', 1))
+    # Venues and artists with more shows than this are hidden at once and
+    # their shows deleted in the background, DELETE_BATCH_SIZE per
+    # transaction with a DELETE_BATCH_PAUSE (seconds) between batches.
+    DELETE_INLINE_LIMIT = int(environ.get('DELETE_INLINE_LIMIT', 1000))
+    DELETE_BATCH_SIZE = int(environ.get('DELETE_BATCH_SIZE', 500))
+    DELETE_BATCH_PAUSE = float(environ.get('DELETE_BATCH_PAUSE', 0.1))
+    # Minutes a show books its venue and artist for when no end time is given.
+    SHOW_DEFAULT_DURATION = int(environ.get('SHOW_DEFAULT_DURATION', 180))
+
+
+class DevelopmentConfig(Config):
+    DEBUG = True
+    PROFILER_SAMPLE_RATE = float(environ.get('PROFILER_SAMPLE_RATE', 1))
+    LOG_FORMAT = environ.get('LOG_FORMAT', 'text')
+    SQLALCHEMY_ENGINE_OPTIONS = engine_options(
+        pool_size=2, max_overflow=3, pool_timeout=10, pool_recycle=1800)
+
+
+class ProductionConfig(Config):
+    DEBUG = False
+    LOG_FILE = environ.get('LOG_FILE', 'error-{pid}.log')
+    LOG_SAMPLE_RATE = float(environ.get('LOG_SAMPLE_RATE', 0.1))
+    # Size pool_size to the threads per worker; every worker process holds
+    # up to pool_size + max_overflow connections.
+    SQLALCHEMY_ENGINE_OPTIONS = engine_options(
+        pool_size=10, max_overflow=5, pool_timeout=5, pool_recycle=600)
+
+
+class TestingConfig(Config):
+    TESTING = True
+    DEBUG = False
+    CACHE_BACKEND = 'null'
+    WTF_CSRF_ENABLED = False
+    SQLALCHEMY_DATABASE_URI = environ.get('TEST_DATABASE_URI', Config.SQLALCHEMY_DATABASE_URI)
+    SQLALCHEMY_REPLICA_URIS = uri_list('TEST_DATABASE_REPLICA_URIS')
+    SQLALCHEMY_ENGINE_OPTIONS = engine_options(
+        pool_size=1, max_overflow=0, pool_timeout=5, pool_recycle=-1)
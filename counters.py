@@ -0,0 +1,207 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+from sqlalchemy import DDL, case, event, func
+
+from models import db, Show, ShowCountWatermark
+
+
+#----------------------------------------------------------------------------#
+# Show counters.
+#----------------------------------------------------------------------------#
+
+# Venues and artists carry show_count, past_show_count and
+# upcoming_show_count. Triggers on shows keep them current on every
+# insert, delete and update, whichever way the change is made (ORM, bulk
+# delete, bulk import). Past and upcoming are split at the single
+# show_count_watermark time rather than at the wall clock, so a count never
+# goes stale: counts() corrects for the shows between the watermark and now,
+# and sweep() moves the watermark forward to keep that range short.
+
+TRIGGER_FUNCTION = """
+CREATE OR REPLACE FUNCTION count_shows() RETURNS trigger AS $$
+DECLARE
+    watermark timestamp;
+BEGIN
+    -- Shared lock: sweep() and reconcile() cannot move the watermark
+    -- while shows are being counted against it.
+    SELECT classified_until INTO watermark FROM show_count_watermark FOR SHARE;
+    IF TG_OP = 'UPDATE' THEN
+        -- Nothing to count unless a venue, artist or start time changed.
+        IF NOT EXISTS (
+                SELECT 1 FROM old_rows o JOIN new_rows n ON n.id = o.id
+                WHERE (o.venue_id, o.artist_id, o.start_time)
+                    IS DISTINCT FROM (n.venue_id, n.artist_id, n.start_time)) THEN
+            RETURN NULL;
+        END IF;
+    END IF;
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        UPDATE venues t SET show_count = show_count - d.total,
+            past_show_count = past_show_count - d.past,
+            upcoming_show_count = upcoming_show_count - d.upcoming
+        FROM (SELECT venue_id AS id, count(*) AS total,
+                  count(*) FILTER (WHERE start_time < watermark) AS past,
+                  count(*) FILTER (WHERE start_time >= watermark) AS upcoming
+              FROM old_rows GROUP BY venue_id) d
+        WHERE t.id = d.id;
+        UPDATE artists t SET show_count = show_count - d.total,
+            past_show_count = past_show_count - d.past,
+            upcoming_show_count = upcoming_show_count - d.upcoming
+        FROM (SELECT artist_id AS id, count(*) AS total,
+                  count(*) FILTER (WHERE start_time < watermark) AS past,
+                  count(*) FILTER (WHERE start_time >= watermark) AS upcoming
+              FROM old_rows GROUP BY artist_id) d
+        WHERE t.id = d.id;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        UPDATE venues t SET show_count = show_count + d.total,
+            past_show_count = past_show_count + d.past,
+            upcoming_show_count = upcoming_show_count + d.upcoming
+        FROM (SELECT venue_id AS id, count(*) AS total,
+                  count(*) FILTER (WHERE start_time < watermark) AS past,
+                  count(*) FILTER (WHERE start_time >= watermark) AS upcoming
+              FROM new_rows GROUP BY venue_id) d
+        WHERE t.id = d.id;
+        UPDATE artists t SET show_count = show_count + d.total,
+            past_show_count = past_show_count + d.past,
+            upcoming_show_count = upcoming_show_count + d.upcoming
+        FROM (SELECT artist_id AS id, count(*) AS total,
+                  count(*) FILTER (WHERE start_time < watermark) AS past,
+                  count(*) FILTER (WHERE start_time >= watermark) AS upcoming
+              FROM new_rows GROUP BY artist_id) d
+        WHERE t.id = d.id;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql
+"""
+
+# One trigger per operation, each firing once per statement with the rows
+# it changed as transition tables: a bulk insert or a cascading delete
+# updates each venue and artist once, not once per show.
+TRIGGERS = [
+    """
+CREATE TRIGGER shows_count_insert AFTER INSERT ON shows
+REFERENCING NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE PROCEDURE count_shows()
+""",
+    """
+CREATE TRIGGER shows_count_update AFTER UPDATE ON shows
+REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE PROCEDURE count_shows()
+""",
+    """
+CREATE TRIGGER shows_count_delete AFTER DELETE ON shows
+REFERENCING OLD TABLE AS old_rows
+FOR EACH STATEMENT EXECUTE PROCEDURE count_shows()
+""",
+]
+
+WATERMARK_ROW = """
+INSERT INTO show_count_watermark (id, classified_until) VALUES (1, LOCALTIMESTAMP)
+"""
+
+# Moves the counts of shows that started in [:old, :new) from upcoming to past.
+RECLASSIFY = """
+UPDATE {table} t SET past_show_count = past_show_count + moved.n,
+    upcoming_show_count = upcoming_show_count - moved.n
+FROM (SELECT {column} AS id, count(*) AS n FROM shows
+      WHERE start_time >= :old AND start_time < :new GROUP BY {column}) moved
+WHERE t.id = moved.id
+"""
+
+# Counts recomputed from the shows table against :watermark.
+ACTUAL = """
+SELECT t.id, count(s.id) AS total,
+    count(*) FILTER (WHERE s.start_time < :watermark) AS past,
+    count(*) FILTER (WHERE s.start_time >= :watermark) AS upcoming
+FROM {table} t LEFT JOIN shows s ON s.{column} = t.id
+GROUP BY t.id
+"""
+
+DRIFT = """
+WITH actual AS ({actual})
+SELECT count(*), coalesce(sum(abs(t.show_count - a.total)
+    + abs(t.past_show_count - a.past) + abs(t.upcoming_show_count - a.upcoming)), 0)
+FROM {table} t JOIN actual a ON a.id = t.id
+WHERE (t.show_count, t.past_show_count, t.upcoming_show_count)
+    IS DISTINCT FROM (a.total, a.past, a.upcoming)
+"""
+
+FIX = """
+WITH actual AS ({actual})
+UPDATE {table} t SET show_count = a.total, past_show_count = a.past,
+    upcoming_show_count = a.upcoming
+FROM actual a
+WHERE a.id = t.id AND (t.show_count, t.past_show_count, t.upcoming_show_count)
+    IS DISTINCT FROM (a.total, a.past, a.upcoming)
+"""
+
+TABLES = (('venues', 'venue_id'), ('artists', 'artist_id'))
+
+# create_all() sets these up too, so a fresh database counts from the start.
+event.listen(ShowCountWatermark.__table__, 'after_create',
+             DDL(WATERMARK_ROW).execute_if(dialect='postgresql'))
+event.listen(Show.__table__, 'after_create',
+             DDL(TRIGGER_FUNCTION).execute_if(dialect='postgresql'))
+for trigger in TRIGGERS:
+    event.listen(Show.__table__, 'after_create',
+                 DDL(trigger).execute_if(dialect='postgresql'))
+
+
+def counts(entity, column, now):
+    """(past, upcoming) show counts of a venue or artist as of `now`.
+
+    The stored counts are split at the watermark; the shows between it and
+    `now` are counted through the (entity, start_time) index and moved over.
+    """
+    watermark = db.session.query(ShowCountWatermark.classified_until) \
+        .filter(ShowCountWatermark.id == 1).scalar_subquery()
+    moved = db.session.query(func.coalesce(func.sum(
+        case((Show.start_time < now, 1), else_=-1)), 0)).filter(
+        column == entity.id,
+        Show.start_time >= func.least(watermark, now),
+        Show.start_time < func.greatest(watermark, now)).scalar()
+    return entity.past_show_count + moved, entity.upcoming_show_count - moved
+
+
+def _lock_watermark(session):
+    return session.query(ShowCountWatermark).filter(
+        ShowCountWatermark.id == 1).with_for_update().one()
+
+
+def sweep(session, now):
+    """Move the watermark forward to `now`.
+
+    Returns the number of venue and artist rows whose counts changed.
+    """
+    watermark = _lock_watermark(session)
+    if now <= watermark.classified_until:
+        return 0
+    moved = 0
+    for table, column in TABLES:
+        result = session.execute(
+            db.text(RECLASSIFY.format(table=table, column=column)),
+            {'old': watermark.classified_until, 'new': now})
+        moved += result.rowcount
+    watermark.classified_until = now
+    return moved
+
+
+def reconcile(session, fix=True):
+    """Recompute every counter from the shows table.
+
+    Returns {table: (entities off, total difference)} as found before the
+    fix. The watermark is locked throughout, so no show is counted
+    concurrently.
+    """
+    watermark = _lock_watermark(session).classified_until
+    drift = {}
+    for table, column in TABLES:
+        actual = ACTUAL.format(table=table, column=column)
+        params = {'watermark': watermark}
+        drift[table] = tuple(session.execute(
+            db.text(DRIFT.format(actual=actual, table=table)), params).one())
+        if fix and drift[table][0]:
+            session.execute(db.text(FIX.format(actual=actual, table=table)), params)
+    return drift
@@ -0,0 +1,158 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+import os
+import queue
+import threading
+import time
+
+from flask import current_app
+from sqlalchemy import event, false, select
+from sqlalchemy.orm import Session, with_loader_criteria
+
+from models import db, Show, Venue, Artist
+
+
+#----------------------------------------------------------------------------#
+# Deleting venues and artists.
+#----------------------------------------------------------------------------#
+
+# A venue or artist with few shows is deleted at once, its shows going with
+# it through ON DELETE CASCADE. One with many is hidden instead, and its
+# shows are deleted a batch per transaction in the background, so no
+# request waits on (or blocks readers with) a delete of thousands of rows.
+# Hidden rows, and the shows of hidden rows, are left out of every ORM
+# query unless it runs with the `include_hidden` execution option.
+
+_venues = Venue.__table__
+_artists = Artist.__table__
+_shows = Show.__table__
+
+# Show column pointing at the entity, and the cache tag of the other side.
+SHOW_COLUMNS = {
+    Venue: (_shows.c.venue_id, _shows.c.artist_id, 'artist:%d'),
+    Artist: (_shows.c.artist_id, _shows.c.venue_id, 'venue:%d'),
+}
+
+_HIDDEN_CRITERIA = (
+    with_loader_criteria(Venue, Venue.hidden == false(), include_aliases=True),
+    with_loader_criteria(Artist, Artist.hidden == false(), include_aliases=True),
+    # On the Core tables, so the criteria are not applied to these too.
+    with_loader_criteria(
+        Show,
+        Show.venue_id.notin_(select(_venues.c.id).where(_venues.c.hidden))
+        & Show.artist_id.notin_(select(_artists.c.id).where(_artists.c.hidden)),
+        include_aliases=True),
+)
+
+
+@event.listens_for(Session, 'do_orm_execute')
+def _skip_hidden(execute_state):
+    if (not execute_state.is_select or execute_state.is_column_load
+            or execute_state.is_relationship_load
+            or execute_state.execution_options.get('include_hidden', False)):
+        return
+    execute_state.statement = execute_state.statement.options(*_HIDDEN_CRITERIA)
+
+
+def purge(session, model, entity_id, batch_size, pause=0.0):
+    """Delete a hidden venue or artist, `batch_size` of its shows at a time.
+
+    Every batch is its own transaction. Returns the cache tags of the
+    artists (or venues) whose shows were deleted.
+    """
+    column, other, tag = SHOW_COLUMNS[model]
+    table = model.__table__
+    touched = set()
+    batch = select(_shows.c.id).where(column == entity_id).limit(batch_size)
+    while True:
+        deleted = session.execute(
+            _shows.delete().where(_shows.c.id.in_(batch.scalar_subquery()))
+            .returning(other)).scalars().all()
+        session.commit()
+        touched.update(deleted)
+        if len(deleted) < batch_size:
+            break
+        if pause:
+            time.sleep(pause)
+    # Shows added meanwhile go with it.
+    session.execute(table.delete().where(table.c.id == entity_id, table.c.hidden))
+    session.commit()
+    return [tag % other_id for other_id in touched]
+
+
+def hidden_entities(session):
+    """(model, id) of every hidden venue and artist."""
+    return [(model, entity_id)
+            for model in (Venue, Artist)
+            for (entity_id,) in session.query(model.id).filter(model.hidden)
+            .execution_options(include_hidden=True)]
+
+
+class Purger:
+    """Deletes venues and artists, hiding and purging the large ones.
+
+    Purges run one at a time on a background thread of the worker that
+    took the request. A purge cut short by a restart is finished by the
+    purge-hidden command.
+    """
+
+    def __init__(self, app=None, invalidate=None):
+        self.inline_limit = 1000
+        self.batch_size = 500
+        self.pause = 0.1
+        self.invalidate = invalidate
+        self.queue = None
+        self._pid = None
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.inline_limit = app.config.get('DELETE_INLINE_LIMIT', self.inline_limit)
+        self.batch_size = app.config.get('DELETE_BATCH_SIZE', self.batch_size)
+        self.pause = app.config.get('DELETE_BATCH_PAUSE', self.pause)
+        app.extensions['purger'] = self
+
+    def delete(self, entity):
+        """Delete `entity` now, or hide it and queue its purge.
+
+        Commits the session. Returns whether the purge was queued.
+        """
+        if entity.show_count <= self.inline_limit:
+            db.session.delete(entity)
+            db.session.commit()
+            return False
+        entity.hidden = True
+        db.session.commit()
+        self.submit(type(entity), entity.id)
+        return True
+
+    def submit(self, model, entity_id):
+        with self._lock:
+            if self._pid != os.getpid():
+                # First use, or a forked worker without the parent's thread.
+                self.queue = queue.Queue()
+                threading.Thread(target=self._run, daemon=True,
+                                 args=(current_app._get_current_object(), self.queue),
+                                 name='purger').start()
+                self._pid = os.getpid()
+        self.queue.put((model, entity_id))
+
+    def run(self, model, entity_id):
+        tags = purge(db.session, model, entity_id, self.batch_size, self.pause)
+        if self.invalidate is not None and tags:
+            self.invalidate(*tags)
+
+    def _run(self, app, jobs):
+        while True:
+            model, entity_id = jobs.get()
+            with app.app_context():
+                try:
+                    self.run(model, entity_id)
+                except Exception:
+                    db.session.rollback()
+                    app.logger.exception('Could not purge %s %s',
+                                         model.__tablename__, entity_id)
+                finally:
+                    db.session.remove()
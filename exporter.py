@@ -0,0 +1,167 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+import csv
+import io
+import json
+from datetime import datetime
+
+import api
+import importer
+from models import db
+
+
+#----------------------------------------------------------------------------#
+# Streaming export.
+#----------------------------------------------------------------------------#
+
+DEFAULT_CHUNK_SIZE = 5000
+FORMATS = ('ndjson', 'csv', 'parquet')
+MIMETYPES = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+    'parquet': 'application/vnd.apache.parquet',
+}
+RESOURCES = {
+    'venues': api.venues,
+    'artists': api.artists,
+    'shows': api.shows,
+}
+
+
+class ExportError(Exception):
+    pass
+
+
+def iter_chunks(kind, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Yield lists of serialized rows, read through a server-side cursor.
+
+    yield_per keeps only one chunk of rows in memory at a time instead of
+    the whole result set.
+    """
+    resource = RESOURCES[kind]
+    fields = list(resource.fields)
+    query = resource.query(fields).order_by(resource.model.id) \
+        .yield_per(chunk_size)
+    chunk = []
+    for row in query:
+        chunk.append(row)
+        if len(chunk) == chunk_size:
+            yield resource.serialize(chunk, fields)
+            chunk = []
+    if chunk:
+        yield resource.serialize(chunk, fields)
+
+
+def _ndjson(kind, chunks):
+    for rows in chunks:
+        yield ''.join(json.dumps(row) + '\n' for row in rows).encode()
+
+
+def _csv(kind, chunks):
+    # List values use the import separator, so an export loads back as is.
+    fields = RESOURCES[kind].fields
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(fields)
+    for rows in chunks:
+        for row in rows:
+            writer.writerow([importer.LIST_SEPARATOR.join(value)
+                             if isinstance(value, list) else value
+                             for value in row.values()])
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+class _Drain:
+    """Write-only file object whose contents are taken out as they arrive."""
+
+    def __init__(self):
+        self.parts = []
+        self.closed = False
+
+    def write(self, data):
+        self.parts.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def take(self):
+        data = b''.join(self.parts)
+        self.parts = []
+        return data
+
+
+def _parquet_schema(pa, resource):
+    types = []
+    for field in resource.fields:
+        column_type = resource.columns[field].type
+        if isinstance(column_type, db.ARRAY):
+            arrow_type = pa.list_(pa.string())
+        elif isinstance(column_type, db.Boolean):
+            arrow_type = pa.bool_()
+        elif isinstance(column_type, db.Integer):
+            arrow_type = pa.int64()
+        elif isinstance(column_type, db.DateTime):
+            arrow_type = pa.timestamp('us')
+        else:
+            arrow_type = pa.string()
+        types.append(pa.field(field, arrow_type))
+    return pa.schema(types)
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise ExportError('Parquet export needs pyarrow: pip install pyarrow')
+    return pyarrow, pyarrow.parquet
+
+
+def _parquet(kind, chunks):
+    pa, pq = _pyarrow()
+    resource = RESOURCES[kind]
+    schema = _parquet_schema(pa, resource)
+    timestamps = [field for field in resource.fields
+                  if pa.types.is_timestamp(schema.field(field).type)]
+    sink = _Drain()
+    writer = pq.ParquetWriter(sink, schema)
+    # Each chunk becomes one row group, sent as soon as it is written.
+    for rows in chunks:
+        columns = {field: [row[field] for row in rows] for field in resource.fields}
+        for field in timestamps:
+            columns[field] = [datetime.fromisoformat(value) if value else None
+                              for value in columns[field]]
+        writer.write_table(pa.table(columns, schema=schema))
+        yield sink.take()
+    writer.close()
+    yield sink.take()
+
+
+WRITERS = {
+    'ndjson': _ndjson,
+    'csv': _csv,
+    'parquet': _parquet,
+}
+
+
+def export(kind, fmt, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Return a generator of encoded byte chunks for `kind` in `fmt`."""
+    if kind not in RESOURCES:
+        raise ExportError('Unknown export type %r, expected one of %s'
+                          % (kind, ', '.join(RESOURCES)))
+    if fmt not in WRITERS:
+        raise ExportError('Unknown format %r, expected one of %s'
+                          % (fmt, ', '.join(FORMATS)))
+    if fmt == 'parquet':
+        # Fail before the first byte is sent rather than mid-stream.
+        _pyarrow()
+    return WRITERS[fmt](kind, iter_chunks(kind, chunk_size))
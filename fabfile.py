@@ -5,9 +5,13 @@ from fabric.contrib.console import confirm
 
 
 def test():
+    # pytest needs TEST_DATABASE_URI (see tests/conftest.py). The load test
+    # needs the app running locally on a seeded database (flask seed); see
+    # python loadtest.py --help.
     with settings(warn_only=True):
         result = local(
-            "python test_tasks.py -v && python test_users.py -v", capture=True
+            "python -m pytest -q && flask check-indexes && python loadtest.py",
+            capture=True
         )
     if result.failed and not confirm("Tests failed. Continue?"):
         abort("Aborted at user request.")
@@ -39,9 +43,7 @@ def heroku():
 
 
 def heroku_test():
-    local(
-        "heroku run python test_tasks.py -v && heroku run python test_users.py -v"
-    )
+    local("heroku run flask check-indexes")
 
 
 def deploy():
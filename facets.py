@@ -0,0 +1,102 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+from sqlalchemy import func, or_, true
+
+from forms import VenueForm
+from models import db
+
+
+#----------------------------------------------------------------------------#
+# Faceted browsing.
+#----------------------------------------------------------------------------#
+
+# The genres the forms accept.
+GENRES = tuple(value for value, _ in VenueForm.genres.kwargs['choices'])
+MATCHES = ('all', 'any')
+
+# grouping(genre, state, city) of each grouping set of counts().
+_BY_GENRE, _BY_CITY, _BY_STATE = 0b011, 0b100, 0b101
+
+
+class Selection:
+    """The filters of a listing: genres (all or any of them), state, city."""
+
+    def __init__(self, genres=(), match='all', state=None, city=None):
+        self.genres = sorted(set(genres))
+        self.match = match
+        self.state = state
+        self.city = city
+
+    @classmethod
+    def from_args(cls, args):
+        """Read ?genre=&match=&state=&city=; raises ValueError if invalid."""
+        selection = cls(args.getlist('genre'), args.get('match', 'all'),
+                        args.get('state') or None, args.get('city') or None)
+        if (selection.match not in MATCHES
+                or not set(selection.genres) <= set(GENRES)
+                or (selection.city is not None and selection.state is None)):
+            raise ValueError(args)
+        return selection
+
+    def criteria(self, model):
+        """Filter expressions for `model`; the genre ones use its GIN index."""
+        criteria = []
+        if self.genres:
+            if self.match == 'all':
+                criteria.append(model.genres.contains(self.genres))
+            else:
+                criteria.append(model.genres.overlap(self.genres))
+        if self.state is not None:
+            criteria.append(model.state == self.state)
+        if self.city is not None:
+            criteria.append(model.city == self.city)
+        return criteria
+
+    def args(self, **changes):
+        """Query arguments of this selection with `changes` applied."""
+        args = {'genre': self.genres, 'match': self.match,
+                'state': self.state, 'city': self.city}
+        args.update(changes)
+        if not args['genre'] or args['match'] == 'all':
+            del args['match']
+        return {key: value for key, value in args.items() if value}
+
+    def toggled(self, genre):
+        genres = set(self.genres) ^ {genre}
+        return self.args(genre=sorted(genres))
+
+
+class Facets:
+    def __init__(self, genres, states, cities):
+        self.genres = genres
+        self.states = states
+        self.cities = cities
+
+
+def counts(model, criteria):
+    """Facets of the `model` rows matching `criteria`: counts per genre, per
+    state and per (state, city), best first, from one grouped query.
+    """
+    genre = func.unnest(model.genres).table_valued(
+        'genre', with_ordinality='position').render_derived('genre')
+    # Each row is repeated once per genre; places count it only once.
+    first = or_(genre.c.position.is_(None), genre.c.position == 1)
+    query = db.session.query(
+        func.grouping(genre.c.genre, model.state, model.city),
+        genre.c.genre, model.state, model.city,
+        func.count(genre.c.genre), func.count().filter(first)
+    ).select_from(model).outerjoin(genre, true()).filter(*criteria).group_by(
+        func.grouping_sets(genre.c.genre, model.state, db.tuple_(model.state, model.city)))
+
+    genres, states, cities = [], [], []
+    for grouping, genre_name, state, city, genre_count, place_count in query:
+        if grouping == _BY_GENRE and genre_name is not None:
+            genres.append((genre_name, genre_count))
+        elif grouping == _BY_STATE:
+            states.append((state, place_count))
+        elif grouping == _BY_CITY:
+            cities.append(((state, city), place_count))
+    for facet in (genres, states, cities):
+        facet.sort(key=lambda item: (-item[1], str(item[0])))
+    return Facets(genres, states, cities)
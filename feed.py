@@ -0,0 +1,146 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+import itertools
+
+from sqlalchemy import event, inspect, or_, select
+from sqlalchemy.orm import Session
+
+import clock
+from models import db, Show, Artist, Venue, UpcomingShow, UpcomingShowGenre
+
+
+#----------------------------------------------------------------------------#
+# Upcoming shows feed.
+#----------------------------------------------------------------------------#
+
+# upcoming_shows columns and the base table columns they are copied from.
+SOURCE = (
+    ('show_id', Show.id),
+    ('start_time', Show.start_time),
+    ('venue_id', Show.venue_id),
+    ('venue_name', Venue.name),
+    ('venue_city', Venue.city),
+    ('venue_state', Venue.state),
+    ('venue_image_link', Venue.image_link),
+    ('artist_id', Show.artist_id),
+    ('artist_name', Artist.name),
+    ('artist_image_link', Artist.image_link),
+    ('genres', Artist.genres),
+)
+# Changes to other columns do not show in the feed. Shows of hidden venues
+# and artists (see deletion.py) are left out.
+VENUE_FIELDS = ('name', 'city', 'state', 'image_link', 'hidden')
+ARTIST_FIELDS = ('name', 'image_link', 'genres', 'hidden')
+
+
+def refresh(session, show_filter):
+    """Rebuild the feed rows of the shows matching `show_filter`.
+
+    Runs in the caller's transaction, so the feed commits (or rolls back)
+    together with the change it reflects.
+    """
+    feed = UpcomingShow.__table__
+    genres = UpcomingShowGenre.__table__
+    show_ids = select(Show.id).where(show_filter)
+    session.execute(feed.delete().where(feed.c.show_id.in_(show_ids)))
+    source = (select(*[column for _, column in SOURCE])
+              .join_from(Show, Venue, Show.venue_id == Venue.id)
+              .join(Artist, Show.artist_id == Artist.id)
+              .where(show_filter, Show.start_time >= clock.now(),
+                     ~Venue.hidden, ~Artist.hidden))
+    session.execute(feed.insert().from_select([name for name, _ in SOURCE], source))
+    session.execute(genres.insert().from_select(
+        ['genre', 'start_time', 'show_id'],
+        select(db.func.unnest(feed.c.genres).label('genre'),
+               feed.c.start_time, feed.c.show_id)
+        .where(feed.c.show_id.in_(show_ids)).distinct()))
+
+
+def rebuild(session):
+    refresh(session, db.true())
+
+
+def sweep(session, now=None):
+    """Drop the rows of shows that have started; returns how many."""
+    feed = UpcomingShow.__table__
+    result = session.execute(
+        feed.delete().where(feed.c.start_time < (now or clock.now())))
+    return result.rowcount
+
+
+def _changed(obj, fields):
+    state = inspect(obj)
+    return any(state.attrs[field].history.has_changes() for field in fields)
+
+
+@event.listens_for(Session, 'after_flush')
+def _refresh_after_flush(session, flush_context):
+    # Deleted shows take their rows with them (ON DELETE CASCADE); new and
+    # changed ones, and shows of renamed venues and artists, are rebuilt.
+    shows, venues, artists = set(), set(), set()
+    for obj in itertools.chain(session.new, session.dirty):
+        if isinstance(obj, Show):
+            shows.add(obj.id)
+        elif obj in session.new:
+            continue
+        elif isinstance(obj, Venue) and _changed(obj, VENUE_FIELDS):
+            venues.add(obj.id)
+        elif isinstance(obj, Artist) and _changed(obj, ARTIST_FIELDS):
+            artists.add(obj.id)
+    filters = []
+    if shows:
+        filters.append(Show.id.in_(shows))
+    if venues:
+        filters.append(Show.venue_id.in_(venues))
+    if artists:
+        filters.append(Show.artist_id.in_(artists))
+    if filters:
+        refresh(session, or_(*filters))
+
+
+#----------------------------------------------------------------------------#
+# Feed queries.
+#----------------------------------------------------------------------------#
+
+def query(now, city=None, state=None, genre=None):
+    """(query, pagination keys) for upcoming shows, optionally of one area
+    or one genre.
+
+    Each variant is an index range scan starting at `now`, so a page costs
+    the same however many shows there are.
+    """
+    columns = [getattr(UpcomingShow, name) for name, _ in SOURCE]
+    if genre is not None:
+        keys = [UpcomingShowGenre.start_time, UpcomingShowGenre.show_id]
+        feed_query = db.session.query(*columns).select_from(UpcomingShowGenre) \
+            .join(UpcomingShow, UpcomingShow.show_id == UpcomingShowGenre.show_id) \
+            .filter(UpcomingShowGenre.genre == genre,
+                    UpcomingShowGenre.start_time >= now)
+        return feed_query, keys
+    keys = [UpcomingShow.start_time, UpcomingShow.show_id]
+    feed_query = db.session.query(*columns).filter(UpcomingShow.start_time >= now)
+    if city is not None:
+        feed_query = feed_query.filter(UpcomingShow.venue_city == city,
+                                       UpcomingShow.venue_state == state)
+    return feed_query, keys
+
+
+def serialize(row):
+    return {
+        'id': row.show_id,
+        'start_time': row.start_time.isoformat(),
+        'genres': row.genres,
+        'venue': {
+            'id': row.venue_id,
+            'name': row.venue_name,
+            'city': row.venue_city,
+            'state': row.venue_state,
+            'image_link': row.venue_image_link,
+        },
+        'artist': {
+            'id': row.artist_id,
+            'name': row.artist_name,
+            'image_link': row.artist_image_link,
+        },
+    }
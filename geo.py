@@ -0,0 +1,269 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+import csv
+import math
+import re
+
+from sqlalchemy import and_, event, func, inspect, or_, select
+
+from models import db, CityCentroid, Venue
+
+
+#----------------------------------------------------------------------------#
+# Geohashes.
+#----------------------------------------------------------------------------#
+
+BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+# Cells of about 5 x 5 metres, far finer than a city centroid.
+PRECISION = 9
+# Sorts after every geohash character, so [cell, cell + '~') is the range of
+# geohashes starting with cell.
+_AFTER = '~'
+
+
+def encode(latitude, longitude, precision=PRECISION):
+    """Geohash of a point: bits of longitude and latitude interleaved, so a
+    shared prefix means a shared cell."""
+    lat_range, lng_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars, value, bits, even = [], 0, 0, True
+    while len(chars) < precision:
+        coordinate, bounds = (longitude, lng_range) if even else (latitude, lat_range)
+        middle = (bounds[0] + bounds[1]) / 2
+        if coordinate >= middle:
+            value = value * 2 + 1
+            bounds[0] = middle
+        else:
+            value *= 2
+            bounds[1] = middle
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(BASE32[value])
+            value, bits = 0, 0
+    return ''.join(chars)
+
+
+def cell_size(precision):
+    """(degrees of latitude, degrees of longitude) a cell spans."""
+    lng_bits = (5 * precision + 1) // 2
+    lat_bits = 5 * precision // 2
+    return 180.0 / 2 ** lat_bits, 360.0 / 2 ** lng_bits
+
+
+def covering_cells(south, west, north, east, max_cells=16):
+    """The geohash prefixes of the fewest, finest cells that cover a box,
+    at most `max_cells` of them."""
+    for precision in range(PRECISION, 0, -1):
+        height, width = cell_size(precision)
+        rows = range(math.floor((south + 90) / height), math.floor((north + 90) / height) + 1)
+        columns = range(math.floor((west + 180) / width), math.floor((east + 180) / width) + 1)
+        if len(rows) * len(columns) <= max_cells:
+            return sorted({encode(min((row + 0.5) * height - 90, 90.0),
+                                  min((column + 0.5) * width - 180, 180.0), precision)
+                           for row in rows for column in columns})
+    return ['']
+
+
+#----------------------------------------------------------------------------#
+# Geocoding.
+#----------------------------------------------------------------------------#
+
+# Venues are placed at the centroid of their city: close enough to answer
+# "within 25 miles", not to give directions. Unknown cities stay unplaced.
+
+def city_key(city):
+    return ' '.join(city.split()).lower() if city else None
+
+
+def locate(connection, city, state):
+    """latitude, longitude and geohash values for a venue in city, state."""
+    row = connection.execute(
+        select(CityCentroid.latitude, CityCentroid.longitude, CityCentroid.geohash)
+        .where(CityCentroid.state == state, CityCentroid.city_key == city_key(city))
+    ).first() if city and state else None
+    if row is None:
+        return {'latitude': None, 'longitude': None, 'geohash': None}
+    return {'latitude': row.latitude, 'longitude': row.longitude, 'geohash': row.geohash}
+
+
+def _place_venue(mapper, connection, target):
+    state = inspect(target)
+    if state.persistent and not any(
+            state.attrs[field].history.has_changes() for field in ('city', 'state')):
+        return
+    for key, value in locate(connection, target.city, target.state).items():
+        setattr(target, key, value)
+
+
+event.listen(Venue, 'before_insert', _place_venue)
+event.listen(Venue, 'before_update', _place_venue)
+
+# Backfills one batch of venues by id; the centroid is matched the way
+# city_key() normalises names.
+GEOCODE_BATCH = """
+UPDATE venues v SET latitude = c.latitude, longitude = c.longitude, geohash = c.geohash
+FROM city_centroids c
+WHERE v.id >= :first AND v.id < :first + :batch_size AND v.latitude IS NULL
+  AND c.state = v.state
+  AND c.city_key = lower(regexp_replace(btrim(v.city), '\\s+', ' ', 'g'))
+"""
+
+
+def geocode(session, batch_size=1000):
+    """Place the unplaced venues, committing every `batch_size` ids.
+
+    Yields the number placed per batch.
+    """
+    last = session.query(func.max(Venue.id)).execution_options(include_hidden=True).scalar()
+    for first in range(1, (last or 0) + 1, batch_size):
+        placed = session.execute(db.text(GEOCODE_BATCH),
+                                 {'first': first, 'batch_size': batch_size}).rowcount
+        session.commit()
+        yield placed
+
+
+# Census Gazetteer place names end in their legal type, lower case:
+# "San Francisco city", "Honolulu CDP", "Nashville-Davidson metropolitan
+# government (balance)".
+_PLACE_TYPE = re.compile(r'(\s+([a-z][\w-]*|CDP|\(balance\)))+$')
+
+
+def read_centroids(stream):
+    """Yield centroid rows from a Census Gazetteer places file (tab
+    separated) or a CSV with state, city, latitude and longitude columns.
+
+    Of places sharing a name within a state, the one with the largest land
+    area wins.
+    """
+    header = stream.readline()
+    delimiter = '\t' if '\t' in header else ','
+    fields = [field.strip() for field in header.split(delimiter)]
+    places = {}
+    for record in csv.DictReader(stream, fieldnames=fields, delimiter=delimiter):
+        if 'USPS' in record:
+            state, name = record['USPS'], _PLACE_TYPE.sub('', record['NAME'])
+            latitude, longitude = record['INTPTLAT'], record['INTPTLONG']
+            area = float(record.get('ALAND') or 0)
+        else:
+            state, name = record['state'], record['city']
+            latitude, longitude, area = record['latitude'], record['longitude'], 0
+        latitude, longitude = float(latitude), float(longitude)
+        key = (state.strip(), city_key(name))
+        if key not in places or area > places[key][0]:
+            places[key] = (area, {
+                'state': key[0], 'city_key': key[1], 'name': name.strip(),
+                'latitude': latitude, 'longitude': longitude,
+                'geohash': encode(latitude, longitude),
+            })
+    for _, row in places.values():
+        yield row
+
+
+#----------------------------------------------------------------------------#
+# Spatial queries.
+#----------------------------------------------------------------------------#
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_UNIT = {'km': 1.0, 'mi': 1.609344}
+MAX_RADIUS_KM = 500
+
+
+class Area:
+    """A radius around a point or a bounding box, from query arguments."""
+
+    def __init__(self, latitude, longitude, radius_km=None, box=None):
+        self.latitude = latitude
+        self.longitude = longitude
+        self.radius_km = radius_km
+        self.box = box
+
+    @classmethod
+    def from_args(cls, args):
+        """?lat=&lng=&radius=[&unit=mi|km] or ?bbox=west,south,east,north;
+        raises ValueError if invalid."""
+        unit = args.get('unit', 'mi')
+        if unit not in KM_PER_UNIT:
+            raise ValueError(unit)
+        if 'bbox' in args:
+            west, south, east, north = (float(value) for value in args['bbox'].split(','))
+            if not (-90 <= south <= north <= 90 and -180 <= west <= east <= 180):
+                raise ValueError(args['bbox'])
+            box = (south, west, north, east)
+            if _box_km(box) > 2 * MAX_RADIUS_KM:
+                raise ValueError(args['bbox'])
+            return cls((south + north) / 2, (west + east) / 2, box=box)
+        try:
+            latitude, longitude = float(args['lat']), float(args['lng'])
+        except KeyError as e:
+            raise ValueError(e)
+        radius_km = float(args.get('radius', 25)) * KM_PER_UNIT[unit]
+        if not (-90 <= latitude <= 90 and -180 <= longitude <= 180
+                and 0 < radius_km <= MAX_RADIUS_KM):
+            raise ValueError(args)
+        return cls.circle(latitude, longitude, radius_km)
+
+    @classmethod
+    def circle(cls, latitude, longitude, radius_km):
+        return cls(latitude, longitude, radius_km, _around(latitude, longitude, radius_km))
+
+    def distance_km(self):
+        """Great-circle distance (haversine) from the centre to each venue."""
+        dlat = func.radians(Venue.latitude - self.latitude)
+        dlng = func.radians(Venue.longitude - self.longitude)
+        a = (func.power(func.sin(dlat / 2), 2)
+             + math.cos(math.radians(self.latitude)) * func.cos(func.radians(Venue.latitude))
+             * func.power(func.sin(dlng / 2), 2))
+        return 2 * EARTH_RADIUS_KM * func.asin(func.sqrt(func.least(a, 1.0)))
+
+    def criteria(self, cells=True):
+        """Filters for the venues in the area. The geohash ranges of the
+        covering cells are what the index serves; the rest is exact."""
+        south, west, north, east = self.box
+        criteria = [Venue.latitude.between(south, north),
+                    Venue.longitude.between(west, east)]
+        if cells:
+            criteria.append(or_(*[and_(Venue.geohash >= cell, Venue.geohash < cell + _AFTER)
+                                  for cell in covering_cells(*self.box)]))
+        if self.radius_km is not None:
+            criteria.append(self.distance_km() <= self.radius_km)
+        return criteria
+
+
+def nearest(query, area, limit):
+    """Up to `limit` rows of a venue query in `area`, nearest first, each
+    with its distance_km.
+
+    Circles a quarter, a sixteenth and a sixty-fourth of the radius are
+    tried first: in a city the nearest venues are found among a few rows
+    instead of by sorting every venue within the full radius.
+    """
+    areas = [area]
+    if area.radius_km is not None:
+        areas = [Area.circle(area.latitude, area.longitude, area.radius_km / 4 ** step)
+                 for step in (3, 2, 1)] + areas
+    distance = area.distance_km()
+    for ring in areas:
+        rows = query.add_columns(distance.label('distance_km')) \
+            .filter(*ring.criteria()).order_by(distance, Venue.id).limit(limit).all()
+        if len(rows) >= limit:
+            break
+    return rows
+
+
+def _around(latitude, longitude, radius_km):
+    """(south, west, north, east) of the box around a circle."""
+    dlat = math.degrees(radius_km / EARTH_RADIUS_KM)
+    south, north = max(latitude - dlat, -90.0), min(latitude + dlat, 90.0)
+    if south == -90 or north == 90:
+        return south, -180.0, north, 180.0
+    dlng = math.degrees(radius_km / (EARTH_RADIUS_KM * math.cos(math.radians(latitude))))
+    # Boxes are not wrapped across the antimeridian; the part past it is cut.
+    return south, max(longitude - dlng, -180.0), north, min(longitude + dlng, 180.0)
+
+
+def _box_km(box):
+    south, west, north, east = box
+    middle = math.cos(math.radians((south + north) / 2))
+    return max(math.radians(north - south),
+               math.radians(east - west) * middle) * EARTH_RADIUS_KM
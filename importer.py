@@ -0,0 +1,346 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+import csv
+import io
+import itertools
+import json
+from datetime import datetime
+from types import SimpleNamespace
+
+from werkzeug.datastructures import MultiDict
+
+import feed
+import geo
+import scheduling
+import search
+import suggest
+from forms import ArtistForm, ShowForm, VenueForm
+from models import db, Artist, Show, Venue
+
+
+#----------------------------------------------------------------------------#
+# Bulk import.
+#----------------------------------------------------------------------------#
+
+DEFAULT_CHUNK_SIZE = 1000
+FORMATS = ('csv', 'ndjson')
+
+# In CSV files list values (genres) are separated by this character.
+LIST_SEPARATOR = ';'
+FALSE_VALUES = ('', '0', 'false', 'f', 'no', 'n', 'off')
+
+
+class BulkImportError(Exception):
+    pass
+
+
+def read_records(stream, fmt):
+    """Yield (line number, dict) pairs from a CSV or NDJSON text stream.
+
+    Records are parsed one at a time, so memory does not depend on the size
+    of the input.
+    """
+    if fmt == 'csv':
+        reader = csv.DictReader(stream)
+        for record in reader:
+            yield reader.line_num, record
+    elif fmt == 'ndjson':
+        for line_no, line in enumerate(stream, 1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError as e:
+                record = {'_error': 'invalid JSON: %s' % e}
+            if not isinstance(record, dict):
+                record = {'_error': 'expected a JSON object'}
+            yield line_no, record
+    else:
+        raise BulkImportError('Unknown format %r, expected one of %s'
+                              % (fmt, ', '.join(FORMATS)))
+
+
+def text_stream(binary):
+    return io.TextIOWrapper(binary, encoding='utf-8', newline='')
+
+
+def _formdata(record, list_fields, bool_fields, renames):
+    """Turn a parsed record into the MultiDict a form would get from a POST."""
+    formdata = MultiDict()
+    for key, value in record.items():
+        key = renames.get(key, key)
+        if value is None:
+            continue
+        if key in list_fields:
+            if isinstance(value, str):
+                value = [v.strip() for v in value.split(LIST_SEPARATOR) if v.strip()]
+            for item in value:
+                formdata.add(key, item)
+        elif key in bool_fields:
+            if str(value).strip().lower() not in FALSE_VALUES:
+                formdata.add(key, 'y')
+        else:
+            formdata.add(key, str(value))
+    return formdata
+
+
+class Importer:
+    """Validates records with a form and builds insert rows for one table."""
+
+    list_fields = ('genres',)
+    bool_fields = ()
+    renames = {'website': 'website_link'}
+
+    def __init__(self):
+        self.form = self.form_class(formdata=None, meta={'csrf': False})
+
+    def validate(self, record):
+        """Return (row, None) for a valid record or (None, errors)."""
+        if '_error' in record:
+            return None, {'record': [record['_error']]}
+        self.form.process(_formdata(record, self.list_fields,
+                                    self.bool_fields, self.renames))
+        if not self.form.validate():
+            return None, self.form.errors
+        return self.row(self.form), None
+
+    def check_references(self, rows):
+        """Return {line: errors} for rows that reference missing entities."""
+        return {}
+
+    def cache_tags(self, rows):
+        return [self.kind]
+
+    def insert(self, rows):
+        db.session.execute(self.statement(), rows)
+
+    def after_chunk(self, rows):
+        pass
+
+
+class EntityImporter(Importer):
+    def statement(self):
+        table = self.model.__table__
+        document = db.bindparam('search_document')
+        return table.insert().values(
+            search_vector=db.func.to_tsvector(search.TS_CONFIG, document))
+
+    def row(self, form):
+        row = {column: getattr(form, field).data
+               for column, field in self.columns.items()}
+        row['search_document'] = search.search_document(SimpleNamespace(**row))
+        return row
+
+    def after_chunk(self, rows):
+        # Picked up again from the database on the next suggestion.
+        self.index.built_at = None
+
+
+class VenueImporter(EntityImporter):
+    kind = 'venues'
+    form_class = VenueForm
+    model = Venue
+    bool_fields = ('seeking_talent',)
+    index = suggest.venues
+    columns = {
+        'name': 'name', 'genres': 'genres', 'address': 'address',
+        'city': 'city', 'state': 'state', 'phone': 'phone',
+        'website': 'website_link', 'facebook_link': 'facebook_link',
+        'seeking_talent': 'seeking_talent',
+        'seeking_description': 'seeking_description',
+        'image_link': 'image_link',
+    }
+
+    def __init__(self):
+        super().__init__()
+        self.places = {}
+
+    def row(self, form):
+        row = super().row(form)
+        # Core inserts skip the ORM hook that places venues.
+        key = (row['city'], row['state'])
+        if key not in self.places:
+            self.places[key] = geo.locate(db.session.connection(), *key)
+        row.update(self.places[key])
+        return row
+
+
+class ArtistImporter(EntityImporter):
+    kind = 'artists'
+    form_class = ArtistForm
+    model = Artist
+    bool_fields = ('seeking_venue',)
+    index = suggest.artists
+    columns = {
+        'name': 'name', 'genres': 'genres', 'city': 'city', 'state': 'state',
+        'phone': 'phone', 'website': 'website_link',
+        'facebook_link': 'facebook_link', 'seeking_venue': 'seeking_venue',
+        'seeking_description': 'seeking_description',
+        'image_link': 'image_link',
+    }
+
+
+class ShowImporter(Importer):
+    kind = 'shows'
+    form_class = ShowForm
+    list_fields = ()
+    renames = {}
+
+    def validate(self, record):
+        # ShowForm parses "%Y-%m-%d %H:%M:%S"; also accept ISO 8601.
+        for field in ('start_time', 'end_time'):
+            value = record.get(field)
+            if isinstance(value, str) and 'T' in value:
+                try:
+                    record = dict(record, **{field: datetime.fromisoformat(
+                        value).strftime('%Y-%m-%d %H:%M:%S')})
+                except ValueError:
+                    pass
+        return super().validate(record)
+
+    def row(self, form):
+        errors = {}
+        row = {'start_time': form.start_time.data,
+               'end_time': form.end_time.data or scheduling.default_end(form.start_time.data)}
+        for field in ('venue_id', 'artist_id'):
+            try:
+                row[field] = int(getattr(form, field).data)
+            except (TypeError, ValueError):
+                errors[field] = ['Not a valid id.']
+        if row['end_time'] <= row['start_time']:
+            errors['end_time'] = ['Must be after start_time.']
+        if errors:
+            raise ValueError(errors)
+        return row
+
+    def check_references(self, rows):
+        errors = {}
+        for field, model in (('venue_id', Venue), ('artist_id', Artist)):
+            wanted = {row[field] for _, row in rows}
+            found = {entity_id for entity_id, in db.session.query(model.id)
+                     .filter(model.id.in_(wanted))}
+            for line_no, row in rows:
+                if row[field] not in found:
+                    errors.setdefault(line_no, {})[field] = ['No such id.']
+        # A double booking would make the database reject the whole chunk,
+        # so clashes with existing shows, and within the chunk, are caught
+        # here row by row, against the bookings of the chunk's venues and
+        # artists read in one query.
+        valid = [row for line_no, row in rows if line_no not in errors]
+        taken = {}
+        if valid:
+            for venue_id, artist_id, start_time, end_time in scheduling.bookings(
+                    {row['venue_id'] for row in valid}, {row['artist_id'] for row in valid},
+                    min(row['start_time'] for row in valid),
+                    max(row['end_time'] for row in valid)):
+                taken.setdefault(('venue_id', venue_id), []).append((start_time, end_time, None))
+                taken.setdefault(('artist_id', artist_id), []).append((start_time, end_time, None))
+        for line_no, row in rows:
+            if line_no in errors:
+                continue
+            clash = None
+            for field in ('venue_id', 'artist_id'):
+                for start_time, end_time, other in taken.get((field, row[field]), ()):
+                    if start_time < row['end_time'] and row['start_time'] < end_time:
+                        clash = 'Venue or artist already booked.' if other is None \
+                            else 'Overlaps line %d.' % other
+            if clash is not None:
+                errors[line_no] = {'start_time': [clash]}
+                continue
+            for field in ('venue_id', 'artist_id'):
+                taken.setdefault((field, row[field]), []).append(
+                    (row['start_time'], row['end_time'], line_no))
+        return errors
+
+    def statement(self):
+        return Show.__table__.insert()
+
+    def insert(self, rows):
+        # One multi-row INSERT, so the new ids come back with it.
+        show_ids = db.session.execute(
+            self.statement().values(rows).returning(Show.id)).scalars().all()
+        # Core inserts bypass the flush that keeps the feed current; only
+        # the new shows' rows are built.
+        feed.refresh(db.session, Show.id.in_(show_ids))
+
+    def cache_tags(self, rows):
+        tags = {'shows'}
+        for row in rows:
+            tags.add('venue:%d' % row['venue_id'])
+            tags.add('artist:%d' % row['artist_id'])
+        return sorted(tags)
+
+
+IMPORTERS = {
+    'venues': VenueImporter,
+    'artists': ArtistImporter,
+    'shows': ShowImporter,
+}
+
+
+class ImportResult:
+    def __init__(self):
+        self.inserted = 0
+        self.failed = 0
+        self.errors = []
+
+    def add_error(self, line_no, errors, writer, keep=20):
+        self.failed += 1
+        if len(self.errors) < keep:
+            self.errors.append({'line': line_no, 'errors': errors})
+        writer.writerow([line_no, json.dumps(errors)])
+
+
+def import_records(kind, records, report, chunk_size=DEFAULT_CHUNK_SIZE,
+                   invalidate=None):
+    """Validate and insert `records` into `kind`, one transaction per chunk.
+
+    Rows failing validation, or referencing a missing venue or artist, are
+    written to the `report` text stream as "line,errors" CSV and skipped.
+    A chunk the database rejects is rolled back and all its rows reported.
+    `invalidate(*tags)` is called with the page cache tags of each
+    committed chunk.
+    """
+    if kind not in IMPORTERS:
+        raise BulkImportError('Unknown import type %r, expected one of %s'
+                              % (kind, ', '.join(IMPORTERS)))
+    importer = IMPORTERS[kind]()
+    writer = csv.writer(report)
+    writer.writerow(['line', 'errors'])
+    result = ImportResult()
+
+    records = iter(records)
+    while True:
+        chunk = list(itertools.islice(records, chunk_size))
+        if not chunk:
+            break
+        rows = []
+        for line_no, record in chunk:
+            try:
+                row, errors = importer.validate(record)
+            except ValueError as e:
+                row, errors = None, e.args[0]
+            if errors:
+                result.add_error(line_no, errors, writer)
+            else:
+                rows.append((line_no, row))
+        missing = importer.check_references(rows)
+        for line_no, errors in sorted(missing.items()):
+            result.add_error(line_no, errors, writer)
+        rows = [(line_no, row) for line_no, row in rows if line_no not in missing]
+        if not rows:
+            continue
+        try:
+            importer.insert([row for _, row in rows])
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            for line_no, _ in rows:
+                result.add_error(line_no, {'database': [str(e).splitlines()[0]]}, writer)
+            continue
+        result.inserted += len(rows)
+        importer.after_chunk(rows)
+        if invalidate is not None:
+            invalidate(*importer.cache_tags([row for _, row in rows]))
+    return result
@@ -0,0 +1,250 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+import http.client
+import itertools
+import json
+import random
+import re
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from urllib.parse import urlencode, urlsplit
+
+import click
+
+
+#----------------------------------------------------------------------------#
+# HTTP load test.
+#----------------------------------------------------------------------------#
+
+# Each endpoint is driven on its own by --concurrency clients for
+# --duration seconds, every client sending its next request as soon as the
+# last one is answered. Ids and search terms are drawn from the data the
+# server holds (see `flask seed`), so pages vary as they do in production.
+# The page cache is keyed by the URL, so unless --cached is given every GET
+# carries a query argument of its own and is rendered afresh.
+
+ENDPOINTS = ('shows', 'venues', 'venue', 'artist', 'venue search', 'artist search')
+# Metrics compared with the baseline, and whether lower is better.
+GATED = (('p50_ms', True), ('p95_ms', True), ('throughput', False))
+SAMPLE_PAGES = 5
+
+
+class Target:
+    """The server under test and what to ask it for."""
+
+    def __init__(self, url, rng, cached=False):
+        parts = urlsplit(url)
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self.rng = rng
+        self.cached = cached
+        self.ids = {}
+        self.terms = []
+        self._requests = itertools.count()
+
+    def connect(self):
+        return http.client.HTTPConnection(self.host, self.port, timeout=30)
+
+    def sample(self):
+        """Read venue and artist ids and name words through the API."""
+        connection = self.connect()
+        for kind in ('venues', 'artists'):
+            ids, cursor = [], None
+            for _ in range(SAMPLE_PAGES):
+                args = {'fields': 'id,name', 'per_page': 100}
+                if cursor:
+                    args['after'] = cursor
+                connection.request('GET', '/api/v1/%s?%s' % (kind, urlencode(args)))
+                response = connection.getresponse()
+                if response.status != 200:
+                    raise click.ClickException('GET /api/v1/%s: %d' % (kind, response.status))
+                page = json.loads(response.read())
+                ids.extend(item['id'] for item in page['data'])
+                self.terms.extend(word.lower() for item in page['data']
+                                  for word in re.findall(r'\w{3,}', item['name']))
+                cursor = page['next']
+                if not cursor:
+                    break
+            if not ids:
+                raise click.ClickException('No %s to load test with; run flask seed.' % kind)
+            self.ids[kind] = ids
+        connection.close()
+        self.terms = sorted(set(self.terms))
+
+    def _get(self, path):
+        if not self.cached:
+            path += '?nocache=%d' % next(self._requests)
+        return 'GET', path, None
+
+    def request(self, endpoint):
+        """(method, path, body) of a request to `endpoint`."""
+        if endpoint in ('shows', 'venues'):
+            return self._get('/' + endpoint)
+        if endpoint in ('venue', 'artist'):
+            return self._get('/%ss/%d' % (endpoint, self.rng.choice(self.ids[endpoint + 's'])))
+        kind = endpoint.split()[0]
+        return 'POST', '/%ss/search' % kind, urlencode({'search_term': self.rng.choice(self.terms)})
+
+
+def _client(target, endpoint, deadline, record):
+    connection = target.connect()
+    headers = {'Content-Type': 'application/x-www-form-urlencoded'}
+    while time.perf_counter() < deadline:
+        method, path, body = target.request(endpoint)
+        started = time.perf_counter()
+        try:
+            connection.request(method, path, body, headers if body else {})
+            response = connection.getresponse()
+            response.read()
+            ok = response.status < 400
+        except (OSError, http.client.HTTPException):
+            connection.close()
+            connection = target.connect()
+            ok = False
+        record(time.perf_counter() - started, ok)
+    connection.close()
+
+
+def _drive(target, endpoint, concurrency, seconds):
+    """[(seconds taken, ok)] of every request made in `seconds`."""
+    timings = []
+    lock = threading.Lock()
+
+    def record(elapsed, ok):
+        with lock:
+            timings.append((elapsed, ok))
+
+    deadline = time.perf_counter() + seconds
+    clients = [threading.Thread(target=_client, args=(target, endpoint, deadline, record))
+               for _ in range(concurrency)]
+    for client in clients:
+        client.start()
+    for client in clients:
+        client.join()
+    return timings
+
+
+def _percentile(ordered, fraction):
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def measure(target, endpoint, concurrency, duration, warmup):
+    if warmup:
+        _drive(target, endpoint, concurrency, warmup)
+    started = time.perf_counter()
+    timings = _drive(target, endpoint, concurrency, duration)
+    elapsed = time.perf_counter() - started
+    ordered = sorted(seconds * 1000 for seconds, ok in timings if ok) or [0.0]
+    return {
+        'requests': len(timings),
+        'errors': sum(1 for _, ok in timings if not ok),
+        'throughput': round(sum(1 for _, ok in timings if ok) / elapsed, 1),
+        'p50_ms': round(_percentile(ordered, 0.5), 2),
+        'p95_ms': round(_percentile(ordered, 0.95), 2),
+        'p99_ms': round(_percentile(ordered, 0.99), 2),
+    }
+
+
+def regressions(results, baseline, threshold, slack_ms):
+    """Messages for each endpoint that failed or got slower than `baseline`
+    by more than `threshold` (a fraction); latencies get `slack_ms` on top
+    so sub-millisecond noise does not fail the gate."""
+    found = []
+    for endpoint, result in results.items():
+        if result['errors']:
+            found.append('%s: %d failed requests' % (endpoint, result['errors']))
+        before = baseline.get(endpoint)
+        if before is None:
+            continue
+        for metric, lower_is_better in GATED:
+            if lower_is_better:
+                limit = before[metric] * (1 + threshold) + slack_ms
+                regressed = result[metric] > limit
+            else:
+                limit = before[metric] * (1 - threshold)
+                regressed = result[metric] < limit
+            if regressed:
+                found.append('%s: %s %g, baseline %g (limit %g)' % (
+                    endpoint, metric, result[metric], before[metric], round(limit, 2)))
+    return found
+
+
+def _save(path, settings, results):
+    with open(path, 'w') as stream:
+        json.dump(dict(settings, recorded_at=datetime.now(timezone.utc).isoformat(),
+                       endpoints=results), stream, indent=2, sort_keys=True)
+        stream.write('\n')
+
+
+@click.command()
+@click.argument('url', default='http://127.0.0.1:5000')
+@click.option('--endpoint', 'endpoints', type=click.Choice(ENDPOINTS), multiple=True,
+              help='Endpoint to drive; repeat for several. Default: all.')
+@click.option('--concurrency', type=click.IntRange(1), default=4, show_default=True)
+@click.option('--duration', type=click.FloatRange(1), default=10, show_default=True,
+              help='Seconds measured per endpoint.')
+@click.option('--warmup', type=click.FloatRange(0), default=2, show_default=True,
+              help='Seconds per endpoint before measuring.')
+@click.option('--baseline', type=click.Path(dir_okay=False),
+              default='loadtest-baseline.json', show_default=True)
+@click.option('--threshold', type=click.FloatRange(0), default=0.2, show_default=True,
+              help='Allowed slowdown, as a fraction of the baseline.')
+@click.option('--slack-ms', type=click.FloatRange(0), default=2, show_default=True,
+              help='Allowed latency increase on top of the threshold.')
+@click.option('--cached', is_flag=True,
+              help='Let the page cache answer repeated GETs, as it would in production.')
+@click.option('--save', is_flag=True, help='Record this run as the new baseline.')
+@click.option('--random-seed', type=int, default=0, show_default=True)
+def main(url, endpoints, concurrency, duration, warmup, baseline, threshold,
+         slack_ms, cached, save, random_seed):
+    """Load test a running server at URL and compare with a baseline.
+
+    Records requests, errors, throughput (requests per second) and
+    p50/p95/p99 latency per endpoint. Exits with status 1 if any request
+    failed, or if p50, p95 or throughput regressed past --threshold. The
+    first run, or a run with --save, writes the baseline instead. Baselines
+    only compare on the same machine, data (flask seed options) and
+    settings.
+    """
+    settings = {'url': url, 'concurrency': concurrency, 'duration': duration,
+                'cached': cached}
+    target = Target(url, random.Random(random_seed), cached)
+    target.sample()
+    results = {}
+    click.echo('%-14s %9s %7s %9s %9s %9s %9s'
+               % ('endpoint', 'requests', 'errors', 'req/s', 'p50 ms', 'p95 ms', 'p99 ms'))
+    for endpoint in endpoints or ENDPOINTS:
+        result = results[endpoint] = measure(target, endpoint, concurrency, duration, warmup)
+        click.echo('%-14s %9d %7d %9.1f %9.2f %9.2f %9.2f' % (
+            endpoint, result['requests'], result['errors'], result['throughput'],
+            result['p50_ms'], result['p95_ms'], result['p99_ms']))
+
+    try:
+        with open(baseline) as stream:
+            recorded = json.load(stream)
+    except FileNotFoundError:
+        recorded = None
+    if save or recorded is None:
+        found = regressions(results, {}, threshold, slack_ms)
+    else:
+        changed = [key for key, value in settings.items() if recorded.get(key) != value]
+        if changed:
+            click.echo('Warning: the baseline was recorded with a different %s.'
+                       % ', '.join(changed), err=True)
+        found = regressions(results, recorded['endpoints'], threshold, slack_ms)
+    for message in found:
+        click.echo('REGRESSION %s' % message, err=True)
+    if found:
+        sys.exit(1)
+    if save or recorded is None:
+        _save(baseline, settings, results)
+        click.echo('Saved the baseline to %s.' % baseline)
+    else:
+        click.echo('No regressions against %s.' % baseline)
+
+
+if __name__ == '__main__':
+    main()
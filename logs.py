@@ -0,0 +1,239 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import re
+import sys
+import time
+import uuid
+from datetime import datetime, timezone
+
+from flask import current_app, g, has_request_context, request
+from flask.logging import default_handler
+
+
+#----------------------------------------------------------------------------#
+# Structured logging.
+#----------------------------------------------------------------------------#
+
+REQUEST_ID_HEADER = 'X-Request-ID'
+TEXT_FORMAT = '%(asctime)s %(levelname)s [%(request_id)s] %(name)s: %(message)s'
+
+# Request ids taken from the client must be safe to put in a log line.
+_REQUEST_ID = re.compile(r'^[A-Za-z0-9._-]{1,64}$')
+# Attributes every record has; anything else came in through `extra`.
+_RECORD_ATTRS = set(vars(logging.makeLogRecord({}))) | {'message', 'asctime'}
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, with any `extra` fields at the top level."""
+
+    def format(self, record):
+        entry = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc)
+                            .isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS and key not in entry:
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exception'] = record.exc_text
+        if record.stack_info:
+            entry['stack'] = self.formatStack(record.stack_info)
+        return json.dumps(entry, default=str)
+
+
+class SizedTimedRotatingFileHandler(logging.handlers.TimedRotatingFileHandler):
+    """Rolls the file over at every `when` interval and whenever it would
+    grow past `max_bytes`.
+
+    A "{pid}" in `filename` is replaced by the id of the process writing,
+    also in processes forked after the handler was made (see reopen()), so
+    that worker processes never write to one file.
+    """
+
+    def __init__(self, filename, when='midnight', max_bytes=0, backup_count=14):
+        self.template = filename
+        super().__init__(filename.replace('{pid}', str(os.getpid())), when=when,
+                         backupCount=backup_count, encoding='utf-8', delay=True)
+        self.max_bytes = max_bytes
+
+    def reopen(self):
+        """Switch to the file of the current process."""
+        name = os.path.abspath(self.template.replace('{pid}', str(os.getpid())))
+        if name != self.baseFilename:
+            if self.stream is not None:
+                self.stream.close()
+                self.stream = None
+            self.baseFilename = name
+
+    def shouldRollover(self, record):
+        if super().shouldRollover(record):
+            return True
+        if not self.max_bytes:
+            return False
+        if self.stream is None:
+            self.stream = self._open()
+        return self.stream.tell() + len(self.format(record)) + 1 > self.max_bytes
+
+    def rotation_filename(self, default_name):
+        # Size rollovers within one interval would get the same name.
+        name, i = default_name, 0
+        while os.path.exists(name):
+            i += 1
+            name = '%s.%d' % (default_name, i)
+        return name
+
+
+class AsyncHandler(logging.handlers.QueueHandler):
+    """Puts records on a bounded queue that a QueueListener thread writes out.
+
+    Everything that needs the calling thread (the message, the traceback,
+    the request id) is resolved before the record is queued. Records below
+    WARNING are sampled at `sample_rate`, per request when there is one. A
+    full queue drops records instead of blocking; the count of dropped ones
+    is attached to the next record that gets through.
+    """
+
+    def __init__(self, handlers, queue_size=10000, sample_rate=1.0):
+        self.handlers = handlers
+        self.queue_size = queue_size
+        self.sample_rate = sample_rate
+        self.dropped = 0
+        self.listener = None
+        self._pid = None
+        super().__init__(queue.Queue(queue_size))
+        self.start()
+
+    def start(self):
+        # Also after a fork: the parent's listener thread does not survive it.
+        for handler in self.handlers:
+            if isinstance(handler, SizedTimedRotatingFileHandler):
+                handler.reopen()
+        self.queue = queue.Queue(self.queue_size)
+        self.listener = logging.handlers.QueueListener(
+            self.queue, *self.handlers, respect_handler_level=True)
+        self.listener.start()
+        self._pid = os.getpid()
+
+    def stop(self):
+        if self.listener is not None and self._pid == os.getpid():
+            self.listener.stop()
+        self.listener = None
+
+    def sampled(self):
+        if has_request_context():
+            return g.get('log_sampled', True)
+        return random.random() < self.sample_rate
+
+    def emit(self, record):
+        if record.levelno < logging.WARNING and not self.sampled():
+            return
+        if self._pid != os.getpid():
+            self.start()
+        super().emit(record)
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        if not hasattr(record, 'request_id'):
+            record.request_id = g.get('request_id') if has_request_context() else None
+        return record
+
+    def enqueue(self, record):
+        if self.dropped:
+            record.dropped = self.dropped
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+        else:
+            self.dropped = 0
+
+
+class StructuredLogging:
+    """Routes all logging through an AsyncHandler and tags it per request.
+
+    Every request gets an id (the client's X-Request-ID if it is sane), sent
+    back in the response and added to each record logged while handling it,
+    and a sampled access log line.
+    """
+
+    def __init__(self, app=None):
+        self.handler = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        if app.config.get('LOG_FORMAT', 'json') == 'json':
+            formatter = JsonFormatter()
+        else:
+            formatter = logging.Formatter(TEXT_FORMAT)
+        path = app.config.get('LOG_FILE')
+        if path:
+            target = SizedTimedRotatingFileHandler(
+                path,
+                when=app.config.get('LOG_ROTATE_WHEN', 'midnight'),
+                max_bytes=app.config.get('LOG_MAX_BYTES', 0),
+                backup_count=app.config.get('LOG_BACKUP_COUNT', 14))
+        else:
+            target = logging.StreamHandler(sys.stderr)
+        target.setFormatter(formatter)
+
+        root = logging.getLogger()
+        for handler in list(root.handlers):
+            if isinstance(handler, AsyncHandler):
+                root.removeHandler(handler)
+                handler.stop()
+        self.handler = AsyncHandler([target],
+                                    app.config.get('LOG_QUEUE_SIZE', 10000),
+                                    app.config.get('LOG_SAMPLE_RATE', 1.0))
+        atexit.register(self.handler.stop)
+        level = app.config.get('LOG_LEVEL', 'INFO')
+        root.addHandler(self.handler)
+        root.setLevel(level)
+        # app.logger propagates to the root logger instead.
+        app.logger.removeHandler(default_handler)
+        app.logger.setLevel(level)
+
+        app.before_request(self._start)
+        app.after_request(self._finish)
+        app.extensions['structured_logging'] = self
+
+    def _start(self):
+        supplied = request.headers.get(REQUEST_ID_HEADER, '')
+        g.request_id = supplied if _REQUEST_ID.match(supplied) else uuid.uuid4().hex
+        g.log_sampled = random.random() < self.handler.sample_rate
+        g.log_started = time.perf_counter()
+
+    def _finish(self, response):
+        request_id = g.get('request_id')
+        if request_id is None:
+            return response
+        response.headers[REQUEST_ID_HEADER] = request_id
+        duration_ms = (time.perf_counter() - g.log_started) * 1000
+        current_app.logger.info('%s %s %s %.1f ms', request.method, request.path,
+                                response.status_code, duration_ms,
+                                extra={'method': request.method,
+                                       'path': request.path,
+                                       'endpoint': request.endpoint,
+                                       'status': response.status_code,
+                                       'duration_ms': round(duration_ms, 1)})
+        return response
@@ -0,0 +1,260 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+import bisect
+import glob
+import json
+import os
+import tempfile
+import threading
+import time
+import weakref
+
+from flask import before_render_template, g, request, template_rendered
+
+
+#----------------------------------------------------------------------------#
+# Metrics.
+#----------------------------------------------------------------------------#
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+RENDER_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+# name: (type, help, histogram buckets)
+METRICS = {
+    'fyyur_http_requests_total': (
+        'counter', 'Requests handled, by endpoint, method and status.', None),
+    'fyyur_http_request_duration_seconds': (
+        'histogram', 'Time from the start of a request to its response.',
+        LATENCY_BUCKETS),
+    'fyyur_db_queries_total': (
+        'counter', 'SQL statements run, by endpoint.', None),
+    'fyyur_db_duration_seconds': (
+        'histogram', 'Time a request spent running SQL statements.',
+        LATENCY_BUCKETS),
+    'fyyur_template_render_duration_seconds': (
+        'histogram', 'Time spent rendering a template.', RENDER_BUCKETS),
+    'fyyur_page_cache_requests_total': (
+        'counter', 'Page cache lookups, by endpoint and result.', None),
+}
+
+
+class Registry:
+    """Metric values of one process, updated without locks.
+
+    Every thread adds to a dict of its own; collect() sums the dicts of all
+    threads. Copying a dict is atomic under the GIL, so a collection never
+    sees one half-updated. The dict of a thread that has exited is folded
+    into a shared one, so threads coming and going do not pile up dicts.
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+        self._shards = {}
+        self._retired = {}
+        self._shards_lock = threading.Lock()
+
+    def _values(self):
+        values = getattr(self._local, 'values', None)
+        if values is None:
+            values = self._local.values = {}
+            # Once per thread. The thread's locals are dropped when it
+            # exits, and the marker with them.
+            self._local.marker = marker = _ThreadMarker()
+            with self._shards_lock:
+                self._shards[id(marker)] = values
+            weakref.finalize(marker, self._retire, id(marker))
+        return values
+
+    def _retire(self, shard_id):
+        with self._shards_lock:
+            for key, value in self._shards.pop(shard_id).items():
+                self._retired[key] = self._retired.get(key, 0) + value
+
+    def inc(self, name, labels, value=1):
+        values = self._values()
+        key = (name, labels)
+        values[key] = values.get(key, 0) + value
+
+    def observe(self, name, labels, value):
+        buckets = METRICS[name][2]
+        values = self._values()
+        # Per-bucket counts; they are made cumulative on output.
+        for key, amount in (((name + '_bucket', labels, bisect.bisect_left(buckets, value)), 1),
+                            ((name + '_sum', labels), value),
+                            ((name + '_count', labels), 1)):
+            values[key] = values.get(key, 0) + amount
+
+    def collect(self):
+        with self._shards_lock:
+            shards = [self._retired.copy()] + [shard.copy() for shard in self._shards.values()]
+        totals = {}
+        for shard in shards:
+            for key, value in shard.items():
+                totals[key] = totals.get(key, 0) + value
+        return totals
+
+
+class _ThreadMarker:
+    """Lives as long as the thread-local state of one thread."""
+
+
+# Keys are (name, labels) or, for histogram buckets, (name, labels, index).
+
+def _dump(values):
+    return [[key[0], key[1], key[2:], value] for key, value in values.items()]
+
+
+def _load(items):
+    return {(name, tuple(map(tuple, labels))) + tuple(rest): value
+            for name, labels, rest, value in items}
+
+
+def _label_value(value):
+    return str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+
+def _series(name, labels):
+    if not labels:
+        return name
+    return '%s{%s}' % (name, ','.join('%s="%s"' % (key, _label_value(value))
+                                      for key, value in labels))
+
+
+def render(values):
+    """Prometheus text exposition of collected values."""
+    by_metric = {}
+    for key, value in values.items():
+        by_metric.setdefault(key[0], {})[key[1:]] = value
+
+    lines = []
+    for name, (kind, help_text, buckets) in METRICS.items():
+        lines.append('# HELP %s %s' % (name, help_text))
+        lines.append('# TYPE %s %s' % (name, kind))
+        if kind == 'counter':
+            for (labels,), value in sorted(by_metric.get(name, {}).items()):
+                lines.append('%s %s' % (_series(name, labels), repr(float(value))))
+            continue
+        counts = by_metric.get(name + '_count', {})
+        sums = by_metric.get(name + '_sum', {})
+        bucket_counts = by_metric.get(name + '_bucket', {})
+        for (labels,) in sorted(counts):
+            cumulative = 0
+            for i, bound in enumerate(buckets + (float('inf'),)):
+                cumulative += bucket_counts.get((labels, i), 0)
+                le = '+Inf' if i == len(buckets) else repr(bound)
+                lines.append('%s %d' % (_series(name + '_bucket', labels + (('le', le),)),
+                                        cumulative))
+            lines.append('%s %s' % (_series(name + '_sum', labels), repr(float(sums.get((labels,), 0)))))
+            lines.append('%s %d' % (_series(name + '_count', labels), counts[(labels,)]))
+    return '\n'.join(lines) + '\n'
+
+
+class Metrics:
+    """Request, database, template and page cache metrics for /metrics.
+
+    With METRICS_DIR set, every worker process writes its totals to a file
+    of its own there at most every METRICS_FLUSH_INTERVAL seconds, and
+    render() sums all the files, so any worker can answer a scrape. Files
+    of exited workers are kept so counters never go backwards; empty the
+    directory when deploying.
+    """
+
+    def __init__(self, app=None):
+        self.registry = Registry()
+        self.directory = None
+        self.flush_interval = 5
+        self.flushed_at = 0.0
+        self._flush_lock = threading.Lock()
+        self._path = None
+        self._pid = os.getpid()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.directory = app.config.get('METRICS_DIR')
+        self.flush_interval = app.config.get('METRICS_FLUSH_INTERVAL', self.flush_interval)
+        if self.directory:
+            os.makedirs(self.directory, exist_ok=True)
+        app.before_request(self._start)
+        app.after_request(self._finish)
+        before_render_template.connect(self._before_render, app)
+        template_rendered.connect(self._rendered, app)
+        app.extensions['metrics'] = self
+
+    def _start(self):
+        if self._pid != os.getpid():
+            # A forked worker; the parent's totals are not its own.
+            self.registry = Registry()
+            self._pid = os.getpid()
+            self._path = None
+        g.metrics_started = time.perf_counter()
+
+    def _finish(self, response):
+        started = g.get('metrics_started')
+        if started is None:
+            return response
+        endpoint = request.endpoint or 'unmatched'
+        registry = self.registry
+        registry.inc('fyyur_http_requests_total',
+                     (('endpoint', endpoint), ('method', request.method),
+                      ('status', str(response.status_code))))
+        registry.observe('fyyur_http_request_duration_seconds',
+                         (('endpoint', endpoint),), time.perf_counter() - started)
+        profile = g.get('query_profile')
+        if profile is not None:
+            registry.inc('fyyur_db_queries_total', (('endpoint', endpoint),),
+                         profile.count)
+            registry.observe('fyyur_db_duration_seconds', (('endpoint', endpoint),),
+                             profile.seconds)
+        result = g.get('page_cache_result')
+        if result is not None:
+            registry.inc('fyyur_page_cache_requests_total',
+                         (('endpoint', endpoint), ('result', result)))
+        if self.directory and time.monotonic() - self.flushed_at >= self.flush_interval:
+            self.flush()
+        return response
+
+    def _before_render(self, app, template, context, **extra):
+        g.setdefault('render_started', []).append(time.perf_counter())
+
+    def _rendered(self, app, template, context, **extra):
+        started = g.get('render_started')
+        if started:
+            self.registry.observe('fyyur_template_render_duration_seconds',
+                                  (('template', template.name or 'string'),),
+                                  time.perf_counter() - started.pop())
+
+    def flush(self):
+        """Write this process's totals to its file in METRICS_DIR."""
+        if not self._flush_lock.acquire(blocking=False):
+            return
+        try:
+            if self._path is None:
+                self._path = os.path.join(self.directory, 'metrics-%d-%d.json'
+                                          % (os.getpid(), time.time_ns()))
+            fd, tmp = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+            with os.fdopen(fd, 'w') as f:
+                json.dump(_dump(self.registry.collect()), f)
+            os.replace(tmp, self._path)
+            self.flushed_at = time.monotonic()
+        finally:
+            self._flush_lock.release()
+
+    def collect(self):
+        if not self.directory:
+            return self.registry.collect()
+        self.flush()
+        totals = {}
+        for path in glob.glob(os.path.join(self.directory, 'metrics-*.json')):
+            try:
+                with open(path) as f:
+                    values = _load(json.load(f))
+            except (OSError, ValueError):
+                continue
+            for key, value in values.items():
+                totals[key] = totals.get(key, 0) + value
+        return totals
+
+    def render(self):
+        return render(self.collect())
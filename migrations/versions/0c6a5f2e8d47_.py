@@ -0,0 +1,42 @@
+"""add venue coordinates, geohash index and city centroids
+
+Revision ID: 0c6a5f2e8d47
+Revises: e4c1d7a3b952
+Create Date: 2026-10-18 17:48:20.663092
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0c6a5f2e8d47'
+down_revision = 'e4c1d7a3b952'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('city_centroids',
+    sa.Column('state', sa.String(length=2), nullable=False),
+    sa.Column('city_key', sa.String(length=120), nullable=False),
+    sa.Column('name', sa.String(length=120), nullable=False),
+    sa.Column('latitude', sa.Float(), nullable=False),
+    sa.Column('longitude', sa.Float(), nullable=False),
+    sa.Column('geohash', sa.String(length=12, collation='C'), nullable=False),
+    sa.PrimaryKeyConstraint('state', 'city_key')
+    )
+    op.add_column('venues', sa.Column('latitude', sa.Float(), nullable=True))
+    op.add_column('venues', sa.Column('longitude', sa.Float(), nullable=True))
+    op.add_column('venues', sa.Column('geohash', sa.String(length=12, collation='C'), nullable=True))
+    op.create_index('ix_venues_geohash', 'venues', ['geohash'], unique=False)
+    # Venues are placed once centroids are loaded: flask load-centroids, then
+    # flask geocode-venues.
+
+
+def downgrade():
+    op.drop_index('ix_venues_geohash', table_name='venues')
+    op.drop_column('venues', 'geohash')
+    op.drop_column('venues', 'longitude')
+    op.drop_column('venues', 'latitude')
+    op.drop_table('city_centroids')
@@ -0,0 +1,41 @@
+"""add access path indexes
+
+Revision ID: 3b7f2c9d4e81
+Revises: f8296a5e6f35
+Create Date: 2026-10-18 09:12:40.518233
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3b7f2c9d4e81'
+down_revision = 'f8296a5e6f35'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    op.create_index('ix_shows_venue_id_start_time', 'shows', ['venue_id', 'start_time'], unique=False)
+    op.create_index('ix_shows_artist_id_start_time', 'shows', ['artist_id', 'start_time'], unique=False)
+    op.create_index('ix_shows_start_time_id', 'shows', ['start_time', 'id'], unique=False)
+    op.create_index('ix_venues_city_state', 'venues', ['city', 'state'], unique=False)
+    op.create_index('ix_venues_name_id', 'venues', ['name', 'id'], unique=False)
+    op.create_index('ix_artists_name_id', 'artists', ['name', 'id'], unique=False)
+    op.create_index('ix_venues_name_trgm', 'venues', ['name'], unique=False,
+                    postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'})
+    op.create_index('ix_artists_name_trgm', 'artists', ['name'], unique=False,
+                    postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'})
+
+
+def downgrade():
+    op.drop_index('ix_artists_name_trgm', table_name='artists')
+    op.drop_index('ix_venues_name_trgm', table_name='venues')
+    op.drop_index('ix_artists_name_id', table_name='artists')
+    op.drop_index('ix_venues_name_id', table_name='venues')
+    op.drop_index('ix_venues_city_state', table_name='venues')
+    op.drop_index('ix_shows_start_time_id', table_name='shows')
+    op.drop_index('ix_shows_artist_id_start_time', table_name='shows')
+    op.drop_index('ix_shows_venue_id_start_time', table_name='shows')
@@ -0,0 +1,70 @@
+"""add the upcoming shows feed tables
+
+Revision ID: 4a9e7c1b2d58
+Revises: c5d82e1f7a64
+Create Date: 2026-10-18 14:02:47.518204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4a9e7c1b2d58'
+down_revision = 'c5d82e1f7a64'
+branch_labels = None
+depends_on = None
+
+
+# Must stay in step with feed.SOURCE.
+BACKFILL = """
+INSERT INTO upcoming_shows (show_id, start_time, venue_id, venue_name,
+    venue_city, venue_state, venue_image_link, artist_id, artist_name,
+    artist_image_link, genres)
+SELECT s.id, s.start_time, s.venue_id, v.name, v.city, v.state, v.image_link,
+    s.artist_id, a.name, a.image_link, a.genres
+FROM shows s
+JOIN venues v ON v.id = s.venue_id
+JOIN artists a ON a.id = s.artist_id
+WHERE s.start_time >= LOCALTIMESTAMP;
+
+INSERT INTO upcoming_show_genres (genre, start_time, show_id)
+SELECT DISTINCT unnest(genres), start_time, show_id FROM upcoming_shows;
+"""
+
+
+def upgrade():
+    op.create_table('upcoming_shows',
+    sa.Column('show_id', sa.Integer(), nullable=False),
+    sa.Column('start_time', sa.DateTime(), nullable=False),
+    sa.Column('venue_id', sa.Integer(), nullable=False),
+    sa.Column('venue_name', sa.String(), nullable=True),
+    sa.Column('venue_city', sa.String(length=120), nullable=True),
+    sa.Column('venue_state', sa.String(length=120), nullable=True),
+    sa.Column('venue_image_link', sa.String(length=500), nullable=True),
+    sa.Column('artist_id', sa.Integer(), nullable=False),
+    sa.Column('artist_name', sa.String(), nullable=True),
+    sa.Column('artist_image_link', sa.String(length=500), nullable=True),
+    sa.Column('genres', sa.ARRAY(sa.String(length=120)), nullable=True),
+    sa.ForeignKeyConstraint(['show_id'], ['shows.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('show_id')
+    )
+    op.create_index('ix_upcoming_shows_start_time_show_id', 'upcoming_shows', ['start_time', 'show_id'], unique=False)
+    op.create_index('ix_upcoming_shows_area_start_time_show_id', 'upcoming_shows', ['venue_state', 'venue_city', 'start_time', 'show_id'], unique=False)
+    op.create_table('upcoming_show_genres',
+    sa.Column('genre', sa.String(length=120), nullable=False),
+    sa.Column('start_time', sa.DateTime(), nullable=False),
+    sa.Column('show_id', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['show_id'], ['upcoming_shows.show_id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('genre', 'start_time', 'show_id')
+    )
+    op.create_index('ix_upcoming_show_genres_show_id', 'upcoming_show_genres', ['show_id'], unique=False)
+    op.execute(BACKFILL)
+
+
+def downgrade():
+    op.drop_index('ix_upcoming_show_genres_show_id', table_name='upcoming_show_genres')
+    op.drop_table('upcoming_show_genres')
+    op.drop_index('ix_upcoming_shows_area_start_time_show_id', table_name='upcoming_shows')
+    op.drop_index('ix_upcoming_shows_start_time_show_id', table_name='upcoming_shows')
+    op.drop_table('upcoming_shows')
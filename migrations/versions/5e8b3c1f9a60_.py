@@ -0,0 +1,71 @@
+"""add show end times and booking exclusion constraints
+
+Revision ID: 5e8b3c1f9a60
+Revises: 0c6a5f2e8d47
+Create Date: 2026-10-18 18:41:05.271934
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5e8b3c1f9a60'
+down_revision = '0c6a5f2e8d47'
+branch_labels = None
+depends_on = None
+
+
+# Shows at the same venue, or by the same artist, starting at the same time.
+DUPLICATES = """
+SELECT count(*) FROM (
+    SELECT 1 FROM shows WHERE start_time IS NOT NULL
+    GROUP BY venue_id, start_time HAVING count(*) > 1
+    UNION ALL
+    SELECT 1 FROM shows WHERE start_time IS NOT NULL
+    GROUP BY artist_id, start_time HAVING count(*) > 1
+) duplicates
+"""
+
+# Existing shows last the default 180 minutes, cut short where the venue or
+# the artist has its next show sooner, so none of them overlap.
+BACKFILL = """
+UPDATE shows s SET end_time = least(s.start_time + interval '180 minutes',
+                                    n.next_at_venue, n.next_for_artist)
+FROM (SELECT id,
+        lead(start_time) OVER (PARTITION BY venue_id ORDER BY start_time) AS next_at_venue,
+        lead(start_time) OVER (PARTITION BY artist_id ORDER BY start_time) AS next_for_artist
+      FROM shows WHERE start_time IS NOT NULL) n
+WHERE n.id = s.id
+"""
+
+# Must stay in step with models._booking().
+EXCLUDE = """
+ALTER TABLE shows ADD CONSTRAINT ex_shows_{name}_booking EXCLUDE USING gist (
+    int4range({column}, {column}, '[]') WITH &&,
+    tsrange(start_time, end_time) WITH &&
+) WHERE (end_time IS NOT NULL)
+"""
+
+
+def upgrade():
+    op.execute('LOCK TABLE shows IN SHARE MODE')
+    duplicates = op.get_bind().execute(sa.text(DUPLICATES)).scalar()
+    if duplicates:
+        raise RuntimeError(
+            '%d venues or artists have two shows starting at the same time; '
+            'delete one of each pair before upgrading' % duplicates)
+    op.add_column('shows', sa.Column('end_time', sa.DateTime(), nullable=True))
+    op.execute(BACKFILL)
+    op.create_check_constraint(
+        'ck_shows_end_time', 'shows',
+        'end_time IS NULL OR (start_time IS NOT NULL AND start_time < end_time)')
+    op.execute(EXCLUDE.format(name='venue', column='venue_id'))
+    op.execute(EXCLUDE.format(name='artist', column='artist_id'))
+
+
+def downgrade():
+    op.drop_constraint('ex_shows_artist_booking', 'shows')
+    op.drop_constraint('ex_shows_venue_booking', 'shows')
+    op.drop_constraint('ck_shows_end_time', 'shows', type_='check')
+    op.drop_column('shows', 'end_time')
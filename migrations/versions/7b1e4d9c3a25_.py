@@ -0,0 +1,151 @@
+"""count shows once per statement
+
+Revision ID: 7b1e4d9c3a25
+Revises: 5e8b3c1f9a60
+Create Date: 2026-10-18 20:12:44.518203
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7b1e4d9c3a25'
+down_revision = '5e8b3c1f9a60'
+branch_labels = None
+depends_on = None
+
+
+# Must stay in step with counters.TRIGGER_FUNCTION and counters.TRIGGERS.
+TRIGGER_FUNCTION = """
+CREATE OR REPLACE FUNCTION count_shows() RETURNS trigger AS $$
+DECLARE
+    watermark timestamp;
+BEGIN
+    -- Shared lock: sweep() and reconcile() cannot move the watermark
+    -- while shows are being counted against it.
+    SELECT classified_until INTO watermark FROM show_count_watermark FOR SHARE;
+    IF TG_OP = 'UPDATE' THEN
+        -- Nothing to count unless a venue, artist or start time changed.
+        IF NOT EXISTS (
+                SELECT 1 FROM old_rows o JOIN new_rows n ON n.id = o.id
+                WHERE (o.venue_id, o.artist_id, o.start_time)
+                    IS DISTINCT FROM (n.venue_id, n.artist_id, n.start_time)) THEN
+            RETURN NULL;
+        END IF;
+    END IF;
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        UPDATE venues t SET show_count = show_count - d.total,
+            past_show_count = past_show_count - d.past,
+            upcoming_show_count = upcoming_show_count - d.upcoming
+        FROM (SELECT venue_id AS id, count(*) AS total,
+                  count(*) FILTER (WHERE start_time < watermark) AS past,
+                  count(*) FILTER (WHERE start_time >= watermark) AS upcoming
+              FROM old_rows GROUP BY venue_id) d
+        WHERE t.id = d.id;
+        UPDATE artists t SET show_count = show_count - d.total,
+            past_show_count = past_show_count - d.past,
+            upcoming_show_count = upcoming_show_count - d.upcoming
+        FROM (SELECT artist_id AS id, count(*) AS total,
+                  count(*) FILTER (WHERE start_time < watermark) AS past,
+                  count(*) FILTER (WHERE start_time >= watermark) AS upcoming
+              FROM old_rows GROUP BY artist_id) d
+        WHERE t.id = d.id;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        UPDATE venues t SET show_count = show_count + d.total,
+            past_show_count = past_show_count + d.past,
+            upcoming_show_count = upcoming_show_count + d.upcoming
+        FROM (SELECT venue_id AS id, count(*) AS total,
+                  count(*) FILTER (WHERE start_time < watermark) AS past,
+                  count(*) FILTER (WHERE start_time >= watermark) AS upcoming
+              FROM new_rows GROUP BY venue_id) d
+        WHERE t.id = d.id;
+        UPDATE artists t SET show_count = show_count + d.total,
+            past_show_count = past_show_count + d.past,
+            upcoming_show_count = upcoming_show_count + d.upcoming
+        FROM (SELECT artist_id AS id, count(*) AS total,
+                  count(*) FILTER (WHERE start_time < watermark) AS past,
+                  count(*) FILTER (WHERE start_time >= watermark) AS upcoming
+              FROM new_rows GROUP BY artist_id) d
+        WHERE t.id = d.id;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql
+"""
+
+TRIGGERS = [
+    """
+CREATE TRIGGER shows_count_insert AFTER INSERT ON shows
+REFERENCING NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE PROCEDURE count_shows()
+""",
+    """
+CREATE TRIGGER shows_count_update AFTER UPDATE ON shows
+REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE PROCEDURE count_shows()
+""",
+    """
+CREATE TRIGGER shows_count_delete AFTER DELETE ON shows
+REFERENCING OLD TABLE AS old_rows
+FOR EACH STATEMENT EXECUTE PROCEDURE count_shows()
+""",
+]
+
+# The row-level trigger of 9d3f6b8e1a27, for downgrade().
+ROW_TRIGGER_FUNCTION = """
+CREATE OR REPLACE FUNCTION count_show() RETURNS trigger AS $$
+DECLARE
+    watermark timestamp;
+BEGIN
+    -- Shared lock: sweep() and reconcile() cannot move the watermark
+    -- while a show is being counted against it.
+    SELECT classified_until INTO watermark FROM show_count_watermark FOR SHARE;
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        UPDATE venues SET show_count = show_count - 1,
+            past_show_count = past_show_count - coalesce((OLD.start_time < watermark)::int, 0),
+            upcoming_show_count = upcoming_show_count - coalesce((OLD.start_time >= watermark)::int, 0)
+        WHERE id = OLD.venue_id;
+        UPDATE artists SET show_count = show_count - 1,
+            past_show_count = past_show_count - coalesce((OLD.start_time < watermark)::int, 0),
+            upcoming_show_count = upcoming_show_count - coalesce((OLD.start_time >= watermark)::int, 0)
+        WHERE id = OLD.artist_id;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        UPDATE venues SET show_count = show_count + 1,
+            past_show_count = past_show_count + coalesce((NEW.start_time < watermark)::int, 0),
+            upcoming_show_count = upcoming_show_count + coalesce((NEW.start_time >= watermark)::int, 0)
+        WHERE id = NEW.venue_id;
+        UPDATE artists SET show_count = show_count + 1,
+            past_show_count = past_show_count + coalesce((NEW.start_time < watermark)::int, 0),
+            upcoming_show_count = upcoming_show_count + coalesce((NEW.start_time >= watermark)::int, 0)
+        WHERE id = NEW.artist_id;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql
+"""
+
+ROW_TRIGGER = """
+CREATE TRIGGER shows_count AFTER INSERT OR DELETE OR UPDATE OF venue_id, artist_id, start_time
+ON shows FOR EACH ROW EXECUTE PROCEDURE count_show()
+"""
+
+
+def upgrade():
+    # Alembic runs this in one transaction, and DROP TRIGGER holds off
+    # writes to shows until it commits, so no show goes uncounted.
+    op.execute('DROP TRIGGER shows_count ON shows')
+    op.execute('DROP FUNCTION count_show()')
+    op.execute(TRIGGER_FUNCTION)
+    for trigger in TRIGGERS:
+        op.execute(trigger)
+
+
+def downgrade():
+    for name in ('insert', 'update', 'delete'):
+        op.execute('DROP TRIGGER shows_count_%s ON shows' % name)
+    op.execute('DROP FUNCTION count_shows()')
+    op.execute(ROW_TRIGGER_FUNCTION)
+    op.execute(ROW_TRIGGER)
@@ -0,0 +1,26 @@
+"""order venues by area
+
+Revision ID: 8e41d0a6c2b3
+Revises: 3b7f2c9d4e81
+Create Date: 2026-10-18 10:03:17.904512
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8e41d0a6c2b3'
+down_revision = '3b7f2c9d4e81'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_venues_state_city_name_id', 'venues', ['state', 'city', 'name', 'id'], unique=False)
+    op.drop_index('ix_venues_city_state', table_name='venues')
+
+
+def downgrade():
+    op.create_index('ix_venues_city_state', 'venues', ['city', 'state'], unique=False)
+    op.drop_index('ix_venues_state_city_name_id', table_name='venues')
@@ -0,0 +1,95 @@
+"""add maintained show counters to venues and artists
+
+Revision ID: 9d3f6b8e1a27
+Revises: 4a9e7c1b2d58
+Create Date: 2026-10-18 15:37:12.904316
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9d3f6b8e1a27'
+down_revision = '4a9e7c1b2d58'
+branch_labels = None
+depends_on = None
+
+
+# Must stay in step with counters.TRIGGER_FUNCTION and counters.TRIGGER.
+TRIGGER_FUNCTION = """
+CREATE OR REPLACE FUNCTION count_show() RETURNS trigger AS $$
+DECLARE
+    watermark timestamp;
+BEGIN
+    -- Shared lock: sweep() and reconcile() cannot move the watermark
+    -- while a show is being counted against it.
+    SELECT classified_until INTO watermark FROM show_count_watermark FOR SHARE;
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        UPDATE venues SET show_count = show_count - 1,
+            past_show_count = past_show_count - coalesce((OLD.start_time < watermark)::int, 0),
+            upcoming_show_count = upcoming_show_count - coalesce((OLD.start_time >= watermark)::int, 0)
+        WHERE id = OLD.venue_id;
+        UPDATE artists SET show_count = show_count - 1,
+            past_show_count = past_show_count - coalesce((OLD.start_time < watermark)::int, 0),
+            upcoming_show_count = upcoming_show_count - coalesce((OLD.start_time >= watermark)::int, 0)
+        WHERE id = OLD.artist_id;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        UPDATE venues SET show_count = show_count + 1,
+            past_show_count = past_show_count + coalesce((NEW.start_time < watermark)::int, 0),
+            upcoming_show_count = upcoming_show_count + coalesce((NEW.start_time >= watermark)::int, 0)
+        WHERE id = NEW.venue_id;
+        UPDATE artists SET show_count = show_count + 1,
+            past_show_count = past_show_count + coalesce((NEW.start_time < watermark)::int, 0),
+            upcoming_show_count = upcoming_show_count + coalesce((NEW.start_time >= watermark)::int, 0)
+        WHERE id = NEW.artist_id;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql
+"""
+
+TRIGGER = """
+CREATE TRIGGER shows_count AFTER INSERT OR DELETE OR UPDATE OF venue_id, artist_id, start_time
+ON shows FOR EACH ROW EXECUTE PROCEDURE count_show()
+"""
+
+BACKFILL = """
+UPDATE {table} t SET show_count = a.total, past_show_count = a.past,
+    upcoming_show_count = a.upcoming
+FROM (SELECT {column} AS id, count(*) AS total,
+          count(*) FILTER (WHERE start_time < w.classified_until) AS past,
+          count(*) FILTER (WHERE start_time >= w.classified_until) AS upcoming
+      FROM shows, show_count_watermark w GROUP BY {column}) a
+WHERE a.id = t.id
+"""
+
+COUNTERS = ('show_count', 'past_show_count', 'upcoming_show_count')
+
+
+def upgrade():
+    op.create_table('show_count_watermark',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('classified_until', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.execute("INSERT INTO show_count_watermark (id, classified_until) VALUES (1, LOCALTIMESTAMP)")
+    for table in ('venues', 'artists'):
+        for column in COUNTERS:
+            op.add_column(table, sa.Column(column, sa.Integer(), server_default='0', nullable=False))
+    # Taken before the backfill so that no show is counted twice or missed.
+    op.execute('LOCK TABLE shows IN SHARE MODE')
+    op.execute(BACKFILL.format(table='venues', column='venue_id'))
+    op.execute(BACKFILL.format(table='artists', column='artist_id'))
+    op.execute(TRIGGER_FUNCTION)
+    op.execute(TRIGGER)
+
+
+def downgrade():
+    op.execute('DROP TRIGGER shows_count ON shows')
+    op.execute('DROP FUNCTION count_show()')
+    for table in ('artists', 'venues'):
+        for column in reversed(COUNTERS):
+            op.drop_column(table, column)
+    op.drop_table('show_count_watermark')
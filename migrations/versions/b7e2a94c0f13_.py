@@ -0,0 +1,38 @@
+"""cascade show deletes and add hidden flags to venues and artists
+
+Revision ID: b7e2a94c0f13
+Revises: 9d3f6b8e1a27
+Create Date: 2026-10-18 16:21:05.377190
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7e2a94c0f13'
+down_revision = '9d3f6b8e1a27'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('venues', sa.Column('hidden', sa.Boolean(), server_default='false', nullable=False))
+    op.add_column('artists', sa.Column('hidden', sa.Boolean(), server_default='false', nullable=False))
+    op.create_index('ix_venues_hidden', 'venues', ['id'], unique=False, postgresql_where=sa.text('hidden'))
+    op.create_index('ix_artists_hidden', 'artists', ['id'], unique=False, postgresql_where=sa.text('hidden'))
+    op.drop_constraint('shows_venue_id_fkey', 'shows', type_='foreignkey')
+    op.create_foreign_key('shows_venue_id_fkey', 'shows', 'venues', ['venue_id'], ['id'], ondelete='CASCADE')
+    op.drop_constraint('shows_artist_id_fkey', 'shows', type_='foreignkey')
+    op.create_foreign_key('shows_artist_id_fkey', 'shows', 'artists', ['artist_id'], ['id'], ondelete='CASCADE')
+
+
+def downgrade():
+    op.drop_constraint('shows_artist_id_fkey', 'shows', type_='foreignkey')
+    op.create_foreign_key('shows_artist_id_fkey', 'shows', 'artists', ['artist_id'], ['id'])
+    op.drop_constraint('shows_venue_id_fkey', 'shows', type_='foreignkey')
+    op.create_foreign_key('shows_venue_id_fkey', 'shows', 'venues', ['venue_id'], ['id'])
+    op.drop_index('ix_artists_hidden', table_name='artists')
+    op.drop_index('ix_venues_hidden', table_name='venues')
+    op.drop_column('artists', 'hidden')
+    op.drop_column('venues', 'hidden')
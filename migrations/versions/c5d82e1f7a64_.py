@@ -0,0 +1,47 @@
+"""add full-text search vectors
+
+Revision ID: c5d82e1f7a64
+Revises: 8e41d0a6c2b3
+Create Date: 2026-10-18 11:26:02.331870
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = 'c5d82e1f7a64'
+down_revision = '8e41d0a6c2b3'
+branch_labels = None
+depends_on = None
+
+
+# Must stay in step with search.search_document().
+BACKFILL = """
+UPDATE {table} SET search_vector = to_tsvector('simple', concat_ws(' ',
+    name, city, state, array_to_string(genres, ' ')))
+"""
+
+
+def upgrade():
+    op.add_column('artists', sa.Column('search_vector', postgresql.TSVECTOR(), nullable=True))
+    op.add_column('venues', sa.Column('search_vector', postgresql.TSVECTOR(), nullable=True))
+    op.execute(BACKFILL.format(table='artists'))
+    op.execute(BACKFILL.format(table='venues'))
+    op.create_index('ix_artists_search_vector', 'artists', ['search_vector'], unique=False, postgresql_using='gin')
+    op.create_index('ix_venues_search_vector', 'venues', ['search_vector'], unique=False, postgresql_using='gin')
+    # Search no longer reads the trigram indexes; they only slowed writes.
+    op.drop_index('ix_artists_name_trgm', table_name='artists')
+    op.drop_index('ix_venues_name_trgm', table_name='venues')
+
+
+def downgrade():
+    op.create_index('ix_venues_name_trgm', 'venues', ['name'], unique=False,
+                    postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'})
+    op.create_index('ix_artists_name_trgm', 'artists', ['name'], unique=False,
+                    postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'})
+    op.drop_index('ix_venues_search_vector', table_name='venues')
+    op.drop_index('ix_artists_search_vector', table_name='artists')
+    op.drop_column('venues', 'search_vector')
+    op.drop_column('artists', 'search_vector')
@@ -0,0 +1,26 @@
+"""index venue and artist genres for faceted browsing
+
+Revision ID: e4c1d7a3b952
+Revises: b7e2a94c0f13
+Create Date: 2026-10-18 17:05:43.112839
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e4c1d7a3b952'
+down_revision = 'b7e2a94c0f13'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_venues_genres', 'venues', ['genres'], unique=False, postgresql_using='gin')
+    op.create_index('ix_artists_genres', 'artists', ['genres'], unique=False, postgresql_using='gin')
+
+
+def downgrade():
+    op.drop_index('ix_artists_genres', table_name='artists')
+    op.drop_index('ix_venues_genres', table_name='venues')
@@ -1,45 +1,82 @@
 #----------------------------------------------------------------------------#
 # Imports
 #----------------------------------------------------------------------------#
-from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy.dialects.postgresql import ARRAY, TSVECTOR, ExcludeConstraint
+
+from routing import RoutingSQLAlchemy
 
 
 #----------------------------------------------------------------------------#
 # Models.
 #----------------------------------------------------------------------------#
 
-db = SQLAlchemy()
+db = RoutingSQLAlchemy()
+
+
+def _booking(column):
+    """Exclusion constraint elements: the same venue (or artist) and
+    overlapping [start_time, end_time) periods."""
+    return ((db.func.int4range(db.literal_column(column), db.literal_column(column),
+                               db.literal_column("'[]'")), '&&'),
+            (db.func.tsrange(db.literal_column('start_time'),
+                             db.literal_column('end_time')), '&&'))
 
 
 class Show(db.Model):
     __tablename__ = 'shows'
+    __table_args__ = (
+        db.Index('ix_shows_venue_id_start_time', 'venue_id', 'start_time'),
+        db.Index('ix_shows_artist_id_start_time', 'artist_id', 'start_time'),
+        db.Index('ix_shows_start_time_id', 'start_time', 'id'),
+        # No venue and no artist is booked twice at once; see scheduling.py.
+        ExcludeConstraint(*_booking('venue_id'), name='ex_shows_venue_booking',
+                          using='gist', where=db.text('end_time IS NOT NULL')),
+        ExcludeConstraint(*_booking('artist_id'), name='ex_shows_artist_booking',
+                          using='gist', where=db.text('end_time IS NOT NULL')),
+        db.CheckConstraint(
+            'end_time IS NULL OR (start_time IS NOT NULL AND start_time < end_time)',
+            name='ck_shows_end_time'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     venue_id = db.Column(db.Integer, db.ForeignKey(
-        'venues.id'), nullable=False)
+        'venues.id', ondelete='CASCADE'), nullable=False)
     artist_id = db.Column(db.Integer, db.ForeignKey(
-        'artists.id'), nullable=False)
+        'artists.id', ondelete='CASCADE'), nullable=False)
     start_time = db.Column(db.DateTime)
+    end_time = db.Column(db.DateTime)
+    # Declared here rather than as backrefs, so queries can join through
+    # them before anything has configured the Venue and Artist mappers.
+    venue = db.relationship('Venue', back_populates='artists', lazy=True)
+    artist = db.relationship('Artist', back_populates='venues', lazy=True)
 
-    def __init__(self, venue_id, artist_id, start_time):
+    def __init__(self, venue_id, artist_id, start_time, end_time=None):
         self.venue_id = venue_id
         self.artist_id = artist_id
         self.start_time = start_time
+        self.end_time = end_time
+
+    format_fields = ('id', 'venue_id', 'artist_id', 'start_time', 'end_time')
 
     def format(self):
-        return {
-            "venue_id": self.venue_id,
-            "artist_id": self.artist_id,
-            "start_time": self.start_time
-        }
+        return {field: getattr(self, field) for field in self.format_fields}
 
 
 class Venue(db.Model):
     __tablename__ = 'venues'
+    __table_args__ = (
+        db.Index('ix_venues_state_city_name_id', 'state', 'city', 'name', 'id'),
+        db.Index('ix_venues_name_id', 'name', 'id'),
+        db.Index('ix_venues_search_vector', 'search_vector',
+                 postgresql_using='gin'),
+        db.Index('ix_venues_genres', 'genres', postgresql_using='gin'),
+        db.Index('ix_venues_geohash', 'geohash'),
+        db.Index('ix_venues_hidden', 'id', postgresql_where=db.text('hidden')),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String, nullable=False)
-    genres = db.Column(db.ARRAY(db.String(120)))
+    genres = db.Column(ARRAY(db.String(120)))
     address = db.Column(db.String(120))
     city = db.Column(db.String(120))
     state = db.Column(db.String(120))
@@ -49,7 +86,19 @@ class Venue(db.Model):
     seeking_talent = db.Column(db.Boolean, nullable=False, default=False)
     seeking_description = db.Column(db.String(255))
     image_link = db.Column(db.String(500))
-    artists = db.relationship('Show', backref=db.backref('venue', lazy=True))
+    search_vector = db.Column(TSVECTOR)
+    # Set while the shows are deleted in the background, see deletion.py.
+    hidden = db.Column(db.Boolean, nullable=False, default=False, server_default='false')
+    # Maintained by a trigger on shows, see counters.py.
+    show_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    past_show_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    upcoming_show_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    # The centroid of the city, see geo.py. Byte order (collation C) keeps
+    # the geohashes of a cell in one index range.
+    latitude = db.Column(db.Float)
+    longitude = db.Column(db.Float)
+    geohash = db.Column(db.String(12, collation='C'))
+    artists = db.relationship('Show', back_populates='venue', passive_deletes=True)
 
     def __init__(self, name, genres, address, city, state, phone, website, facebook_link, seeking_talent, seeking_description, image_link):
         self.name = name
@@ -64,29 +113,27 @@ class Venue(db.Model):
         self.seeking_description = seeking_description
         self.image_link = image_link
 
+    format_fields = ('id', 'name', 'genres', 'address', 'city', 'state',
+                     'phone', 'website', 'facebook_link', 'seeking_talent',
+                     'seeking_description', 'image_link')
+
     def format(self):
-        return {
-            "id": self.id,
-            "name": self.name,
-            "genres": self.genres,
-            "address": self.address,
-            "city": self.city,
-            "state": self.state,
-            "phone": self.phone,
-            "website": self.website,
-            "facebook_link": self.facebook_link,
-            "seeking_talent": self.seeking_talent,
-            "seeking_description": self.seeking_description,
-            "image_link": self.image_link,
-        }
+        return {field: getattr(self, field) for field in self.format_fields}
 
 
 class Artist(db.Model):
     __tablename__ = 'artists'
+    __table_args__ = (
+        db.Index('ix_artists_name_id', 'name', 'id'),
+        db.Index('ix_artists_search_vector', 'search_vector',
+                 postgresql_using='gin'),
+        db.Index('ix_artists_genres', 'genres', postgresql_using='gin'),
+        db.Index('ix_artists_hidden', 'id', postgresql_where=db.text('hidden')),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String, nullable=False)
-    genres = db.Column(db.ARRAY(db.String(120)))
+    genres = db.Column(ARRAY(db.String(120)))
     city = db.Column(db.String(120))
     state = db.Column(db.String(120))
     phone = db.Column(db.String(120))
@@ -95,6 +142,14 @@ class Artist(db.Model):
     seeking_venue = db.Column(db.Boolean, nullable=False, default=False)
     seeking_description = db.Column(db.String(255))
     image_link = db.Column(db.String(500))
+    search_vector = db.Column(TSVECTOR)
+    # Set while the shows are deleted in the background, see deletion.py.
+    hidden = db.Column(db.Boolean, nullable=False, default=False, server_default='false')
+    # Maintained by a trigger on shows, see counters.py.
+    show_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    past_show_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    upcoming_show_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    venues = db.relationship('Show', back_populates='artist', passive_deletes=True)
 
     def __init__(self, name, genres, city, state, phone, website, facebook_link, seeking_venue, seeking_description, image_link):
         self.name = name
@@ -108,17 +163,73 @@ class Artist(db.Model):
         self.seeking_description = seeking_description
         self.image_link = image_link
 
+    format_fields = ('id', 'name', 'genres', 'city', 'state', 'phone',
+                     'website', 'facebook_link', 'seeking_venue',
+                     'seeking_description', 'image_link')
+
     def format(self):
-        return {
-            "id": self.id,
-            "name": self.name,
-            "genres": self.genres,
-            "city": self.city,
-            "state": self.state,
-            "phone": self.phone,
-            "website": self.website,
-            "facebook_link": self.facebook_link,
-            "seeking_venue": self.seeking_venue,
-            "seeking_description": self.seeking_description,
-            "image_link": self.image_link
-        }
+        return {field: getattr(self, field) for field in self.format_fields}
+
+
+class UpcomingShow(db.Model):
+    """Denormalized copy of every show that has not started, for the feeds.
+
+    Maintained by feed.py; rows go when their show is deleted, and the
+    sweep-feed command drops the ones that have started.
+    """
+    __tablename__ = 'upcoming_shows'
+    __table_args__ = (
+        db.Index('ix_upcoming_shows_start_time_show_id', 'start_time', 'show_id'),
+        db.Index('ix_upcoming_shows_area_start_time_show_id',
+                 'venue_state', 'venue_city', 'start_time', 'show_id'),
+    )
+
+    show_id = db.Column(db.Integer, db.ForeignKey(
+        'shows.id', ondelete='CASCADE'), primary_key=True)
+    start_time = db.Column(db.DateTime, nullable=False)
+    venue_id = db.Column(db.Integer, nullable=False)
+    venue_name = db.Column(db.String)
+    venue_city = db.Column(db.String(120))
+    venue_state = db.Column(db.String(120))
+    venue_image_link = db.Column(db.String(500))
+    artist_id = db.Column(db.Integer, nullable=False)
+    artist_name = db.Column(db.String)
+    artist_image_link = db.Column(db.String(500))
+    genres = db.Column(db.ARRAY(db.String(120)))
+
+
+class UpcomingShowGenre(db.Model):
+    """One row per genre of an upcoming show, keyed for the genre feed."""
+    __tablename__ = 'upcoming_show_genres'
+    __table_args__ = (
+        db.Index('ix_upcoming_show_genres_show_id', 'show_id'),
+    )
+
+    genre = db.Column(db.String(120), primary_key=True)
+    start_time = db.Column(db.DateTime, primary_key=True)
+    show_id = db.Column(db.Integer, db.ForeignKey(
+        'upcoming_shows.show_id', ondelete='CASCADE'), primary_key=True)
+
+
+class CityCentroid(db.Model):
+    """Where a US city is, for placing venues without a geocoding service.
+
+    Loaded from the Census Gazetteer by the load-centroids command.
+    """
+    __tablename__ = 'city_centroids'
+
+    state = db.Column(db.String(2), primary_key=True)
+    # Lower-cased name with single spaces, see geo.city_key().
+    city_key = db.Column(db.String(120), primary_key=True)
+    name = db.Column(db.String(120), nullable=False)
+    latitude = db.Column(db.Float, nullable=False)
+    longitude = db.Column(db.Float, nullable=False)
+    geohash = db.Column(db.String(12, collation='C'), nullable=False)
+
+
+class ShowCountWatermark(db.Model):
+    """Single row holding the time the stored past/upcoming counts split at."""
+    __tablename__ = 'show_count_watermark'
+
+    id = db.Column(db.Integer, primary_key=True)
+    classified_until = db.Column(db.DateTime, nullable=False)
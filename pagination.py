@@ -0,0 +1,116 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+import base64
+import datetime
+import json
+
+from sqlalchemy import tuple_
+
+
+#----------------------------------------------------------------------------#
+# Keyset pagination.
+#----------------------------------------------------------------------------#
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def _encode_value(value):
+    if isinstance(value, datetime.datetime):
+        return {"dt": value.isoformat()}
+    return value
+
+
+def _decode_value(value):
+    if isinstance(value, dict):
+        return datetime.datetime.fromisoformat(value["dt"])
+    return value
+
+
+def encode_cursor(values):
+    payload = json.dumps([_encode_value(v) for v in values],
+                         separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return [_decode_value(v) for v in values]
+    except (ValueError, TypeError, KeyError):
+        raise InvalidCursor(token)
+
+
+class Page:
+    def __init__(self, items, per_page, next_cursor=None, prev_cursor=None):
+        self.items = items
+        self.per_page = per_page
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+
+def paginate(query, keys, per_page=DEFAULT_PAGE_SIZE, after=None, before=None,
+             from_end=False):
+    """Return one Page of `query` ordered by the `keys` columns.
+
+    `keys` must end in a unique column (normally the primary key) so that
+    the tuple of key values identifies a row. `after` and `before` are
+    cursor tokens taken from a previous page; the row comparison on the key
+    tuple lets the database seek straight into the matching index instead of
+    skipping over OFFSET rows, so every page costs the same. With neither,
+    the first page is returned, or the last one if `from_end` is set.
+    """
+    key_tuple = tuple_(*keys)
+    names = [key.key for key in keys]
+    backwards = before is not None or (from_end and after is None)
+
+    if backwards:
+        if before is not None:
+            values = decode_cursor(before)
+            if len(values) != len(keys):
+                raise InvalidCursor(before)
+            query = query.filter(key_tuple < tuple_(*values))
+        query = query.order_by(*[key.desc() for key in keys])
+    else:
+        if after is not None:
+            values = decode_cursor(after)
+            if len(values) != len(keys):
+                raise InvalidCursor(after)
+            query = query.filter(key_tuple > tuple_(*values))
+        query = query.order_by(*keys)
+
+    rows = query.limit(per_page + 1).all()
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+    if backwards:
+        rows.reverse()
+
+    def cursor_for(row):
+        return encode_cursor([getattr(row, name) for name in names])
+
+    next_cursor = prev_cursor = None
+    if rows:
+        if backwards:
+            if before is not None:
+                next_cursor = cursor_for(rows[-1])
+            if has_more:
+                prev_cursor = cursor_for(rows[0])
+        else:
+            if has_more:
+                next_cursor = cursor_for(rows[-1])
+            if after is not None:
+                prev_cursor = cursor_for(rows[0])
+
+    return Page(rows, per_page, next_cursor, prev_cursor)
@@ -0,0 +1,131 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+import bisect
+import threading
+import time
+
+from sqlalchemy import event, exc
+from sqlalchemy.pool import QueuePool
+
+
+#----------------------------------------------------------------------------#
+# Connection pool statistics.
+#----------------------------------------------------------------------------#
+
+# Upper bounds, in seconds, of the checkout wait histogram buckets.
+WAIT_BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0)
+
+
+class PoolStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.counters = {
+                'connects': 0,
+                'checkouts': 0,
+                'checkins': 0,
+                'invalidations': 0,
+                'timeouts': 0,
+            }
+            self.wait_counts = [0] * (len(WAIT_BUCKETS) + 1)
+            self.wait_sum = 0.0
+
+    def incr(self, name):
+        with self._lock:
+            self.counters[name] += 1
+
+    def observe_wait(self, seconds):
+        with self._lock:
+            self.wait_counts[bisect.bisect_left(WAIT_BUCKETS, seconds)] += 1
+            self.wait_sum += seconds
+
+    def snapshot(self, pool):
+        """Current pool occupancy plus the counters since start (or reset)."""
+        with self._lock:
+            counters = dict(self.counters)
+            wait_counts = list(self.wait_counts)
+            wait_sum = self.wait_sum
+        cumulative = 0
+        buckets = []
+        for bound, count in zip(WAIT_BUCKETS + (float('inf'),), wait_counts):
+            cumulative += count
+            buckets.append({'le': '+Inf' if bound == float('inf') else bound,
+                            'count': cumulative})
+        snapshot = {
+            'pool': type(pool).__name__,
+            'counters': counters,
+            'wait_seconds': {'count': cumulative, 'sum': wait_sum,
+                             'buckets': buckets},
+        }
+        if isinstance(pool, QueuePool):
+            snapshot.update({
+                'size': pool.size(),
+                'checked_out': pool.checkedout(),
+                'checked_in': pool.checkedin(),
+                'overflow': pool.overflow(),
+                'max_overflow': pool._max_overflow,
+                'timeout': pool.timeout(),
+            })
+        return snapshot
+
+
+def snapshot(pool):
+    """PoolStats.snapshot() of `pool`, with zero counters for a pool that
+    keeps none."""
+    return (getattr(pool, 'stats', None) or PoolStats()).snapshot(pool)
+
+
+class TimedQueuePool(QueuePool):
+    """QueuePool that counts its own events, and how long each checkout
+    waits for a connection, in its `stats`.
+
+    Pool events fire once a connection has been handed out, so the time
+    spent queueing for one is only visible from inside the pool. Every
+    engine has a pool of its own, so the primary and each replica are
+    counted apart.
+    """
+
+    def __init__(self, creator, **kw):
+        super().__init__(creator, **kw)
+        self.stats = PoolStats()
+        # recreate() (on engine.dispose()) passes the listeners of the old
+        # pool on to the new one, still counting into the old stats.
+        if kw.get('_dispatch') is None:
+            _count_events(self, self.stats)
+
+    def recreate(self):
+        pool = super().recreate()
+        pool.stats = self.stats
+        return pool
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            self.stats.incr('timeouts')
+            raise
+        finally:
+            self.stats.observe_wait(time.perf_counter() - started)
+
+
+def _count_events(pool, stats):
+    @event.listens_for(pool, 'connect')
+    def _on_connect(dbapi_connection, connection_record):
+        stats.incr('connects')
+
+    @event.listens_for(pool, 'checkout')
+    def _on_checkout(dbapi_connection, connection_record, connection_proxy):
+        stats.incr('checkouts')
+
+    @event.listens_for(pool, 'checkin')
+    def _on_checkin(dbapi_connection, connection_record):
+        stats.incr('checkins')
+
+    @event.listens_for(pool, 'invalidate')
+    def _on_invalidate(dbapi_connection, connection_record, exception):
+        stats.incr('invalidations')
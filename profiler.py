@@ -0,0 +1,110 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+import collections
+import random
+import time
+
+from flask import current_app, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+#----------------------------------------------------------------------------#
+# Query profiler.
+#----------------------------------------------------------------------------#
+
+class QueryProfile:
+    """Number and time of the statements run by one request.
+
+    A detailed profile also tallies them by their parameterised SQL.
+    """
+
+    def __init__(self, detailed=False):
+        self.started = time.perf_counter()
+        self.detailed = detailed
+        self.count = 0
+        self.seconds = 0.0
+        self.statements = collections.Counter()
+
+    def record(self, statement, seconds):
+        self.count += 1
+        self.seconds += seconds
+        if self.detailed:
+            self.statements[statement] += 1
+
+    def repeated(self, threshold):
+        return [(statement, count)
+                for statement, count in self.statements.most_common()
+                if count > threshold]
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context() and 'query_profile' in g:
+        # On the statement's context, which a failed statement takes with it.
+        context._profile_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, '_profile_started', None)
+    if started is not None and has_request_context() and 'query_profile' in g:
+        g.query_profile.record(statement, time.perf_counter() - started)
+
+
+class QueryProfiler:
+    """Counts and times the SQL statements of every request.
+
+    The totals stay on `g.query_profile` for the metrics. Sampled responses
+    also get a Server-Timing header and a log line, and a warning names any
+    statement that ran more than PROFILER_REPEAT_THRESHOLD times in one
+    request, the usual sign of an N+1 query.
+    """
+
+    def __init__(self, app=None):
+        self.sample_rate = 0.0
+        self.repeat_threshold = 10
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.sample_rate = app.config.get('PROFILER_SAMPLE_RATE', self.sample_rate)
+        self.repeat_threshold = app.config.get('PROFILER_REPEAT_THRESHOLD',
+                                               self.repeat_threshold)
+        if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+            # On the Engine class, so replica engines are profiled too.
+            event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+            event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+        app.before_request(self._start)
+        app.after_request(self._finish)
+        app.extensions['query_profiler'] = self
+
+    def _start(self):
+        g.query_profile = QueryProfile(
+            detailed=self.sample_rate > 0 and random.random() < self.sample_rate)
+
+    def _finish(self, response):
+        profile = g.get('query_profile')
+        if profile is None or not profile.detailed:
+            return response
+        total_ms = (time.perf_counter() - profile.started) * 1000
+        db_ms = profile.seconds * 1000
+        response.headers.add('Server-Timing', 'db;dur=%.1f;desc="%d queries"'
+                             % (db_ms, profile.count))
+        response.headers.add('Server-Timing', 'app;dur=%.1f' % total_ms)
+
+        logger = current_app.logger
+        repeated = profile.repeated(self.repeat_threshold)
+        logger.info('%s %s: %d queries in %.1f ms (%.1f ms total)',
+                    request.method, request.path, profile.count, db_ms, total_ms,
+                    extra={'endpoint': request.endpoint,
+                           'queries': profile.count,
+                           'db_ms': round(db_ms, 1),
+                           'total_ms': round(total_ms, 1),
+                           'repeated': len(repeated)})
+        for statement, count in repeated:
+            logger.warning('Possible N+1 query in %s %s: ran %d times: %s',
+                           request.method, request.path, count,
+                           ' '.join(statement.split()),
+                           extra={'endpoint': request.endpoint,
+                                  'repeat_count': count})
+        return response
@@ -0,0 +1,187 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+import functools
+import itertools
+import threading
+import time
+
+from flask import current_app, g, has_request_context, request, session
+from flask_sqlalchemy import SQLAlchemy, SignallingSession
+from sqlalchemy import create_engine, event, exc, orm, text
+
+
+#----------------------------------------------------------------------------#
+# Read replica routing.
+#----------------------------------------------------------------------------#
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+# Session key holding the time until which a client that wrote something
+# keeps reading from the primary.
+PRIMARY_UNTIL = '_primary_until'
+
+
+class Replica:
+    def __init__(self, engine):
+        self.engine = engine
+        self.healthy = True
+        self.error = None
+
+    def status(self):
+        return {
+            'url': repr(self.engine.url),
+            'healthy': self.healthy,
+            'error': self.error,
+            'checked_out': self.engine.pool.checkedout(),
+        }
+
+
+class ReplicaSet:
+    """Round-robin over the replicas that passed their last health check.
+
+    A replica whose connection fails leaves the rotation at once. Checks run
+    in a background thread at most every `check_interval` seconds, started
+    by the first lookup after the interval, and put it back once it answers.
+    """
+
+    def __init__(self, engines, check_interval=10):
+        self.replicas = [Replica(engine) for engine in engines]
+        self.check_interval = check_interval
+        self.checked_at = time.monotonic()
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+        self._checking = False
+        for replica in self.replicas:
+            event.listen(replica.engine, 'handle_error',
+                         functools.partial(self._on_error, replica))
+
+    def _on_error(self, replica, context):
+        # No connection means connecting failed.
+        if context.is_disconnect or context.connection is None:
+            replica.healthy = False
+            replica.error = str(context.original_exception).strip().splitlines()[0]
+
+    def check(self):
+        for replica in self.replicas:
+            try:
+                with replica.engine.connect() as conn:
+                    conn.execute(text('SELECT 1'))
+            except exc.SQLAlchemyError as e:
+                replica.healthy = False
+                replica.error = str(e).strip().splitlines()[0]
+            else:
+                replica.healthy = True
+                replica.error = None
+        self.checked_at = time.monotonic()
+
+    def _run_check(self):
+        try:
+            self.check()
+        finally:
+            self._checking = False
+
+    def _schedule_check(self):
+        if time.monotonic() - self.checked_at < self.check_interval:
+            return
+        with self._lock:
+            if self._checking:
+                return
+            self._checking = True
+        threading.Thread(target=self._run_check, daemon=True).start()
+
+    def choose(self):
+        """The next healthy replica engine, or None to use the primary."""
+        if not self.replicas:
+            return None
+        self._schedule_check()
+        healthy = [replica for replica in self.replicas if replica.healthy]
+        if not healthy:
+            return None
+        return healthy[next(self._counter) % len(healthy)].engine
+
+    def status(self):
+        return [replica.status() for replica in self.replicas]
+
+
+def read_only(view):
+    """Mark a view that only reads, whatever its method, e.g. a search
+    form POST: its reads go to a replica and it does not pin the client
+    to the primary."""
+    view.read_only = True
+    return view
+
+
+def _is_read_only():
+    if request.method in SAFE_METHODS:
+        return True
+    view = current_app.view_functions.get(request.endpoint)
+    return getattr(view, 'read_only', False)
+
+
+def reading_replica():
+    return has_request_context() and g.get('db_replica', False)
+
+
+def used_replica():
+    """Whether the current request has read anything from a replica."""
+    return has_request_context() and g.get('db_replica_used', False)
+
+
+def route_to_primary():
+    """Send the remaining reads of the current request to the primary."""
+    if has_request_context():
+        g.db_replica = False
+
+
+class RoutingSession(SignallingSession):
+    """Session that sends the reads of read-only requests to a replica.
+
+    Flushes, DML statements, anything outside a request and any request
+    that is not a GET or a read_only view (or comes right after one) use
+    the primary.
+    """
+
+    def get_bind(self, mapper=None, clause=None):
+        if (reading_replica() and not self._flushing
+                and not getattr(clause, 'is_dml', False)):
+            engine = self.app.extensions['replicas'].choose()
+            if engine is not None:
+                g.db_replica_used = True
+                return engine
+        return super().get_bind(mapper, clause)
+
+
+def _route_request():
+    replicas = current_app.extensions['replicas']
+    g.db_replica = bool(replicas.replicas
+                        and _is_read_only()
+                        and session.get(PRIMARY_UNTIL, 0) <= time.time())
+
+
+def _stick_to_primary(response):
+    # After a write the client is redirected to a page showing it; replicas
+    # may not have it yet, so the client reads from the primary for a while.
+    replicas = current_app.extensions['replicas']
+    if replicas.replicas and not _is_read_only():
+        session[PRIMARY_UNTIL] = time.time() + current_app.config['REPLICA_LAG_SECONDS']
+    return response
+
+
+class RoutingSQLAlchemy(SQLAlchemy):
+    """Flask-SQLAlchemy with reads routed to SQLALCHEMY_REPLICA_URIS."""
+
+    def create_session(self, options):
+        return orm.sessionmaker(class_=RoutingSession, db=self, **options)
+
+    def init_app(self, app):
+        super().init_app(app)
+        app.config.setdefault('SQLALCHEMY_REPLICA_URIS', [])
+        app.config.setdefault('REPLICA_CHECK_INTERVAL', 10)
+        app.config.setdefault('REPLICA_LAG_SECONDS', 10)
+        options = app.config.get('SQLALCHEMY_ENGINE_OPTIONS', {})
+        engines = [create_engine(uri, **options)
+                   for uri in app.config['SQLALCHEMY_REPLICA_URIS']]
+        app.extensions['replicas'] = ReplicaSet(
+            engines, app.config['REPLICA_CHECK_INTERVAL'])
+        app.before_request(_route_request)
+        app.after_request(_stick_to_primary)
@@ -0,0 +1,124 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import and_, event, func, literal_column, or_
+
+from models import db, Show
+
+
+#----------------------------------------------------------------------------#
+# Show scheduling.
+#----------------------------------------------------------------------------#
+
+# A show books its venue and its artist over [start_time, end_time). The
+# exclusion constraints ex_shows_venue_booking and ex_shows_artist_booking
+# keep those periods from overlapping, each through a GiST index on
+# (the venue or artist as a one-value range, the period). Both columns are
+# ranges, so the built-in range operator class serves and no btree_gist is
+# needed. The queries below use the same expressions, so they are answered
+# from those indexes: a descent plus the shows actually in the window.
+
+# Minutes a show lasts when no end time is given.
+DEFAULT_DURATION = 180
+MAX_WINDOW = timedelta(days=92)
+
+
+def default_end(start_time):
+    minutes = current_app.config.get('SHOW_DEFAULT_DURATION', DEFAULT_DURATION)
+    return start_time + timedelta(minutes=minutes)
+
+
+def _end_shows(mapper, connection, target):
+    if target.end_time is None and target.start_time is not None:
+        target.end_time = default_end(target.start_time)
+
+
+event.listen(Show, 'before_insert', _end_shows)
+
+
+def _one(value):
+    return func.int4range(value, value, literal_column("'[]'"))
+
+
+def booked(column, entity_id, start, end):
+    """Filters for the shows of one venue (or artist, by `column`) that
+    overlap [start, end)."""
+    return [Show.end_time.isnot(None),
+            _one(column).op('&&')(_one(entity_id)),
+            func.tsrange(Show.start_time, Show.end_time).op('&&')(
+                func.tsrange(start, end))]
+
+
+def conflicts(venue_id, artist_id, start, end):
+    """Shows the venue or the artist is already booked for during [start, end)."""
+    return Show.query.filter(or_(
+        and_(*booked(Show.venue_id, venue_id, start, end)),
+        and_(*booked(Show.artist_id, artist_id, start, end)),
+    )).order_by(Show.start_time).execution_options(include_hidden=True).all()
+
+
+def bookings(venue_ids, artist_ids, start, end):
+    """(venue_id, artist_id, start_time, end_time) of the shows of any of
+    the venues or artists that overlap [start, end), in one query."""
+    return db.session.query(Show.venue_id, Show.artist_id, Show.start_time, Show.end_time) \
+        .filter(or_(Show.venue_id.in_(venue_ids), Show.artist_id.in_(artist_ids)),
+                Show.end_time.isnot(None),
+                Show.start_time < end, Show.end_time > start) \
+        .execution_options(include_hidden=True).all()
+
+
+def is_conflict(error):
+    """Whether an IntegrityError is a booking constraint violation."""
+    return getattr(error.orig, 'pgcode', None) == '23P01'
+
+
+def _naive(value):
+    # Show times are stored without a time zone, in the app's local time;
+    # a time with an offset has no meaning next to them.
+    when = datetime.fromisoformat(value)
+    if when.tzinfo is not None:
+        raise ValueError('%s has a UTC offset' % value)
+    return when
+
+
+class Window:
+    """The period availability is asked for, from query arguments."""
+
+    def __init__(self, start, end, min_length=timedelta(0)):
+        self.start = start
+        self.end = end
+        self.min_length = min_length
+
+    @classmethod
+    def from_args(cls, args):
+        """?from=&to=[&min=minutes], ISO 8601 dates or times without a UTC
+        offset, `to` a week after `from` by default; raises ValueError if
+        invalid."""
+        try:
+            start = _naive(args['from'])
+        except KeyError as e:
+            raise ValueError(e)
+        end = _naive(args['to']) if 'to' in args else start + timedelta(days=7)
+        min_length = timedelta(minutes=int(args.get('min', 0)))
+        if not (start < end <= start + MAX_WINDOW and min_length >= timedelta(0)):
+            raise ValueError(args)
+        return cls(start, end, min_length)
+
+
+def open_slots(column, entity_id, window):
+    """(open [start, end) slots of at least window.min_length, shows booked)
+    for one venue or artist within `window`."""
+    shows = db.session.query(Show.start_time, Show.end_time).filter(
+        *booked(column, entity_id, window.start, window.end)).order_by(Show.start_time)
+    slots, free_from, count = [], window.start, 0
+    for start_time, end_time in shows:
+        count += 1
+        if start_time > free_from and start_time - free_from >= window.min_length:
+            slots.append((free_from, start_time))
+        free_from = max(free_from, end_time)
+    if window.end > free_from and window.end - free_from >= window.min_length:
+        slots.append((free_from, window.end))
+    return slots, count
@@ -0,0 +1,75 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+import re
+
+from sqlalchemy import event, func
+
+from models import db, Artist, Venue
+
+
+#----------------------------------------------------------------------------#
+# Full-text search.
+#----------------------------------------------------------------------------#
+
+# Names are matched as written, so use the 'simple' configuration: no
+# stemming and no stop words ("The Musical Hop" must match "the").
+TS_CONFIG = 'simple'
+DEFAULT_LIMIT = 50
+
+_token_re = re.compile(r'\w+', re.UNICODE)
+
+
+def search_document(target):
+    """The text indexed for a venue or artist: name, city, state and genres."""
+    parts = [target.name, target.city, target.state]
+    parts.extend(target.genres or [])
+    return ' '.join(part for part in parts if part)
+
+
+def to_tsquery(term):
+    """Build a prefix tsquery string ("blu:* & not:*") from free text.
+
+    Only word characters survive, so user input can never produce tsquery
+    syntax errors. Returns None when the term has no searchable words.
+    """
+    tokens = _token_re.findall(term.lower())
+    if not tokens:
+        return None
+    return ' & '.join(token + ':*' for token in tokens)
+
+
+def matches(model, term):
+    """Filter expressions selecting all the rows search() would rank."""
+    tsquery = to_tsquery(term)
+    if tsquery is None:
+        return []
+    tsquery = func.to_tsquery(TS_CONFIG, tsquery)
+    return [model.search_vector.op('@@')(tsquery)]
+
+
+def search(model, term, limit=DEFAULT_LIMIT):
+    """Return up to `limit` rows of `model` matching `term`, best match first.
+
+    Every word of the term must prefix-match a word in the document.
+    Results are ordered by ts_rank, then by name. An empty term lists rows
+    by name.
+    """
+    query = model.query
+    tsquery = to_tsquery(term)
+    if tsquery is None:
+        return query.order_by(model.name, model.id).limit(limit).all()
+    tsquery = func.to_tsquery(TS_CONFIG, tsquery)
+    rank = func.ts_rank(model.search_vector, tsquery)
+    return query.filter(model.search_vector.op('@@')(tsquery)) \
+        .order_by(rank.desc(), model.name, model.id) \
+        .limit(limit).all()
+
+
+def _refresh_search_vector(mapper, connection, target):
+    target.search_vector = func.to_tsvector(TS_CONFIG, search_document(target))
+
+
+for _model in (Venue, Artist):
+    event.listen(_model, 'before_insert', _refresh_search_vector)
+    event.listen(_model, 'before_update', _refresh_search_vector)
@@ -0,0 +1,213 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+import collections
+import itertools
+from datetime import timedelta
+from types import SimpleNamespace
+
+from sqlalchemy.dialects import postgresql
+
+import clock
+import facets
+import feed
+import geo
+import search
+import suggest
+from models import db, Show, Artist, Venue, CityCentroid
+
+
+#----------------------------------------------------------------------------#
+# Synthetic data.
+#----------------------------------------------------------------------------#
+
+# Venues and artists are spread over these cities by rough population.
+# Shows are spread over venues and artists by a Zipf law: the venue (or
+# artist) of rank r gets a share proportional to 1 / r ** skew, so a few
+# host most of the shows and most host a handful, as in production.
+CITIES = [
+    ('New York', 'NY', 40.6635, -73.9387, 84),
+    ('Los Angeles', 'CA', 34.0194, -118.4108, 39),
+    ('Chicago', 'IL', 41.8376, -87.6818, 27),
+    ('Houston', 'TX', 29.7866, -95.3909, 23),
+    ('Phoenix', 'AZ', 33.5722, -112.0901, 16),
+    ('Philadelphia', 'PA', 40.0094, -75.1333, 16),
+    ('San Antonio', 'TX', 29.4724, -98.5251, 15),
+    ('San Diego', 'CA', 32.8153, -117.135, 14),
+    ('Dallas', 'TX', 32.7933, -96.7665, 13),
+    ('Austin', 'TX', 30.3039, -97.7544, 10),
+    ('San Francisco', 'CA', 37.7272, -123.0322, 9),
+    ('Seattle', 'WA', 47.6205, -122.3509, 7),
+    ('Denver', 'CO', 39.7619, -104.8811, 7),
+    ('Nashville', 'TN', 36.1718, -86.785, 7),
+    ('Boston', 'MA', 42.332, -71.0202, 7),
+    ('Portland', 'OR', 45.5371, -122.65, 6),
+    ('Las Vegas', 'NV', 36.2277, -115.264, 6),
+    ('Detroit', 'MI', 42.383, -83.1022, 6),
+    ('Atlanta', 'GA', 33.7629, -84.4227, 5),
+    ('Miami', 'FL', 25.7752, -80.2086, 4),
+    ('New Orleans', 'LA', 30.0534, -89.9345, 4),
+    ('Minneapolis', 'MN', 44.9633, -93.2683, 4),
+]
+VENUE_WORDS = ['Blue', 'Velvet', 'Echo', 'Royal', 'Crystal', 'Golden', 'Silver',
+               'Harbor', 'Union', 'Electric', 'Copper', 'Midnight', 'Paradise',
+               'Lantern', 'Orchid', 'Granite', 'Riverside', 'Starlight']
+VENUE_KINDS = ['Hall', 'Lounge', 'Room', 'Ballroom', 'Cellar', 'Theatre', 'Club',
+               'Tavern', 'Garden', 'Pavilion', 'Social', 'Music Hall']
+ARTIST_WORDS = ['Wild', 'Quiet', 'Neon', 'Broken', 'Northern', 'Paper', 'Hollow',
+                'Lucky', 'Iron', 'Young', 'Velvet', 'Static', 'Golden', 'Low']
+ARTIST_NOUNS = ['Foxes', 'Rivers', 'Hearts', 'Lights', 'Wolves', 'Saints', 'Tides',
+                'Ghosts', 'Horses', 'Kings', 'Machines', 'Sparrows', 'Engines']
+STREETS = ['Main St', 'Market St', 'Broadway', 'Church St', 'Mission St', 'Elm St',
+           'Washington Ave', 'Lake St', 'Park Ave', 'Grand Ave']
+
+# Shows start in one of these slots each day and last SHOW_LENGTH, so a
+# venue or artist can play every slot without a double booking.
+SLOTS = [timedelta(hours=12), timedelta(hours=15, minutes=30),
+         timedelta(hours=19), timedelta(hours=22, minutes=30)]
+SHOW_LENGTH = timedelta(hours=3)
+BATCH_SIZE = 10000
+# Draws of a weighted artist for a slot before settling for any free one.
+ARTIST_TRIES = 5
+
+
+def _zipf_weights(count, skew, rng):
+    """Weights of `count` items by rank, ranks shuffled."""
+    ranks = list(range(1, count + 1))
+    rng.shuffle(ranks)
+    return [1 / rank ** skew for rank in ranks]
+
+
+def _phone(rng):
+    return '%03d-%03d-%04d' % (rng.randint(201, 989), rng.randint(200, 999),
+                               rng.randint(0, 9999))
+
+
+def _entity(rng, n, name, city, kind):
+    slug = name.lower().replace(' ', '')
+    return {
+        'name': name,
+        'genres': rng.sample(facets.GENRES, rng.choice((1, 1, 2, 2, 3))),
+        'city': city[0], 'state': city[1], 'phone': _phone(rng),
+        'website': 'https://www.%s%d.com' % (slug, n),
+        'facebook_link': 'https://www.facebook.com/%s%d' % (slug, n),
+        'seeking_description': '',
+        'image_link': 'https://picsum.photos/seed/%s-%d/300/300' % (kind, n),
+    }
+
+
+def venue_rows(rng, count):
+    weights = list(itertools.accumulate(city[4] for city in CITIES))
+    for n in range(count):
+        city = rng.choices(CITIES, cum_weights=weights)[0]
+        row = _entity(rng, n, '%s %s' % (rng.choice(VENUE_WORDS), rng.choice(VENUE_KINDS)),
+                      city, 'venue')
+        row.update(address='%d %s' % (rng.randint(1, 4999), rng.choice(STREETS)),
+                   seeking_talent=rng.random() < 0.3,
+                   latitude=city[2], longitude=city[3], geohash=geo.encode(city[2], city[3]))
+        yield row
+
+
+def artist_rows(rng, count):
+    weights = list(itertools.accumulate(city[4] for city in CITIES))
+    for n in range(count):
+        city = rng.choices(CITIES, cum_weights=weights)[0]
+        name = 'The %s %s' % (rng.choice(ARTIST_WORDS), rng.choice(ARTIST_NOUNS))
+        row = _entity(rng, n, name, city, 'artist')
+        row.update(seeking_venue=rng.random() < 0.3)
+        yield row
+
+
+def _shows_per_venue(rng, venue_ids, count, capacity, skew):
+    """{venue id: shows}, at most `capacity` each. The surplus of full
+    venues goes to the others, by weight again."""
+    weights = dict(zip(venue_ids, _zipf_weights(len(venue_ids), skew, rng)))
+    per_venue = collections.Counter()
+    while count:
+        open_ids = [venue_id for venue_id in venue_ids if per_venue[venue_id] < capacity]
+        if not open_ids:
+            break
+        per_venue.update(rng.choices(
+            open_ids, [weights[venue_id] for venue_id in open_ids], k=count))
+        count = 0
+        for venue_id, shows in per_venue.items():
+            if shows > capacity:
+                count += shows - capacity
+                per_venue[venue_id] = capacity
+    return per_venue
+
+
+def show_rows(rng, venue_ids, artist_ids, count, days, skew):
+    """Rows of about `count` shows over `days` days centred on today.
+
+    No venue gets more shows than it has slots, and a show is dropped in
+    the rare case no artist is free for its slot.
+    """
+    first_day = clock.now().replace(hour=0, minute=0, second=0, microsecond=0) \
+        - timedelta(days=days // 2)
+    capacity = days * len(SLOTS)
+    per_venue = _shows_per_venue(rng, venue_ids, count, capacity, skew)
+    artist_weights = list(itertools.accumulate(_zipf_weights(len(artist_ids), skew, rng)))
+    # artist id * capacity + slot, for every slot an artist plays.
+    booked = set()
+    for venue_id, shows in per_venue.items():
+        slots = rng.sample(range(capacity), min(shows, capacity))
+        drawn = rng.choices(artist_ids, cum_weights=artist_weights, k=len(slots) * ARTIST_TRIES)
+        for i, slot in enumerate(slots):
+            candidates = drawn[i * ARTIST_TRIES:(i + 1) * ARTIST_TRIES] + [rng.choice(artist_ids)]
+            artist_id = next((artist_id for artist_id in candidates
+                              if artist_id * capacity + slot not in booked), None)
+            if artist_id is None:
+                continue
+            booked.add(artist_id * capacity + slot)
+            start_time = first_day + timedelta(days=slot // len(SLOTS)) + SLOTS[slot % len(SLOTS)]
+            yield {'venue_id': venue_id, 'artist_id': artist_id,
+                   'start_time': start_time, 'end_time': start_time + SHOW_LENGTH}
+
+
+def _insert(session, statement, rows):
+    inserted = 0
+    while True:
+        batch = list(itertools.islice(rows, BATCH_SIZE))
+        if not batch:
+            return inserted
+        session.execute(statement, batch)
+        inserted += len(batch)
+
+
+def _entities(session, model, rows):
+    """Insert venue or artist rows the way the bulk importer does; returns
+    the new ids."""
+    table = model.__table__
+    last = session.query(db.func.max(model.id)).execution_options(include_hidden=True).scalar()
+    statement = table.insert().values(search_vector=db.func.to_tsvector(
+        search.TS_CONFIG, db.bindparam('search_document')))
+    rows = (dict(row, search_document=search.search_document(SimpleNamespace(**row)))
+            for row in rows)
+    _insert(session, statement, rows)
+    return [entity_id for entity_id, in session.query(model.id).filter(
+        model.id > (last or 0)).order_by(model.id).execution_options(include_hidden=True)]
+
+
+def seed(session, rng, venues, artists, shows, days, skew):
+    """Add synthetic venues, artists and shows in one transaction.
+
+    Returns (venues, artists, shows) inserted.
+    """
+    centroids = postgresql.insert(CityCentroid.__table__).values([
+        {'state': state, 'city_key': geo.city_key(city), 'name': city,
+         'latitude': latitude, 'longitude': longitude,
+         'geohash': geo.encode(latitude, longitude)}
+        for city, state, latitude, longitude, _ in CITIES])
+    session.execute(centroids.on_conflict_do_nothing())
+    venue_ids = _entities(session, Venue, venue_rows(rng, venues))
+    artist_ids = _entities(session, Artist, artist_rows(rng, artists))
+    # The counter triggers count each insert statement in one go; see
+    # counters.py.
+    inserted = _insert(session, Show.__table__.insert(),
+                       show_rows(rng, venue_ids, artist_ids, shows, days, skew))
+    feed.rebuild(session)
+    session.commit()
+    for index in (suggest.venues, suggest.artists):
+        index.built_at = None
+    return len(venue_ids), len(artist_ids), inserted
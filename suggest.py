@@ -0,0 +1,109 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+import bisect
+import threading
+import time
+
+from models import db, Artist, Venue
+
+
+#----------------------------------------------------------------------------#
+# Typeahead index.
+#----------------------------------------------------------------------------#
+
+class PrefixIndex:
+    """Sorted array of (folded word suffix, id) pairs answering prefix lookups.
+
+    Every word start in a name gets its own entry, so "hop" finds
+    "The Musical Hop". A lookup is one bisect plus a scan over the matches.
+    """
+
+    def __init__(self):
+        self._entries = []
+        self._names = {}
+        self._lock = threading.Lock()
+        self.built_at = None
+
+    @staticmethod
+    def _keys(name):
+        folded = name.casefold()
+        starts = [0] + [i + 1 for i, char in enumerate(folded[:-1])
+                        if char.isspace() and not folded[i + 1].isspace()]
+        return [folded[start:] for start in starts]
+
+    def _insert(self, entity_id, name):
+        self._names[entity_id] = name
+        for key in self._keys(name):
+            bisect.insort(self._entries, (key, entity_id))
+
+    def _delete(self, entity_id):
+        name = self._names.pop(entity_id, None)
+        if name is None:
+            return
+        for key in self._keys(name):
+            i = bisect.bisect_left(self._entries, (key, entity_id))
+            if i < len(self._entries) and self._entries[i] == (key, entity_id):
+                del self._entries[i]
+
+    def load(self, rows):
+        """Replace the contents with (id, name) rows."""
+        names = {entity_id: name for entity_id, name in rows if name}
+        entries = sorted((key, entity_id) for entity_id, name in names.items()
+                         for key in self._keys(name))
+        with self._lock:
+            self._names = names
+            self._entries = entries
+            self.built_at = time.monotonic()
+
+    def add(self, entity_id, name):
+        """Insert or rename an entity."""
+        with self._lock:
+            self._delete(entity_id)
+            if name:
+                self._insert(entity_id, name)
+
+    def remove(self, entity_id):
+        with self._lock:
+            self._delete(entity_id)
+
+    def suggest(self, prefix, limit=10):
+        prefix = prefix.strip().casefold()
+        if not prefix:
+            return []
+        results = []
+        seen = set()
+        with self._lock:
+            i = bisect.bisect_left(self._entries, (prefix,))
+            while i < len(self._entries) and len(results) < limit:
+                key, entity_id = self._entries[i]
+                if not key.startswith(prefix):
+                    break
+                if entity_id not in seen:
+                    seen.add(entity_id)
+                    results.append({"id": entity_id, "name": self._names[entity_id]})
+                i += 1
+        return results
+
+
+artists = PrefixIndex()
+venues = PrefixIndex()
+
+_build_lock = threading.Lock()
+
+
+def ensure_built(max_age):
+    """Build the indexes on first use and rebuild them once `max_age` seconds old.
+
+    Handlers keep the index of the worker that served a write current; the
+    periodic rebuild picks up writes made through other workers.
+    """
+    now = time.monotonic()
+    if all(index.built_at is not None and now - index.built_at < max_age
+           for index in (artists, venues)):
+        return
+    with _build_lock:
+        if artists.built_at is None or now - artists.built_at >= max_age:
+            artists.load(db.session.query(Artist.id, Artist.name).yield_per(5000))
+        if venues.built_at is None or now - venues.built_at >= max_age:
+            venues.load(db.session.query(Venue.id, Venue.name).yield_per(5000))
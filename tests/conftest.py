@@ -0,0 +1,205 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+import datetime
+import os
+
+import pytest
+from sqlalchemy import create_engine, event, orm, text
+from sqlalchemy.engine import make_url
+
+
+#----------------------------------------------------------------------------#
+# Test setup.
+#----------------------------------------------------------------------------#
+
+# The suite runs against the PostgreSQL database named by TEST_DATABASE_URI
+# (or DATABASE_URI), which it empties. The tests that route reads to a
+# replica use TEST_DATABASE_REPLICA_URIS, by default a database next to it
+# named <database>_replica, created when missing. Without a database URI
+# the tests needing one are skipped.
+
+os.environ['APP_SETTINGS'] = 'config.TestingConfig'
+# Only the replica tests read from the replica; the rest of the suite reads
+# its own writes from the primary.
+REPLICA_URI = os.environ.pop('TEST_DATABASE_REPLICA_URIS', '').split(',')[0].strip()
+DATABASE_URI = os.environ.get('TEST_DATABASE_URI') or os.environ.get('DATABASE_URI')
+
+
+class FakeClock:
+    """A clock that only moves when told to."""
+
+    def __init__(self, now):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, **delta):
+        self.now += datetime.timedelta(**delta)
+
+
+@pytest.fixture(scope='session')
+def app():
+    if not DATABASE_URI:
+        pytest.skip('TEST_DATABASE_URI is not set')
+    from app import app
+    from models import db
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+    yield app
+    with app.app_context():
+        db.session.remove()
+        db.engine.dispose()
+
+
+@pytest.fixture
+def database(app):
+    """The app's database, emptied after the test."""
+    from models import db
+    yield db
+    with app.app_context():
+        db.session.remove()
+        tables = ', '.join(table.name for table in db.metadata.sorted_tables
+                           if table.name != 'show_count_watermark')
+        db.session.execute(db.text('TRUNCATE %s RESTART IDENTITY CASCADE' % tables))
+        db.session.execute(db.text(
+            'UPDATE show_count_watermark SET classified_until = LOCALTIMESTAMP'))
+        db.session.commit()
+        db.session.remove()
+
+
+@pytest.fixture
+def client(app, database):
+    return app.test_client()
+
+
+@pytest.fixture
+def statements(app):
+    """The SQL statements the primary runs from here on."""
+    from models import db
+    with app.app_context():
+        engine = db.engine
+    run = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        run.append(statement)
+
+    event.listen(engine, 'before_cursor_execute', record)
+    yield run
+    event.remove(engine, 'before_cursor_execute', record)
+
+
+@pytest.fixture
+def clock():
+    """Drive clock.now() by hand, starting on 2030-01-01 at noon."""
+    import clock as clock_module
+    fake = FakeClock(datetime.datetime(2030, 1, 1, 12, 0))
+    clock_module.set_clock(fake)
+    yield fake
+    clock_module.set_clock(None)
+
+
+@pytest.fixture
+def page_cache(app):
+    """The page cache, kept in memory for the test instead of disabled."""
+    from app import page_cache
+    from cache import MemoryBackend
+    backend = page_cache.backend
+    page_cache.backend = MemoryBackend()
+    yield page_cache
+    page_cache.backend = backend
+
+
+@pytest.fixture
+def internal_token(app):
+    """Headers that open the /internal/* endpoints and /metrics."""
+    app.config['INTERNAL_API_TOKEN'] = 'secret'
+    yield {'Authorization': 'Bearer secret'}
+    app.config['INTERNAL_API_TOKEN'] = None
+
+
+@pytest.fixture(scope='session')
+def replica_uri(app):
+    url = make_url(REPLICA_URI or DATABASE_URI)
+    if not REPLICA_URI:
+        url = url.set(database=url.database + '_replica')
+        admin = create_engine(make_url(DATABASE_URI), isolation_level='AUTOCOMMIT')
+        with admin.connect() as conn:
+            exists = conn.execute(text('SELECT 1 FROM pg_database WHERE datname = :name'),
+                                  {'name': url.database}).scalar()
+            if not exists:
+                conn.exec_driver_sql('CREATE DATABASE "%s"' % url.database)
+        admin.dispose()
+    return url
+
+
+@pytest.fixture
+def replica(app, database, replica_uri):
+    """An engine on the replica database, which GET requests read from for
+    the test. Nothing copies writes to it; tests add its rows themselves."""
+    from models import db
+    from routing import ReplicaSet
+    engine = create_engine(replica_uri, **app.config['SQLALCHEMY_ENGINE_OPTIONS'])
+    db.metadata.drop_all(bind=engine)
+    db.metadata.create_all(bind=engine)
+    replicas = app.extensions['replicas']
+    app.extensions['replicas'] = ReplicaSet([engine], check_interval=3600)
+    yield engine
+    app.extensions['replicas'] = replicas
+    engine.dispose()
+
+
+@pytest.fixture
+def make(app, database):
+    """Add venues, artists and shows with made-up defaults."""
+    return Factory(app, database)
+
+
+@pytest.fixture
+def make_on_replica(app, database, replica):
+    """Like make, but adds the rows to the replica only."""
+    return Factory(app, database, bind=replica)
+
+
+class Factory:
+    def __init__(self, app, db, bind=None):
+        self.app = app
+        self.db = db
+        self.bind = bind
+
+    def _add(self, obj):
+        with self.app.app_context():
+            session = self.db.session if self.bind is None else orm.Session(self.bind)
+            session.add(obj)
+            session.commit()
+            obj_id = obj.id
+            session.close()
+            self.db.session.remove()
+        return obj_id
+
+    def _entity(self, kind, fields):
+        values = dict(genres=['Jazz'], city='San Francisco', state='CA',
+                      website='', facebook_link='', seeking_description='',
+                      image_link='https://example.com/%s.png' % kind)
+        values.update(fields)
+        return values
+
+    def venue(self, **fields):
+        from models import Venue
+        values = dict(name='The Venue', address='1 Main St', phone='415-555-0100',
+                      seeking_talent=False)
+        values.update(fields)
+        return self._add(Venue(**self._entity('venue', values)))
+
+    def artist(self, **fields):
+        from models import Artist
+        values = dict(name='The Artist', phone='415-555-0101', seeking_venue=False)
+        values.update(fields)
+        return self._add(Artist(**self._entity('artist', values)))
+
+    def show(self, venue_id, artist_id, start_time, end_time=None):
+        from models import Show
+        return self._add(Show(venue_id=venue_id, artist_id=artist_id,
+                              start_time=start_time, end_time=end_time))
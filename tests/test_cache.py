@@ -0,0 +1,145 @@
+import datetime
+
+import pytest
+from flask import Flask, flash
+
+
+def test_sqlite_tag_lookups_only_write_new_tags(tmp_path):
+    from cache import SQLiteBackend
+    backend = SQLiteBackend(str(tmp_path / 'cache.sqlite3'))
+    run = []
+    backend._connect().set_trace_callback(run.append)
+
+    versions = backend.versions(['venue:1', 'venues'])
+    assert any(statement.startswith('INSERT') for statement in run)
+    del run[:]
+    assert backend.versions(['venue:1', 'venues']) == versions
+    assert not any(statement.startswith(('INSERT', 'BEGIN')) for statement in run)
+
+    backend.bump(['venues'])
+    current = backend.versions(['venue:1', 'venues', 'artists'])
+    assert current['venue:1'] == versions['venue:1']
+    assert current['venues'] > versions['venues']
+    assert set(current) == {'venue:1', 'venues', 'artists'}
+
+
+@pytest.fixture
+def cached_app():
+    """A bare app with one cached page per kind of tagging, and a count of
+    the times each view ran."""
+    from cache import MemoryBackend, PageCache
+    app = Flask(__name__)
+    app.secret_key = 'secret'
+    page_cache = PageCache()
+    page_cache.backend = MemoryBackend()
+    app.page_cache = page_cache
+    app.calls = calls = {}
+
+    def called(name):
+        calls[name] = calls.get(name, 0) + 1
+        return '%s %d' % (name, calls[name])
+
+    @app.route('/venues')
+    @page_cache.cached(lambda: ['venues'])
+    def venues():
+        return called('venues')
+
+    @app.route('/venues/<int:venue_id>')
+    @page_cache.cached(lambda venue_id: ['venue:%d' % venue_id])
+    def venue(venue_id):
+        page_cache.tag('artist:1')
+        return called('venue')
+
+    @app.route('/shows')
+    @page_cache.cached(lambda: ['shows'])
+    def shows():
+        import clock
+        page_cache.expire_at(clock.now() + datetime.timedelta(hours=1))
+        return called('shows')
+
+    @app.route('/flash')
+    @page_cache.cached(lambda: ['venues'])
+    def with_flash():
+        flash('Hello')
+        return called('flash')
+
+    return app
+
+
+def test_pages_are_cached_until_a_tag_is_invalidated(cached_app):
+    client = cached_app.test_client()
+    assert client.get('/venues').get_data(as_text=True) == 'venues 1'
+    assert client.get('/venues').get_data(as_text=True) == 'venues 1'
+    cached_app.page_cache.invalidate('artists')
+    assert client.get('/venues').get_data(as_text=True) == 'venues 1'
+    cached_app.page_cache.invalidate('venues')
+    assert client.get('/venues').get_data(as_text=True) == 'venues 2'
+    assert client.get('/venues?page=2').get_data(as_text=True) == 'venues 3'
+
+
+def test_tags_added_while_rendering_invalidate_the_page(cached_app):
+    client = cached_app.test_client()
+    assert client.get('/venues/1').get_data(as_text=True) == 'venue 1'
+    assert client.get('/venues/1').get_data(as_text=True) == 'venue 1'
+    cached_app.page_cache.invalidate('artist:1')
+    assert client.get('/venues/1').get_data(as_text=True) == 'venue 2'
+
+
+def test_pages_expire_when_the_clock_reaches_expire_at(cached_app, clock):
+    client = cached_app.test_client()
+    assert client.get('/shows').get_data(as_text=True) == 'shows 1'
+    clock.advance(minutes=59)
+    assert client.get('/shows').get_data(as_text=True) == 'shows 1'
+    clock.advance(minutes=1)
+    assert client.get('/shows').get_data(as_text=True) == 'shows 2'
+
+
+def test_etag_round_trip(cached_app):
+    client = cached_app.test_client()
+    first = client.get('/venues')
+    assert first.headers['ETag'] and 'no-cache' in first.headers['Cache-Control']
+    again = client.get('/venues', headers={'If-None-Match': first.headers['ETag']})
+    assert again.status_code == 304 and again.get_data() == b''
+    cached_app.page_cache.invalidate('venues')
+    changed = client.get('/venues', headers={'If-None-Match': first.headers['ETag']})
+    assert changed.status_code == 200 and changed.headers['ETag'] != first.headers['ETag']
+    assert cached_app.calls['venues'] == 2
+
+
+def test_pages_with_flashed_messages_are_not_cached(cached_app):
+    client = cached_app.test_client()
+    assert client.get('/flash').get_data(as_text=True) == 'flash 1'
+    assert client.get('/flash').get_data(as_text=True) == 'flash 2'
+    with client.session_transaction() as session:
+        session['_flashes'] = [('message', 'Saved')]
+    assert client.get('/venues').get_data(as_text=True) == 'venues 1'
+    with client.session_transaction() as session:
+        session.pop('_flashes')
+    assert client.get('/venues').get_data(as_text=True) == 'venues 2'
+    assert client.get('/venues').get_data(as_text=True) == 'venues 2'
+
+
+def test_fragments_are_computed_once_per_tag_version(cached_app):
+    page_cache, computed = cached_app.page_cache, []
+
+    def compute():
+        computed.append(1)
+        return len(computed)
+
+    with cached_app.test_request_context():
+        assert page_cache.fragment('facets', ['venues'], compute) == 1
+        assert page_cache.fragment('facets', ['venues'], compute) == 1
+        page_cache.invalidate('venues')
+        assert page_cache.fragment('facets', ['venues'], compute) == 2
+
+
+def test_memory_backend_evicts_the_least_recently_used_and_expired():
+    from cache import MemoryBackend
+    backend = MemoryBackend(max_entries=2)
+    backend.set('a', 1, 60)
+    backend.set('b', 2, 60)
+    assert backend.get('a') == 1
+    backend.set('c', 3, 60)
+    assert (backend.get('a'), backend.get('b'), backend.get('c')) == (1, None, 3)
+    backend.set('a', 1, 0)
+    assert backend.get('a') is None
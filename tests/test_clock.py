@@ -0,0 +1,58 @@
+import datetime
+
+import pytest
+
+
+@pytest.fixture
+def venue_with_show(make, clock):
+    venue_id = make.venue(name='The Venue')
+    artist_id = make.artist()
+    make.show(venue_id, artist_id, clock.now + datetime.timedelta(hours=2))
+    return venue_id
+
+
+def rename_behind_the_cache(app, venue_id, name):
+    """Change a venue without invalidating its pages."""
+    from models import db
+    with app.app_context():
+        db.session.execute(db.text('UPDATE venues SET name = :name WHERE id = :id'),
+                           {'name': name, 'id': venue_id})
+        db.session.commit()
+        db.session.remove()
+
+
+def test_venue_page_is_cached_until_the_next_show_starts(
+        app, client, clock, page_cache, venue_with_show):
+    page = client.get('/venues/%d' % venue_with_show).get_data(as_text=True)
+    assert '1 Upcoming Show<' in page and '0 Past Shows' in page
+
+    rename_behind_the_cache(app, venue_with_show, 'Renamed Venue')
+    clock.advance(hours=1, minutes=59)
+    page = client.get('/venues/%d' % venue_with_show).get_data(as_text=True)
+    assert 'The Venue' in page and '1 Upcoming Show<' in page
+
+    clock.advance(minutes=1, seconds=1)
+    page = client.get('/venues/%d' % venue_with_show).get_data(as_text=True)
+    assert 'Renamed Venue' in page
+    assert '0 Upcoming Shows' in page and '1 Past Show<' in page
+
+
+def test_a_show_starting_now_is_upcoming(client, clock, venue_with_show):
+    clock.advance(hours=2)
+    page = client.get('/venues/%d' % venue_with_show).get_data(as_text=True)
+    assert '1 Upcoming Show<' in page and '0 Past Shows' in page
+
+
+def test_venue_list_is_cached_until_the_next_show_starts(
+        app, client, clock, page_cache, venue_with_show):
+    page = client.get('/venues').get_data(as_text=True)
+    assert '1 upcoming show<' in page
+
+    rename_behind_the_cache(app, venue_with_show, 'Renamed Venue')
+    clock.advance(hours=1)
+    page = client.get('/venues').get_data(as_text=True)
+    assert 'The Venue' in page and '1 upcoming show<' in page
+
+    clock.advance(hours=1, seconds=1)
+    page = client.get('/venues').get_data(as_text=True)
+    assert 'Renamed Venue' in page and '0 upcoming shows' in page
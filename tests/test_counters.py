@@ -0,0 +1,85 @@
+import datetime
+import io
+import re
+
+import pytest
+
+START = datetime.datetime(2030, 1, 1, 20, 0)
+
+
+def drift(app):
+    import counters
+    from models import db
+    with app.app_context():
+        found = counters.reconcile(db.session, fix=False)
+        db.session.rollback()
+        db.session.remove()
+    return found
+
+
+def counts(app, model, entity_id):
+    with app.app_context():
+        entity = model.query.get(entity_id)
+        return entity.show_count, entity.past_show_count, entity.upcoming_show_count
+
+
+@pytest.fixture
+def venues(make):
+    return [make.venue(name='Venue %d' % n) for n in range(3)]
+
+
+@pytest.fixture
+def artists(make):
+    return [make.artist(name='Artist %d' % n) for n in range(3)]
+
+
+def test_counters_follow_inserts_updates_and_deletes(app, make, venues, artists):
+    from models import db, Artist, Show, Venue
+    past = datetime.datetime(2001, 1, 1, 20, 0)
+    show_id = make.show(venues[0], artists[0], past)
+    make.show(venues[0], artists[1], START)
+    assert counts(app, Venue, venues[0]) == (2, 1, 1)
+
+    with app.app_context():
+        db.session.query(Show).filter(Show.id == show_id).update(
+            {'venue_id': venues[1], 'start_time': START + datetime.timedelta(days=1),
+             'end_time': START + datetime.timedelta(days=1, hours=3)})
+        db.session.query(Show).update({'end_time': Show.end_time + datetime.timedelta(minutes=5)})
+        db.session.commit()
+        db.session.remove()
+    assert counts(app, Venue, venues[0]) == (1, 0, 1)
+    assert counts(app, Venue, venues[1]) == (1, 0, 1)
+
+    with app.app_context():
+        db.session.delete(Venue.query.get(venues[1]))
+        db.session.commit()
+        db.session.remove()
+    assert counts(app, Artist, artists[0]) == (0, 0, 0)
+    assert drift(app) == {'venues': (0, 0), 'artists': (0, 0)}
+
+
+def test_counters_follow_bulk_imports(app, venues, artists):
+    from importer import import_records
+    records = [{'venue_id': venues[n % 3], 'artist_id': artists[n // 3 % 3],
+                'start_time': (START + datetime.timedelta(days=n)).isoformat()}
+               for n in range(30)]
+    with app.test_request_context():
+        result = import_records('shows', enumerate(records, 2), io.StringIO(), chunk_size=7)
+    assert result.inserted == 30
+    assert drift(app) == {'venues': (0, 0), 'artists': (0, 0)}
+
+
+def test_venue_page_lists_the_first_upcoming_shows(app, client, make, venues, artists):
+    for n in range(3):
+        make.show(venues[0], artists[n], START + datetime.timedelta(days=n))
+    app.config['DETAIL_UPCOMING_SHOWS'] = 2
+    try:
+        page = client.get('/venues/%d' % venues[0]).get_data(as_text=True)
+    finally:
+        app.config['DETAIL_UPCOMING_SHOWS'] = 50
+    assert '3 Upcoming Shows' in page
+    assert 'Artist 1' in page and 'Artist 2' not in page
+
+    later = re.search(r'href="([^"]*)">The 1 later shows', page).group(1)
+    shows = client.get(later.replace('&amp;', '&')).get_json()['data']
+    assert [show['artist_id'] for show in shows] == [artists[2]]
@@ -0,0 +1,64 @@
+import datetime
+
+import pytest
+
+
+@pytest.fixture
+def purge_jobs(app, monkeypatch):
+    """The purges queued by the purger, which deletes inline up to one show;
+    they are collected instead of run."""
+    purger = app.extensions['purger']
+    monkeypatch.setattr(purger, 'inline_limit', 1)
+    monkeypatch.setattr(purger, 'batch_size', 2)
+    monkeypatch.setattr(purger, 'pause', 0)
+    jobs = []
+    monkeypatch.setattr(purger, 'submit', lambda model, entity_id: jobs.append((model, entity_id)))
+    return jobs
+
+
+def venue_with_shows(make, count, **fields):
+    venue_id = make.venue(**fields)
+    start = datetime.datetime(2030, 1, 1, 20, 0)
+    for day in range(count):
+        make.show(venue_id, make.artist(), start + datetime.timedelta(days=day))
+    return venue_id
+
+
+def count_rows(app, sql):
+    from models import db
+    with app.app_context():
+        count = db.session.execute(db.text(sql)).scalar()
+        db.session.remove()
+    return count
+
+
+def test_venues_with_few_shows_are_deleted_at_once(app, client, make, purge_jobs):
+    venue_id = venue_with_shows(make, 1)
+    assert client.post('/venues/%d/delete' % venue_id).status_code == 302
+    assert purge_jobs == []
+    assert count_rows(app, 'SELECT count(*) FROM venues') == 0
+    assert count_rows(app, 'SELECT count(*) FROM shows') == 0
+
+
+def test_venues_with_many_shows_are_hidden_and_purged(app, client, make, purge_jobs):
+    from models import Venue
+    venue_id = venue_with_shows(make, 5, name='Busy Venue')
+    assert client.post('/venues/%d/delete' % venue_id).status_code == 302
+    assert purge_jobs == [(Venue, venue_id)]
+    assert client.get('/venues/%d' % venue_id).status_code == 404
+    assert 'Busy Venue' not in client.get('/venues').get_data(as_text=True)
+    assert client.get('/api/v1/shows').get_json()['data'] == []
+
+    with app.app_context():
+        app.extensions['purger'].run(Venue, venue_id)
+    assert count_rows(app, 'SELECT count(*) FROM venues') == 0
+    assert count_rows(app, 'SELECT count(*) FROM shows') == 0
+
+
+def test_purge_hidden_finishes_interrupted_purges(app, client, make, purge_jobs):
+    venue_id = venue_with_shows(make, 3)
+    client.post('/venues/%d/delete' % venue_id)
+    result = app.test_cli_runner().invoke(args=['purge-hidden'])
+    assert 'Purged 1 hidden venues and artists.' in result.output
+    assert count_rows(app, 'SELECT count(*) FROM venues') == 0
+    assert count_rows(app, 'SELECT count(*) FROM artists') == 3
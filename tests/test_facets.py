@@ -0,0 +1,98 @@
+import re
+
+
+def facet_queries(statements):
+    return [statement for statement in statements if 'GROUPING SETS' in statement]
+
+
+def next_page(response):
+    return re.search(r'href="([^"]*after=[^"]*)"', response.get_data(as_text=True)) \
+        .group(1).replace('&amp;', '&')
+
+
+def test_facet_counts_are_computed_once_per_selection(client, make, page_cache, statements):
+    for city in ('Austin', 'Dallas', 'Houston'):
+        make.venue(name='Venue in %s' % city, city=city, state='TX')
+    first = client.get('/venues?per_page=1')
+    assert len(facet_queries(statements)) == 1
+
+    del statements[:]
+    second = client.get(next_page(first)).get_data(as_text=True)
+    assert 'Venue in Dallas' in second and '<small>3</small>' in second
+    assert facet_queries(statements) == []
+
+    client.get('/venues?per_page=1&genre=Jazz')
+    assert len(facet_queries(statements)) == 1
+
+
+def test_facet_counts_follow_changes(client, make, page_cache, statements):
+    make.venue()
+    client.get('/venues')
+    client.post('/venues/create', data={
+        'name': 'Second Venue', 'genres': ['Jazz'], 'address': '2 Main St',
+        'city': 'San Francisco', 'state': 'CA', 'phone': '415-555-0102',
+        'image_link': 'https://example.com/venue.png'})
+    del statements[:]
+    page = client.get('/venues').get_data(as_text=True)
+    assert len(facet_queries(statements)) == 1
+    assert '<small>2</small>' in page
+
+
+def listed(client, query):
+    response = client.get('/artists?' + query)
+    assert response.status_code == 200
+    page = response.get_data(as_text=True)
+    return [name for name in ('Jazz Artist', 'Blues Artist', 'Jazz Blues Artist')
+            if '>%s<' % name in page]
+
+
+def test_listings_filter_by_genre(client, make):
+    make.artist(name='Jazz Artist', genres=['Jazz'])
+    make.artist(name='Blues Artist', genres=['Blues'], state='TX', city='Austin')
+    make.artist(name='Jazz Blues Artist', genres=['Jazz', 'Blues'])
+    assert listed(client, 'genre=Jazz') == ['Jazz Artist', 'Jazz Blues Artist']
+    assert listed(client, 'genre=Jazz&genre=Blues') == ['Jazz Blues Artist']
+    assert listed(client, 'genre=Jazz&genre=Blues&match=any') == [
+        'Jazz Artist', 'Blues Artist', 'Jazz Blues Artist']
+    assert listed(client, 'genre=Blues&state=CA') == ['Jazz Blues Artist']
+
+
+def test_genre_counts(app, make):
+    import facets
+    from models import Artist
+    make.artist(genres=['Jazz'])
+    make.artist(genres=['Jazz', 'Blues'], state='TX', city='Austin')
+    with app.app_context():
+        counted = facets.counts(Artist, [])
+    assert counted.genres == [('Jazz', 2), ('Blues', 1)]
+    assert counted.states == [('CA', 1), ('TX', 1)]
+    assert counted.cities == [(('CA', 'San Francisco'), 1), (('TX', 'Austin'), 1)]
+
+
+def test_listings_reject_unknown_filters(client):
+    assert client.get('/artists?genre=Polka').status_code == 400
+    assert client.get('/artists?genre=Jazz&match=most').status_code == 400
+    assert client.get('/artists?city=Austin').status_code == 400
+
+
+def test_search_facet_counts_are_computed_once_per_term(client, make, page_cache, statements):
+    make.venue(name='Blue Note')
+    make.venue(name='Red Room')
+    for term in ('blue', ' BLUE ', 'blue'):
+        page = client.post('/venues/search', data={'search_term': term}).get_data(as_text=True)
+        assert 'Blue Note' in page and '<small>1</small>' in page
+    assert len(facet_queries(statements)) == 1
+
+    del statements[:]
+    client.get('/venues')
+    client.post('/venues/search', data={'search_term': ''})
+    assert len(facet_queries(statements)) == 1
+
+    client.post('/venues/create', data={
+        'name': 'Blue Moon', 'genres': ['Jazz'], 'address': '2 Main St',
+        'city': 'San Francisco', 'state': 'CA', 'phone': '415-555-0102',
+        'image_link': 'https://example.com/venue.png'})
+    del statements[:]
+    page = client.post('/venues/search', data={'search_term': 'blue'}).get_data(as_text=True)
+    assert len(facet_queries(statements)) == 1
+    assert '<small>2</small>' in page
@@ -0,0 +1,87 @@
+import datetime
+
+import pytest
+
+
+@pytest.fixture
+def shows(make, clock):
+    """Three upcoming shows: a Jazz artist in San Francisco, then a Rock
+    artist in New York, then the Jazz artist in New York."""
+    jazz = make.artist(name='Jazz Artist', genres=['Jazz'])
+    rock = make.artist(name='Rock Artist', genres=['Rock'])
+    sf = make.venue(name='SF Venue')
+    ny = make.venue(name='NY Venue', city='New York', state='NY')
+    hours = datetime.timedelta(hours=4)
+    return [make.show(sf, jazz, clock.now + hours),
+            make.show(ny, rock, clock.now + 2 * hours),
+            make.show(ny, jazz, clock.now + 3 * hours)]
+
+
+def feed_ids(client, query=''):
+    response = client.get('/api/v1/feed/upcoming' + query)
+    assert response.status_code == 200
+    return [show['id'] for show in response.get_json()['data']]
+
+
+def test_feed_lists_upcoming_shows_by_start_time(client, shows):
+    assert feed_ids(client) == shows
+    data = client.get('/api/v1/feed/upcoming?per_page=1').get_json()
+    assert data['data'][0]['venue']['name'] == 'SF Venue'
+    assert data['data'][0]['artist']['name'] == 'Jazz Artist'
+    assert feed_ids(client, '?per_page=1&after=' + data['next']) == shows[1:2]
+
+
+def test_feed_filters_by_area_or_genre(client, shows):
+    assert feed_ids(client, '?city=New+York&state=NY') == shows[1:]
+    assert feed_ids(client, '?genre=Jazz') == [shows[0], shows[2]]
+    assert client.get('/api/v1/feed/upcoming?city=New+York').status_code == 400
+    assert client.get('/api/v1/feed/upcoming?genre=Jazz&city=New+York&state=NY') \
+        .status_code == 400
+
+
+def test_feed_follows_renamed_venues(app, client, shows):
+    from models import db, Venue
+    with app.app_context():
+        Venue.query.filter_by(name='SF Venue').one().name = 'Renamed Venue'
+        db.session.commit()
+        db.session.remove()
+    data = client.get('/api/v1/feed/upcoming').get_json()['data']
+    assert data[0]['venue']['name'] == 'Renamed Venue'
+
+
+def test_started_shows_leave_the_feed(app, client, clock, shows):
+    from models import db
+    import feed
+    clock.advance(hours=4, seconds=1)
+    assert feed_ids(client) == shows[1:]
+    with app.app_context():
+        assert feed.sweep(db.session) == 1
+        db.session.commit()
+        db.session.remove()
+    assert feed_ids(client) == shows[1:]
+
+
+def test_imports_build_the_feed_rows_of_new_shows_only(app, client, make, clock, shows):
+    import io
+    from importer import import_records
+    from models import db
+
+    def row_versions():
+        with app.app_context():
+            versions = dict(db.session.execute(db.text(
+                'SELECT show_id, xmin::text FROM upcoming_shows')).fetchall())
+            db.session.remove()
+        return versions
+
+    before = row_versions()
+    venue_id = client.get('/api/v1/feed/upcoming').get_json()['data'][0]['venue']['id']
+    start = clock.now + datetime.timedelta(days=1)
+    with app.test_request_context():
+        result = import_records('shows', enumerate([
+            {'venue_id': venue_id, 'artist_id': make.artist(name='New Artist'),
+             'start_time': start.isoformat()}], 2), io.StringIO())
+    assert result.inserted == 1
+    after = row_versions()
+    assert len(after) == 4
+    assert {show_id: after[show_id] for show_id in before} == before
+    assert feed_ids(client)[-1] not in shows
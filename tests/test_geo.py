@@ -0,0 +1,55 @@
+import pytest
+
+CENTROIDS = """state,city,latitude,longitude
+CA,San Francisco,37.7749,-122.4194
+CA,Oakland,37.8044,-122.2712
+CA,Los Angeles,34.0522,-118.2437
+"""
+SAN_FRANCISCO = 'lat=37.7749&lng=-122.4194'
+
+
+@pytest.fixture
+def load_centroids(app, database, tmp_path):
+    """Run the load-centroids command on CENTROIDS."""
+    path = tmp_path / 'centroids.csv'
+    path.write_text(CENTROIDS)
+
+    def load():
+        result = app.test_cli_runner().invoke(args=['load-centroids', str(path)])
+        assert 'Loaded 3 city centroids.' in result.output
+    return load
+
+
+def nearby(client, query):
+    response = client.get('/api/v1/venues/near?' + query)
+    assert response.status_code == 200
+    return [(venue['name'], venue['distance']) for venue in response.get_json()['data']]
+
+
+def test_nearby_venues_are_listed_nearest_first(client, make, load_centroids):
+    load_centroids()
+    for city in ('Los Angeles', 'Oakland', 'San Francisco'):
+        make.venue(name=city + ' Venue', city=city)
+    assert nearby(client, SAN_FRANCISCO + '&radius=25') == [
+        ('San Francisco Venue', 0.0), ('Oakland Venue', 8.34)]
+    assert nearby(client, SAN_FRANCISCO + '&radius=25&unit=km') == [
+        ('San Francisco Venue', 0.0), ('Oakland Venue', 13.43)]
+    assert nearby(client, SAN_FRANCISCO + '&limit=1') == [('San Francisco Venue', 0.0)]
+    assert [name for name, _ in nearby(client, 'bbox=-119,33,-118,35')] == ['Los Angeles Venue']
+
+
+def test_geocode_venues_places_existing_venues(app, client, make, load_centroids):
+    make.venue(name='Unplaced Venue', city=' san  francisco ')
+    assert nearby(client, SAN_FRANCISCO) == []
+    load_centroids()
+    result = app.test_cli_runner().invoke(args=['geocode-venues'])
+    assert result.exit_code == 0
+    assert nearby(client, SAN_FRANCISCO) == [('Unplaced Venue', 0.0)]
+
+
+@pytest.mark.parametrize('query', [
+    'lat=37.7749', SAN_FRANCISCO + '&radius=1000', SAN_FRANCISCO + '&unit=ft',
+    'lat=91&lng=0', 'bbox=-125,30,-100,45', 'bbox=-122,38,-123,37',
+])
+def test_nearby_rejects_invalid_areas(client, query):
+    assert client.get('/api/v1/venues/near?' + query).status_code == 400
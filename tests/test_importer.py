@@ -0,0 +1,14 @@
+import io
+
+
+def import_records(app, kind, records):
+    from importer import import_records
+    with app.test_request_context():
+        return import_records(kind, enumerate(records, 2), io.StringIO())
+
+
+def test_show_import_wants_a_start_time(app, make):
+    result = import_records(app, 'shows', [{'venue_id': make.venue(),
+                                             'artist_id': make.artist()}])
+    assert result.inserted == 0
+    assert result.errors == [{'line': 2, 'errors': {'start_time': ['This field is required.']}}]
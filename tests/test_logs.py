@@ -0,0 +1,25 @@
+import logging
+import os
+
+from logs import AsyncHandler, SizedTimedRotatingFileHandler
+
+
+def test_each_process_logs_to_a_file_of_its_own(tmp_path, monkeypatch):
+    target = SizedTimedRotatingFileHandler(str(tmp_path / 'error-{pid}.log'))
+    handler = AsyncHandler([target])
+    logger = logging.getLogger('test_logs')
+    logger.addHandler(handler)
+    try:
+        logger.warning('from the parent')
+        handler.stop()
+        parent = os.getpid()
+        # As seen from a forked worker.
+        monkeypatch.setattr(os, 'getpid', lambda: parent + 1)
+        logger.warning('from the child')
+        handler.stop()
+    finally:
+        logger.removeHandler(handler)
+        target.close()
+    assert sorted(path.name for path in tmp_path.iterdir()) == sorted(
+        ['error-%d.log' % parent, 'error-%d.log' % (parent + 1)])
+    assert (tmp_path / ('error-%d.log' % (parent + 1))).read_text() == 'from the child\n'
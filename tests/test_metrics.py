@@ -0,0 +1,53 @@
+def scrape(client, headers):
+    """The /metrics series and their values."""
+    text = client.get('/metrics', headers=headers).get_data(as_text=True)
+    return dict(line.rsplit(' ', 1) for line in text.splitlines()
+                if line and not line.startswith('#'))
+
+
+def test_metrics_need_the_token(client, internal_token):
+    assert client.get('/metrics').status_code == 401
+    assert client.get('/metrics', headers={'Authorization': 'Bearer wrong'}).status_code == 401
+    assert client.get('/metrics', headers=internal_token).status_code == 200
+
+
+def test_requests_and_queries_are_counted(client, make, internal_token):
+    venue_id = make.venue()
+    series = 'fyyur_http_requests_total{endpoint="show_venue",method="GET",status="200"}'
+    before = float(scrape(client, internal_token).get(series, 0))
+    assert client.get('/venues/%d' % venue_id).status_code == 200
+    assert client.get('/venues/%d' % venue_id).status_code == 200
+
+    values = scrape(client, internal_token)
+    assert float(values[series]) == before + 2
+    assert float(values['fyyur_db_queries_total{endpoint="show_venue"}']) > 0
+    assert 'fyyur_http_request_duration_seconds_bucket{endpoint="show_venue",le="+Inf"}' in values
+    assert any(key.startswith('fyyur_template_render_duration_seconds_count'
+                              '{template="pages/show_venue.html"}') for key in values)
+
+
+def test_worker_totals_are_summed_through_the_metrics_dir(tmp_path):
+    from metrics import Metrics
+    workers = [Metrics(), Metrics()]
+    for metrics in workers:
+        metrics.directory = str(tmp_path)
+        metrics.registry.inc('fyyur_http_requests_total', (('endpoint', 'index'),), 2)
+        metrics.flush()
+    assert 'fyyur_http_requests_total{endpoint="index"} 4.0' in workers[0].render()
+
+
+def test_exited_threads_are_folded_into_the_totals():
+    import threading
+    from metrics import Registry
+    registry = Registry()
+
+    def count():
+        registry.inc('fyyur_http_requests_total', (('endpoint', 'index'),))
+
+    for _ in range(50):
+        thread = threading.Thread(target=count)
+        thread.start()
+        thread.join()
+    count()
+    assert len(registry._shards) == 1
+    assert registry.collect() == {('fyyur_http_requests_total', (('endpoint', 'index'),)): 51}
@@ -0,0 +1,63 @@
+import logging
+
+import pytest
+
+
+@pytest.fixture
+def profiler(app):
+    """The query profiler, sampling every request for the test."""
+    profiler = app.extensions['query_profiler']
+    sample_rate, repeat_threshold = profiler.sample_rate, profiler.repeat_threshold
+    profiler.sample_rate, profiler.repeat_threshold = 1, 2
+    yield profiler
+    profiler.sample_rate, profiler.repeat_threshold = sample_rate, repeat_threshold
+
+
+def profile(app, profiler, times):
+    """The response of a request running one statement `times` times."""
+    from models import db
+    with app.test_request_context():
+        profiler._start()
+        for _ in range(times):
+            db.session.execute(db.text('SELECT 1')).scalar()
+        response = profiler._finish(app.response_class())
+        db.session.remove()
+    return response
+
+
+def test_repeated_statements_are_reported(app, profiler, caplog):
+    with caplog.at_level(logging.WARNING):
+        response = profile(app, profiler, 3)
+    assert any('Possible N+1 query' in record.getMessage() and 'SELECT 1' in record.getMessage()
+               for record in caplog.records)
+    timings = response.headers.getlist('Server-Timing')
+    assert 'desc="3 queries"' in timings[0]
+    assert timings[1].startswith('app;dur=')
+
+
+def test_statements_under_the_threshold_are_not_reported(app, profiler, caplog):
+    with caplog.at_level(logging.WARNING):
+        profile(app, profiler, 2)
+    assert not any('Possible N+1 query' in record.getMessage() for record in caplog.records)
+
+
+def test_unsampled_requests_get_no_server_timing(app, profiler):
+    profiler.sample_rate = 0
+    assert 'Server-Timing' not in profile(app, profiler, 3).headers
+
+
+def test_failed_statements_leave_nothing_on_the_connection(app, profiler):
+    from sqlalchemy import exc
+    from models import db
+    with app.test_request_context():
+        profiler._start()
+        connection = db.session.connection()
+        for _ in range(3):
+            with pytest.raises(exc.ProgrammingError):
+                connection.exec_driver_sql('SELECT * FROM no_such_table')
+            db.session.rollback()
+            connection = db.session.connection()
+        connection.exec_driver_sql('SELECT 1')
+        assert not connection.info.get('profile_started')
+        assert profiler._finish(app.response_class()).headers.getlist('Server-Timing')
+        db.session.remove()
@@ -0,0 +1,85 @@
+from sqlalchemy import create_engine
+
+VENUE_FORM = {
+    'name': 'The New Venue', 'genres': ['Jazz'], 'address': '2 Main St',
+    'city': 'San Francisco', 'state': 'CA', 'phone': '415-555-0102',
+    'website_link': '', 'facebook_link': '', 'seeking_description': '',
+    'image_link': 'https://example.com/venue.png',
+}
+
+
+def test_gets_read_from_the_replica(client, make, make_on_replica):
+    on_primary = make.venue(name='Primary Venue')
+    on_replica = make_on_replica.venue(name='Replica Venue')
+    assert on_primary == on_replica
+    page = client.get('/venues/%d' % on_replica).get_data(as_text=True)
+    assert 'Replica Venue' in page
+
+
+def test_writes_and_the_reads_after_them_use_the_primary(app, client, replica):
+    response = client.post('/venues/create', data=VENUE_FORM)
+    assert response.status_code == 302
+    # The replica has not seen the new venue; the client that created it
+    # reads from the primary for a while.
+    assert client.get('/venues/1').status_code == 200
+    assert app.test_client().get('/venues/1').status_code == 404
+
+
+def test_an_unhealthy_replica_is_skipped(app, client, make, replica_uri):
+    from routing import ReplicaSet
+    missing = create_engine(replica_uri.set(database='fyyur_missing'),
+                            **app.config['SQLALCHEMY_ENGINE_OPTIONS'])
+    replicas = app.extensions['replicas']
+    app.extensions['replicas'] = ReplicaSet([missing], check_interval=3600)
+    try:
+        app.extensions['replicas'].check()
+        assert not app.extensions['replicas'].replicas[0].healthy
+        venue_id = make.venue()
+        assert client.get('/venues/%d' % venue_id).status_code == 200
+    finally:
+        app.extensions['replicas'] = replicas
+        missing.dispose()
+
+
+def test_pool_stats_are_kept_per_engine(app, client, make_on_replica, replica,
+                                        internal_token):
+    from models import db
+    venue_id = make_on_replica.venue()
+    with app.app_context():
+        primary = db.engine.pool.stats
+    primary.reset()
+    replica.pool.stats.reset()
+
+    assert client.get('/venues/%d' % venue_id).status_code == 200
+    assert replica.pool.stats.counters['checkouts'] > 0
+    assert primary.counters['checkouts'] == 0
+
+    replica_checkouts = replica.pool.stats.counters['checkouts']
+    assert client.post('/venues/create', data=VENUE_FORM).status_code == 302
+    assert primary.counters['checkouts'] > 0
+    assert replica.pool.stats.counters['checkouts'] == replica_checkouts
+
+    snapshot = client.get('/internal/pool', headers=internal_token).get_json()
+    assert snapshot['primary']['counters'] == primary.counters
+    assert snapshot['replicas'][0]['pool']['counters'] == replica.pool.stats.counters
+
+
+def test_pool_stats_survive_dispose(replica):
+    stats = replica.pool.stats
+    listeners = len(replica.pool.dispatch.checkout)
+    replica.dispose()
+    assert replica.pool.stats is stats
+    assert len(replica.pool.dispatch.checkout) == listeners
+    checkouts = stats.counters['checkouts']
+    with replica.connect():
+        pass
+    assert stats.counters['checkouts'] == checkouts + 1
+
+
+def test_searches_read_from_the_replica_and_do_not_pin_the_client(client, make, make_on_replica):
+    make.venue(name='Primary Venue')
+    venue_id = make_on_replica.venue(name='Replica Venue')
+    page = client.post('/venues/search', data={'search_term': 'Venue'}).get_data(as_text=True)
+    assert 'Replica Venue' in page and 'Primary Venue' not in page
+    page = client.get('/venues/%d' % venue_id).get_data(as_text=True)
+    assert 'Replica Venue' in page
@@ -0,0 +1,91 @@
+import datetime
+import io
+
+import pytest
+
+START = datetime.datetime(2030, 1, 1, 20, 0)
+
+
+@pytest.fixture
+def booked(make):
+    """A venue and an artist with a show from 20:00 to 23:00."""
+    venue_id, artist_id = make.venue(), make.artist()
+    make.show(venue_id, artist_id, START, START + datetime.timedelta(hours=3))
+    return venue_id, artist_id
+
+
+def import_shows(app, records):
+    from importer import import_records
+    with app.test_request_context():
+        return import_records('shows', enumerate(records, 2), io.StringIO())
+
+
+def test_availability_lists_the_open_slots(client, booked):
+    response = client.get('/api/v1/venues/%d/availability'
+                          '?from=2030-01-01T18:00:00&to=2030-01-02T00:00:00' % booked[0])
+    assert response.get_json()['data'] == [
+        {'start': '2030-01-01T18:00:00', 'end': '2030-01-01T20:00:00'},
+        {'start': '2030-01-01T23:00:00', 'end': '2030-01-02T00:00:00'},
+    ]
+
+
+@pytest.mark.parametrize('query', [
+    'from=2030-01-01T18:00:00%2B02:00&to=2030-01-02T00:00:00%2B02:00',
+    'from=2030-01-01T18:00:00%2B00:00&to=2030-01-02T00:00:00',
+])
+def test_availability_rejects_times_with_an_offset(client, booked, query):
+    response = client.get('/api/v1/venues/%d/availability?%s' % (booked[0], query))
+    assert response.status_code == 400
+
+
+@pytest.mark.parametrize('form', [
+    {'start_time': 'tomorrow night'},
+    {'start_time': '2030-01-02 20:00:00', 'end_time': 'late'},
+])
+def test_create_show_rejects_unreadable_times(client, booked, form):
+    venue_id, artist_id = booked
+    response = client.post('/shows/create', data=dict(
+        form, venue_id=str(venue_id), artist_id=str(artist_id)))
+    assert response.status_code == 400
+
+
+def test_create_show_rejects_a_double_booking(client, booked):
+    venue_id, artist_id = booked
+    response = client.post('/shows/create', data={
+        'venue_id': str(venue_id), 'artist_id': str(artist_id),
+        'start_time': '2030-01-01 21:00:00'})
+    assert response.status_code == 409
+
+
+def test_import_rejects_double_bookings(app, make, booked):
+    venue_id, artist_id = booked
+    other_venue = make.venue(name='Other Venue')
+    result = import_shows(app, [
+        {'venue_id': venue_id, 'artist_id': make.artist(name='Other'),
+         'start_time': '2030-01-01T21:00:00'},
+        {'venue_id': other_venue, 'artist_id': artist_id,
+         'start_time': '2030-01-02T20:00:00'},
+        {'venue_id': other_venue, 'artist_id': artist_id,
+         'start_time': '2030-01-02T21:00:00'},
+    ])
+    assert result.inserted == 1
+    assert result.errors == [
+        {'line': 2, 'errors': {'start_time': ['Venue or artist already booked.']}},
+        {'line': 4, 'errors': {'start_time': ['Overlaps line 3.']}},
+    ]
+
+
+def test_import_checks_bookings_in_one_query_per_chunk(app, make, statements):
+    def records(count):
+        ids = [(make.venue(), make.artist()) for _ in range(count)]
+        return [{'venue_id': venue_id, 'artist_id': artist_id,
+                 'start_time': (START + datetime.timedelta(days=n)).isoformat()}
+                for n, (venue_id, artist_id) in enumerate(ids)]
+
+    few, many = records(2), records(10)
+    del statements[:]
+    assert import_shows(app, few).inserted == 2
+    run = len(statements)
+    del statements[:]
+    assert import_shows(app, many).inserted == 10
+    assert len(statements) == run
@@ -0,0 +1,62 @@
+import datetime
+import os
+import subprocess
+import sys
+
+import pytest
+
+START = datetime.datetime(2030, 1, 1, 20, 0)
+
+
+def add_shows(make, count):
+    for n in range(count):
+        venue_id = make.venue(name='Venue %d' % n)
+        artist_id = make.artist(name='Artist %d' % n)
+        make.show(venue_id, artist_id, START + datetime.timedelta(days=n))
+
+
+@pytest.mark.parametrize('path', ['/shows', '/api/v1/shows?embed=venue,artist'])
+def test_show_listings_run_as_many_statements_for_any_number_of_shows(
+        client, make, statements, path):
+    add_shows(make, 2)
+    del statements[:]
+    assert client.get(path).status_code == 200
+    few = len(statements)
+
+    add_shows(make, 8)
+    del statements[:]
+    assert client.get(path).status_code == 200
+    assert len(statements) == few
+
+
+FRESH_WORKER = """
+import app
+client = app.app.test_client()
+print(client.get('/shows').status_code,
+      client.get('/api/v1/shows?embed=venue,artist').status_code)
+"""
+
+
+def test_show_listings_work_in_a_fresh_worker(app, make):
+    add_shows(make, 1)
+    env = dict(os.environ, APP_SETTINGS='config.TestingConfig')
+    env.pop('TEST_DATABASE_REPLICA_URIS', None)
+    result = subprocess.run([sys.executable, '-c', FRESH_WORKER], env=env,
+                            cwd=app.root_path, capture_output=True, text=True)
+    assert result.stdout.split() == ['200', '200'], result.stderr
+
+
+def test_show_pages_skip_shows_without_a_start_time(client, make):
+    add_shows(make, 3)
+    make.show(make.venue(name='Unscheduled Venue'), make.artist(), None)
+
+    def pages(per_page):
+        seen, url = [], '/api/v1/shows?per_page=%d' % per_page
+        while url:
+            data = client.get(url).get_json()
+            seen += [show['id'] for show in data['data']]
+            url = data['next'] and '/api/v1/shows?per_page=%d&after=%s' % (per_page, data['next'])
+        return seen
+
+    assert pages(1) == pages(10) == [1, 2, 3]
+    assert 'Unscheduled Venue' not in client.get('/shows').get_data(as_text=True)
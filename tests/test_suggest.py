@@ -0,0 +1,49 @@
+from suggest import PrefixIndex
+
+
+def names(index, prefix, limit=10):
+    return [match['name'] for match in index.suggest(prefix, limit)]
+
+
+def test_any_word_of_a_name_matches_a_prefix():
+    index = PrefixIndex()
+    index.load([(1, 'The Musical Hop'), (2, 'Park Square Live Music & Coffee'),
+                (3, 'The Dueling Pianos Bar'), (4, None)])
+    assert names(index, 'mus') == ['Park Square Live Music & Coffee', 'The Musical Hop']
+    assert names(index, '  HOP ') == ['The Musical Hop']
+    assert names(index, 'the musical h') == ['The Musical Hop']
+    assert names(index, 'the d') == ['The Dueling Pianos Bar']
+    assert names(index, 'usical') == []
+    assert names(index, '') == []
+
+
+def test_prefix_bounds():
+    index = PrefixIndex()
+    index.load([(1, 'a'), (2, 'ab'), (3, 'abc'), (4, 'abd'), (5, 'b')])
+    assert names(index, 'ab') == ['ab', 'abc', 'abd']
+    assert names(index, 'abc') == ['abc']
+    assert names(index, 'abcd') == []
+    assert names(index, 'b') == ['b']
+    assert names(index, 'c') == []
+
+
+def test_a_name_is_suggested_once_up_to_the_limit():
+    index = PrefixIndex()
+    index.load([(1, 'Jazz Jazz Jazz'), (2, 'Jazz Club'), (3, 'Jazzy')])
+    # Ordered by the matching part of the name: "jazz" < "jazz club" < "jazzy".
+    assert [match['id'] for match in index.suggest('jazz')] == [1, 2, 3]
+    assert names(index, 'jazz', limit=2) == ['Jazz Jazz Jazz', 'Jazz Club']
+
+
+def test_renames_and_removals():
+    index = PrefixIndex()
+    index.load([(1, 'Blue Note'), (2, 'Blue Moon')])
+    index.add(1, 'Red Note')
+    index.add(3, 'Bluebird')
+    assert names(index, 'blue') == ['Blue Moon', 'Bluebird']
+    assert names(index, 'note') == ['Red Note']
+    index.remove(2)
+    index.remove(2)
+    index.add(3, '')
+    assert names(index, 'blue') == []
+    assert index._entries == sorted(index._entries) == [('note', 1), ('red note', 1)]